@@ -1,6 +1,6 @@
 from flask import Flask, render_template
-from db import get_db
 import os
+import threading
 
 # Import blueprints
 from blueprints.customer import customer_bp
@@ -8,6 +8,11 @@ from blueprints.management import management_bp
 from blueprints.police import police_bp
 from blueprints.therapist import therapist_bp
 from blueprints.cashier import cashier_bp
+from scripts.partitions import ensure_partitions
+from autocomplete import ensure_autocomplete
+from roster import get_roster
+from instrumentation import init_app
+from metrics import init_metrics
 
 app = Flask(__name__)
 
@@ -15,6 +20,12 @@ app = Flask(__name__)
 # In production, use a secure random key from environment variable
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
+# Per-request DB / Redis timings: Server-Timing header and one JSON log line per request
+init_app(app)
+
+# Prometheus text-format request, pool, cache and queue metrics
+init_metrics(app)
+
 # Register blueprints
 app.register_blueprint(customer_bp)
 app.register_blueprint(management_bp)
@@ -22,40 +33,34 @@ app.register_blueprint(police_bp)
 app.register_blueprint(therapist_bp)
 app.register_blueprint(cashier_bp)
 
+
+def build_autocomplete():
+    """Build the Redis type-ahead index on first start (or after a Redis flush)"""
+    try:
+        ensure_autocomplete()
+    except Exception as e:
+        print(f"Autocomplete index build failed: {e}")
+
+
+# Runs on import, so under a WSGI server too; in the background, so a large
+# build does not hold up the first requests (searches use SQL meanwhile)
+threading.Thread(target=build_autocomplete, name='autocomplete-build', daemon=True).start()
+
 @app.route('/')
 def index():
     """Main landing page with 5 login perspectives"""
-    conn = get_db()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT e.eid, e.work_name, e.name, rd.role_type
-        FROM employees e
-        LEFT JOIN roles r ON e.eid = r.eid 
-            AND r.start_date <= CURRENT_DATE 
-            AND (r.end_date IS NULL OR r.end_date > CURRENT_DATE)
-        LEFT JOIN role_definition rd ON r.rdid = rd.rdid
-        WHERE (e.employment_end IS NULL OR e.employment_end >= CURRENT_DATE)
-        ORDER BY rd.role_type, e.work_name
-    """)
-    
-    employees = cur.fetchall()
-    
-    management = [e for e in employees if e[3] and 'manager' in e[3].lower()]
-    therapists = [e for e in employees if e[3] and any(x in e[3].lower() for x in ['therapist', 'doctor', 'beautician'])]
-    cashiers = [e for e in employees if e[3] and 'cashier' in e[3].lower()]
-    
-    cur.execute("SELECT cid, name, mobile_number FROM customers ORDER BY name")
-    customers = cur.fetchall()
-    
-    cur.close()
-    conn.close()
+    # Active staff pre-grouped by role_category, cached in Redis
+    roster = get_roster()
     
     return render_template('index.html',
-                         management=management,
-                         therapists=therapists,
-                         cashiers=cashiers,
-                         customers=customers)
+                         management=roster['management'],
+                         therapists=roster['therapist'],
+                         cashiers=roster['cashier'])
 
 if __name__ == '__main__':
+    # Keep the monthly transaction partitions a few months ahead of today
+    try:
+        ensure_partitions()
+    except Exception as e:
+        print(f"Partition maintenance failed: {e}")
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
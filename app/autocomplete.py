@@ -0,0 +1,249 @@
+# autocomplete.py - Redis type-ahead index for customers and employees
+#
+# Each searchable field is one sorted set whose members are
+# "<normalized token>\x00<id>" (all scores 0), so ZRANGEBYLEX on a prefix
+# returns matching ids without touching Postgres. Names index every word plus
+# the whole normalized name; mobiles index the number and its reverse (for
+# "last N digits"). Display fields live in one hash per entity, id -> compact
+# JSON list.
+import json
+import re
+import unicodedata
+from datetime import date
+from db import get_db, get_redis
+from customer_search import SEARCH_LIMIT, MIN_QUERY_LENGTH, search_customers
+
+AC_CUSTOMER_NAME = "spa:ac:customer:name"
+AC_CUSTOMER_MOBILE = "spa:ac:customer:mobile"
+AC_CUSTOMER_MOBILE_REV = "spa:ac:customer:mobile_rev"
+AC_CUSTOMER_DATA = "spa:ac:customer:data"       # cid -> [name, mobile, nric, country]
+AC_EMPLOYEE_NAME = "spa:ac:employee:name"
+AC_EMPLOYEE_DATA = "spa:ac:employee:data"       # eid -> [work_name, name, mobile, employment_end]
+AC_READY = "spa:ac:ready"                       # set once a full build has finished
+AC_BUILDING = "spa:ac:building"                 # held by the one process building on startup
+BUILD_LOCK_SECONDS = 600
+
+AC_CANDIDATES = 50      # ids pulled per lookup before sorting by name
+BUILD_BATCH = 5000
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse everything but letters/digits to single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r'[^0-9a-z]+', ' ', text.lower()).strip()
+
+
+def name_tokens(*names):
+    tokens = set()
+    for name in names:
+        norm = normalize(name)
+        if norm:
+            tokens.add(norm)
+            tokens.update(norm.split())
+    return tokens
+
+
+def digits(text):
+    return re.sub(r'\D', '', text or '')
+
+
+def _customer_entries(cid, name, mobile):
+    mobile = digits(mobile)
+    entries = {AC_CUSTOMER_NAME: {f"{t}\x00{cid}" for t in name_tokens(name)}}
+    if mobile:
+        entries[AC_CUSTOMER_MOBILE] = {f"{mobile}\x00{cid}"}
+        entries[AC_CUSTOMER_MOBILE_REV] = {f"{mobile[::-1]}\x00{cid}"}
+    return entries
+
+
+def _employee_entries(eid, work_name, name):
+    return {AC_EMPLOYEE_NAME: {f"{t}\x00{eid}" for t in name_tokens(work_name, name)}}
+
+
+def _write(pipe, entries, data_key, id_, payload, old_entries=None):
+    for key, members in (old_entries or {}).items():
+        stale = members - entries.get(key, set())
+        if stale:
+            pipe.zrem(key, *stale)
+    for key, members in entries.items():
+        if members:
+            pipe.zadd(key, {m: 0 for m in members})
+    pipe.hset(data_key, id_, json.dumps(payload, separators=(',', ':')))
+
+
+def index_customer(cid, name, mobile, nric, country_code):
+    """Add/refresh one customer (call after the INSERT has committed)"""
+    try:
+        redis_client = get_redis()
+        pipe = redis_client.pipeline()
+        _write(pipe, _customer_entries(cid, name, mobile), AC_CUSTOMER_DATA, cid,
+               [name, mobile, nric, country_code])
+        pipe.execute()
+    except Exception as e:
+        print(f"Autocomplete index update failed: {e}")
+
+
+def index_employee(eid, work_name, name, mobile, employment_end):
+    """Add/refresh one employee, dropping tokens of the previous names"""
+    try:
+        redis_client = get_redis()
+        old = redis_client.hget(AC_EMPLOYEE_DATA, eid)
+        old_entries = None
+        if old:
+            old_work_name, old_name = json.loads(old)[:2]
+            old_entries = _employee_entries(eid, old_work_name, old_name)
+        end = employment_end.isoformat() if hasattr(employment_end, 'isoformat') else employment_end
+        pipe = redis_client.pipeline()
+        _write(pipe, _employee_entries(eid, work_name, name), AC_EMPLOYEE_DATA, eid,
+               [work_name, name, mobile, end or None], old_entries)
+        pipe.execute()
+    except Exception as e:
+        print(f"Autocomplete index update failed: {e}")
+
+
+def rebuild_autocomplete():
+    """Rebuild both indexes from Postgres; returns (customers, employees) indexed"""
+    redis_client = get_redis()
+    redis_client.delete(AC_READY, AC_CUSTOMER_NAME, AC_CUSTOMER_MOBILE, AC_CUSTOMER_MOBILE_REV,
+                        AC_CUSTOMER_DATA, AC_EMPLOYEE_NAME, AC_EMPLOYEE_DATA)
+    conn = get_db()
+    counts = []
+    try:
+        for sql, entries_for, data_key in (
+            ("SELECT cid, name, mobile_number, nric_fin_passport_no, country_code FROM customers",
+             lambda r: _customer_entries(r[0], r[1], r[2]), AC_CUSTOMER_DATA),
+            ("SELECT eid, work_name, name, mobile_number, employment_end FROM employees",
+             lambda r: _employee_entries(r[0], r[1], r[2]), AC_EMPLOYEE_DATA),
+        ):
+            # Named cursor: rows stream in batches instead of loading the whole table
+            cur = conn.cursor(name='autocomplete_build')
+            cur.itersize = BUILD_BATCH
+            cur.execute(sql)
+            count = 0
+            pipe = redis_client.pipeline(transaction=False)
+            for row in cur:
+                payload = list(row[1:])
+                if data_key == AC_EMPLOYEE_DATA:
+                    payload[3] = row[4].isoformat() if row[4] else None
+                _write(pipe, entries_for(row), data_key, row[0], payload)
+                count += 1
+                if count % BUILD_BATCH == 0:
+                    pipe.execute()
+            pipe.execute()
+            cur.close()
+            conn.commit()
+            counts.append(count)
+    finally:
+        conn.close()
+    redis_client.set(AC_READY, 1)
+    return tuple(counts)
+
+
+def ensure_autocomplete():
+    """
+    Build the index if it has never been built (or Redis was flushed)
+    Only one process builds (WSGI workers, the debug reloader's two processes);
+    the others return None and searches fall back to SQL until AC_READY is set.
+    """
+    redis_client = get_redis()
+    if redis_client.exists(AC_READY):
+        return None
+    if not redis_client.set(AC_BUILDING, 1, nx=True, ex=BUILD_LOCK_SECONDS):
+        return None
+    try:
+        return rebuild_autocomplete()
+    finally:
+        redis_client.delete(AC_BUILDING)
+
+
+def _lookup(redis_client, key, prefix, limit):
+    """Ids whose token in `key` starts with `prefix`, first match order, de-duplicated"""
+    members = redis_client.zrangebylex(key, f"[{prefix}", f"[{prefix}\xff", start=0, num=limit)
+    ids = []
+    for member in members:
+        id_ = int(member.rsplit('\x00', 1)[1])
+        if id_ not in ids:
+            ids.append(id_)
+    return ids
+
+
+def autocomplete_customers(query, search_by='name', limit=SEARCH_LIMIT):
+    """Customer rows (cid, name, mobile, nric, country_code) from Redis.
+
+    Returns None when the index is not available, so callers can fall back to SQL.
+    """
+    q = digits(query) if search_by == 'mobile' else normalize(query)
+    if len(q) < MIN_QUERY_LENGTH:
+        return []
+    try:
+        redis_client = get_redis()
+        if not redis_client.exists(AC_READY):
+            return None
+        if search_by == 'mobile':
+            ids = _lookup(redis_client, AC_CUSTOMER_MOBILE, q, AC_CANDIDATES)
+            ids += [i for i in _lookup(redis_client, AC_CUSTOMER_MOBILE_REV, q[::-1], AC_CANDIDATES)
+                    if i not in ids]
+        else:
+            ids = _lookup(redis_client, AC_CUSTOMER_NAME, q, AC_CANDIDATES)
+        if not ids:
+            return []
+        rows = []
+        for cid, payload in zip(ids, redis_client.hmget(AC_CUSTOMER_DATA, ids)):
+            if payload:
+                rows.append((cid, *json.loads(payload)))
+        if search_by != 'mobile':
+            # Whole-name prefix hits first, like customer_search
+            rows.sort(key=lambda r: (not normalize(r[1]).startswith(q), r[1]))
+        return rows[:limit]
+    except Exception as e:
+        print(f"Autocomplete lookup failed: {e}")
+        return None
+
+
+def autocomplete_employees(query, limit=SEARCH_LIMIT):
+    """Employee dicts shaped like management.search_therapists, or None if unavailable"""
+    q = normalize(query)
+    if not q:
+        return None
+    try:
+        redis_client = get_redis()
+        if not redis_client.exists(AC_READY):
+            return None
+        ids = _lookup(redis_client, AC_EMPLOYEE_NAME, q, AC_CANDIDATES)
+        if not ids:
+            return []
+        today = date.today().isoformat()
+        results = []
+        for eid, payload in zip(ids, redis_client.hmget(AC_EMPLOYEE_DATA, ids)):
+            if not payload:
+                continue
+            work_name, name, mobile, employment_end = json.loads(payload)
+            results.append({
+                'eid': eid,
+                'work_name': work_name,
+                'name': name,
+                'mobile': mobile,
+                'status': 'Active' if employment_end is None or employment_end > today else 'Inactive'
+            })
+        results.sort(key=lambda r: r['work_name'])
+        return results[:limit]
+    except Exception as e:
+        print(f"Autocomplete lookup failed: {e}")
+        return None
+
+
+def lookup_customers(query, search_by='name', limit=SEARCH_LIMIT):
+    """Type-ahead customer search: Redis first, customer_search (Postgres) as fallback.
+
+    Postgres is only queried when the index is unavailable, or when a 3+
+    character query has no prefix hit (substring / typo matches).
+    """
+    rows = autocomplete_customers(query, search_by, limit)
+    if rows is None or (not rows and len((query or '').strip()) >= 3):
+        conn = get_db()
+        cur = conn.cursor()
+        rows = search_customers(cur, query, search_by, limit)
+        cur.close()
+        conn.close()
+    return rows
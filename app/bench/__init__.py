@@ -0,0 +1 @@
+# Benchmarks - run inside the web container, e.g. python -m bench.txn_writes
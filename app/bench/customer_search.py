@@ -0,0 +1,147 @@
+"""
+Customer search latency benchmark.
+
+Tops the customers table up to --customers synthetic rows (NRIC prefix
+BENCH-, removed again unless --keep), then times a mix of type-ahead queries
+through the legacy ILIKE '%q%' statements and through customer_search:
+
+    python -m bench.customer_search                      # 1,000,000 customers
+    python -m bench.customer_search --customers 200000 --json search.json
+"""
+import argparse
+import json
+import random
+import time
+from db import get_db
+from customer_search import search_customers
+
+BENCH_PREFIX = 'BENCH-'
+
+FIRST_NAMES = ['Wei Ling', 'Muhammad', 'Siti', 'Ahmad', 'Mei Ling', 'Rajesh', 'Priya', 'Jun Jie',
+               'Hui Min', 'Kumar', 'Nurul', 'Jia Hui', 'Daniel', 'Rachel', 'Farah', 'Arjun',
+               'Xin Yi', 'Hafiz', 'Lakshmi', 'Zhi Hao', 'Aisyah', 'Bryan', 'Kavitha', 'Yong Sheng']
+LAST_NAMES = ['Tan', 'Lim', 'Lee', 'Ng', 'Wong', 'Goh', 'Chua', 'Koh', 'Teo', 'Ong', 'Bin Ismail',
+              'Binte Rahman', 'Pillai', 'Nair', 'Singh', 'Chong', 'Yeo', 'Sim', 'Low', 'Chan',
+              'Abdullah', 'Krishnan', 'Ho', 'Foo']
+
+LEGACY_SQL = {
+    'name': """
+        SELECT cid, name, mobile_number, nric_fin_passport_no, country_code
+        FROM customers WHERE name ILIKE %s ORDER BY name LIMIT 10
+    """,
+    'mobile': """
+        SELECT cid, name, mobile_number, nric_fin_passport_no, country_code
+        FROM customers WHERE mobile_number ILIKE %s ORDER BY name LIMIT 10
+    """,
+}
+
+
+def seed_customers(cur, target):
+    """Insert synthetic customers until the table holds `target` rows; returns how many"""
+    cur.execute("SELECT COUNT(*) FROM customers")
+    missing = target - cur.fetchone()[0]
+    if missing <= 0:
+        return 0
+    cur.execute("SELECT COALESCE(MAX(cid), 0) FROM customers")
+    offset = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO customers (nric_fin_passport_no, name, gender, mobile_number, country_code)
+        SELECT %(prefix)s || (%(offset)s + i),
+               (%(first)s::text[])[1 + (i * 7919) %% cardinality(%(first)s::text[])] || ' ' ||
+               (%(last)s::text[])[1 + (i * 104729) %% cardinality(%(last)s::text[])] || ' ' ||
+               substr(md5(i::text), 1, 4),
+               (ARRAY['Male', 'Female'])[1 + i %% 2]::gender_enum,
+               (ARRAY['8', '9'])[1 + i %% 2] || lpad(((i * 7368787) %% 10000000)::text, 7, '0'),
+               'SG'
+        FROM generate_series(1::bigint, %(missing)s) AS i
+    """, {'prefix': BENCH_PREFIX, 'offset': offset, 'missing': missing,
+          'first': FIRST_NAMES, 'last': LAST_NAMES})
+    cur.execute("ANALYZE customers")
+    return missing
+
+
+def build_queries(cur, per_kind):
+    """(kind, search_by, text) tuples drawn from rows that really exist"""
+    cur.execute("SELECT name, mobile_number FROM customers TABLESAMPLE SYSTEM (1) LIMIT %s",
+                (per_kind,))
+    rows = cur.fetchall()
+    rng = random.Random(42)
+    queries = []
+    for name, mobile in rows:
+        word = max(name.split(), key=len)
+        typo = word[:2] + word[3] + word[2] + word[4:] if len(word) > 4 else word
+        queries += [
+            ('name 2 chars', 'name', name[:2]),
+            ('name substring', 'name', word[1:5]),
+            ('name typo', 'name', typo),
+            ('mobile prefix', 'mobile', mobile[:4]),
+            ('mobile last 4', 'mobile', mobile[-4:]),
+        ]
+    rng.shuffle(queries)
+    return queries
+
+
+def time_ms(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--customers', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=40, help='sampled customers per query kind')
+    parser.add_argument('--skip-legacy', action='store_true', help='only time the new search')
+    parser.add_argument('--keep', action='store_true', help='keep the synthetic customers')
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args()
+
+    conn = get_db()
+    cur = conn.cursor()
+
+    start = time.time()
+    added = seed_customers(cur, args.customers)
+    conn.commit()
+    print(f"customers: {args.customers} ({added} synthetic added in {time.time() - start:.1f}s)")
+
+    queries = build_queries(cur, args.queries)
+    timings = {}
+    for kind, search_by, text in queries:
+        entry = timings.setdefault(kind, {'legacy': [], 'search': []})
+        if not args.skip_legacy:
+            entry['legacy'].append(time_ms(lambda: (
+                cur.execute(LEGACY_SQL[search_by], (f'%{text}%',)), cur.fetchall())))
+        entry['search'].append(time_ms(lambda: search_customers(cur, text, search_by)))
+    conn.rollback()
+
+    report = {'customers': args.customers, 'kinds': {}}
+    print(f"{'query':<16}{'legacy p50':>12}{'p95':>10}{'search p50':>12}{'p95':>10}  ms")
+    for kind, entry in sorted(timings.items()):
+        row = {}
+        for impl in ('legacy', 'search'):
+            if entry[impl]:
+                row[impl] = {'p50': percentile(entry[impl], 50), 'p95': percentile(entry[impl], 95)}
+        report['kinds'][kind] = row
+        legacy = row.get('legacy', {'p50': float('nan'), 'p95': float('nan')})
+        print(f"{kind:<16}{legacy['p50']:>12.2f}{legacy['p95']:>10.2f}"
+              f"{row['search']['p50']:>12.2f}{row['search']['p95']:>10.2f}")
+
+    if added and not args.keep:
+        cur.execute("DELETE FROM customers WHERE nric_fin_passport_no LIKE %s",
+                    (BENCH_PREFIX + '%',))
+        conn.commit()
+    cur.close()
+    conn.close()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
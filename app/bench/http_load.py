@@ -0,0 +1,378 @@
+"""
+HTTP load benchmark for the spa web app.
+
+Runs --users concurrent virtual users against a running app for --duration
+seconds (after --warmup). Each user keeps its own session cookie and keeps
+picking a scenario from the --mix: the landing page, the cashier dashboard
+(plain and Redis), the booking wizard through to payment and exit, the
+customer, therapist and management dashboards, customer search, and the
+police log and export. Every request is timed under its route pattern:
+
+    python -m bench.http_load --json baseline.json
+    python -m bench.http_load --compare baseline.json          # exit status 1 on a regression
+    python -m bench.http_load --mix read --users 32 --duration 120
+
+A route regresses when its p95 is more than --tolerance percent above the
+baseline's (and at least --min-ms slower). The run also regresses when total
+throughput drops by more than --tolerance percent. Bookings are made a few
+days ahead for BENCH- customers. They are deleted again unless --keep.
+"""
+import argparse
+import http.cookiejar
+import json
+import random
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, timedelta
+from db import get_db
+from roster import load_roster
+from schedule import refresh_schedules
+from blueprints.cashier.cache_utils import invalidate_all_dashboard_cache
+
+BENCH_PREFIX = 'BENCH-HTTP-'
+BENCH_CUSTOMERS = 50                     # bookings are spread over these so they rarely clash
+BOOK_AHEAD_DAYS = (3, 30)
+REQUEST_TIMEOUT = 30
+
+# Scenario weights; every scenario is one user visit of one or more requests
+MIXES = {
+    'default': {'landing': 10, 'cashier': 18, 'cashier_redis': 18, 'booking': 8, 'customer': 14,
+                'search': 10, 'therapist': 12, 'management': 5, 'police': 5},
+    'read': {'landing': 10, 'cashier': 20, 'cashier_redis': 20, 'customer': 15,
+             'search': 10, 'therapist': 15, 'management': 5, 'police': 5},
+    'booking': {'booking': 1},
+}
+
+
+class Recorder:
+    """Latencies (ms) and failures per route, shared by all users"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+        self.measuring = False
+
+    def record(self, route, ms, ok):
+        if not self.measuring:
+            return
+        with self.lock:
+            self.samples.setdefault(route, []).append(ms)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+class Client:
+    """One virtual user: a cookie jar for the Flask session, following redirects like a browser"""
+
+    def __init__(self, base_url, recorder):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, route, path, form=None):
+        """Returns (status, body, final url); status is None if the server could not be reached"""
+        body = urllib.parse.urlencode(form, doseq=True).encode() if form is not None else None
+        status, text, url = None, '', self.base_url + path
+        start = time.perf_counter()
+        try:
+            with self.opener.open(url, body, timeout=REQUEST_TIMEOUT) as response:
+                status, text, url = response.status, response.read().decode('utf-8', 'replace'), response.geturl()
+        except urllib.error.HTTPError as e:
+            status, text = e.code, e.read().decode('utf-8', 'replace')
+        except OSError:
+            pass
+        self.recorder.record(route, (time.perf_counter() - start) * 1000, status is not None and status < 400)
+        return status, text, url
+
+
+def landing(client, fx, rng):
+    client.request('GET /', '/')
+
+
+def cashier(client, fx, rng):
+    client.request('GET /cashier/<eid>', f"/cashier/{rng.choice(fx['cashiers'])}")
+
+
+def cashier_redis(client, fx, rng):
+    client.request('GET /cashier-redis/<eid>', f"/cashier-redis/{rng.choice(fx['cashiers'])}")
+
+
+def booking(client, fx, rng):
+    """Check in a customer, book one service through the wizard, pay it and record the exit"""
+    client.request('POST /cashier', '/cashier', {'cashier_id': rng.choice(fx['cashiers'])})
+    _, _, url = client.request('POST /cashier/create-transaction', '/cashier/create-transaction',
+                               {'customer_id': rng.choice(fx['bench_customers'])})
+    match = re.search(r'/cashier/transaction/(\d+)$', url)
+    if not match:
+        return
+    tid = match.group(1)
+    client.request('GET /cashier/transaction/<tid>/schedule', f"/cashier/transaction/{tid}/schedule")
+
+    day = date.today() + timedelta(days=rng.randint(*BOOK_AHEAD_DAYS))
+    client.request('POST /cashier/transaction/<tid>/add-service-step2',
+                   f"/cashier/transaction/{tid}/add-service-step2",
+                   {'scheduled_date': day.isoformat(), 'scheduled_hour': f"{rng.randrange(24):02d}",
+                    'scheduled_minute': f"{rng.randrange(0, 60, 5):02d}"})
+    sid, cost = rng.choice(fx['services'])
+    _, page, _ = client.request('POST /cashier/transaction/<tid>/add-service-step3',
+                                f"/cashier/transaction/{tid}/add-service-step3", {'service_id': sid})
+
+    # First free therapist and room offered by step 3; a fully booked slot ends the visit unpaid
+    therapist = re.search(r'name="therapist_id"[^>]*>\s*<option value="(\d+)"', page)
+    room = re.search(r'name="room_id"[^>]*>\s*<option value="(\d+)"', page)
+    if therapist and room:
+        client.request('POST /cashier/transaction/<tid>/add-service-final',
+                       f"/cashier/transaction/{tid}/add-service-final",
+                       {'therapist_id': therapist.group(1), 'room_id': room.group(1),
+                        'item_discount': 0, 'item_discount_type': 'none'})
+        client.request('POST /cashier/add-payment/<tid>', f"/cashier/add-payment/{tid}",
+                       {'payment_method[]': [rng.choice(fx['payment_methods'])],
+                        'payment_amount[]': [f"{cost:.2f}"]})
+    client.request('POST /cashier/record-exit/<tid>', f"/cashier/record-exit/{tid}", {})
+
+
+def customer(client, fx, rng):
+    client.request('GET /customer/<cid>', f"/customer/{rng.choice(fx['customers'])}")
+
+
+def search(client, fx, rng):
+    # Type-ahead: one request per keystroke from the second character on
+    name = rng.choice(fx['names'])
+    for length in range(2, min(len(name), 5) + 1):
+        client.request('GET /api/search-customers',
+                       '/api/search-customers?' + urllib.parse.urlencode({'q': name[:length], 'by': 'name'}))
+
+
+def therapist(client, fx, rng):
+    eid = rng.choice(fx['therapists'])
+    client.request('GET /therapist/<eid>', f"/therapist/{eid}")
+    client.request('GET /therapist/<eid>/api/schedule', f"/therapist/{eid}/api/schedule")
+
+
+def management(client, fx, rng):
+    client.request('POST /management', '/management', {'management_id': rng.choice(fx['managers'])})
+    client.request('GET /management/therapist-admin', '/management/therapist-admin')
+
+
+def police(client, fx, rng):
+    today = date.today().isoformat()
+    client.request('GET /police/<period>/<date>', f"/police/{rng.choice(['day', 'week'])}/{today}")
+    if rng.random() < 0.2:
+        client.request('GET /police/<period>/<date>/export.csv', f"/police/week/{today}/export.csv")
+
+
+SCENARIOS = {fn.__name__: fn for fn in (landing, cashier, cashier_redis, booking, customer,
+                                        search, therapist, management, police)}
+
+
+def load_fixtures(cur):
+    """Logins, customers, services and BENCH- booking customers the scenarios pick from"""
+    roster = load_roster(cur)
+    fx = {category: sorted({row[0] for row in roster[role]})
+          for category, role in (('cashiers', 'cashier'), ('therapists', 'therapist'),
+                                 ('managers', 'management'))}
+    missing = [category for category, eids in fx.items() if not eids]
+    if missing:
+        raise SystemExit(f"no active {', '.join(missing)} on the roster; load seeds.sql first")
+
+    # Regulars are the customers whose dashboards get opened
+    cur.execute("""
+        SELECT c.cid, c.name
+        FROM customer_stats cs
+        JOIN customers c ON c.cid = cs.cid
+        ORDER BY cs.visit_count DESC, c.cid
+        LIMIT 500
+    """)
+    rows = cur.fetchall()
+    fx['customers'] = [row[0] for row in rows] or [1]
+    fx['names'] = [row[1] for row in rows] or ['Ta']
+
+    cur.execute("""
+        SELECT sid, base_cost FROM services
+        WHERE base_cost > 0 AND active_from <= CURRENT_DATE
+          AND (active_until IS NULL OR active_until >= CURRENT_DATE + %s)
+        ORDER BY sid
+    """, (BOOK_AHEAD_DAYS[1],))
+    fx['services'] = [(sid, float(cost)) for sid, cost in cur.fetchall()]
+    cur.execute("SELECT unnest(enum_range(NULL::paymentmethod_enum))::text")
+    fx['payment_methods'] = [row[0] for row in cur.fetchall()]
+
+    cur.execute("""
+        INSERT INTO customers (nric_fin_passport_no, name, gender, mobile_number, country_code)
+        SELECT %(prefix)s || i, 'Bench Visitor ' || i, 'Female', '8' || lpad(i::text, 7, '0'), 'SG'
+        FROM generate_series(1, %(count)s) AS i
+        ON CONFLICT DO NOTHING
+    """, {'prefix': BENCH_PREFIX, 'count': BENCH_CUSTOMERS})
+    cur.execute("SELECT cid FROM customers WHERE nric_fin_passport_no LIKE %s ORDER BY cid",
+                (BENCH_PREFIX + '%',))
+    fx['bench_customers'] = [row[0] for row in cur.fetchall()]
+    return fx
+
+
+def cleanup(cur):
+    """Delete the BENCH- customers' transactions and the customers; returns the therapists they booked"""
+    cur.execute("""
+        SELECT DISTINCT ti.therapist_eid
+        FROM transaction_items ti
+        JOIN transactions t ON t.tid = ti.tid
+        JOIN customers c ON c.cid = t.cid
+        WHERE c.nric_fin_passport_no LIKE %s AND ti.therapist_eid IS NOT NULL
+    """, (BENCH_PREFIX + '%',))
+    therapists = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        DELETE FROM transactions
+        WHERE cid IN (SELECT cid FROM customers WHERE nric_fin_passport_no LIKE %s)
+    """, (BENCH_PREFIX + '%',))
+    cur.execute("DELETE FROM customers WHERE nric_fin_passport_no LIKE %s", (BENCH_PREFIX + '%',))
+    return therapists
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def run(args, fx):
+    mix = MIXES[args.mix]
+    names, weights = list(mix), list(mix.values())
+    recorder = Recorder()
+    stop = threading.Event()
+
+    def user(index):
+        rng = random.Random(args.seed * 1000 + index)
+        client = Client(args.url, recorder)
+        while not stop.is_set():
+            SCENARIOS[rng.choices(names, weights)[0]](client, fx, rng)
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(args.users)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    recorder.measuring = True
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    recorder.measuring = False
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join(REQUEST_TIMEOUT)
+
+    requests = sum(len(samples) for samples in recorder.samples.values())
+    report = {
+        'url': args.url,
+        'mix': args.mix,
+        'users': args.users,
+        'elapsed': elapsed,
+        'requests': requests,
+        'requests_per_sec': requests / elapsed if elapsed else 0.0,
+        'routes': {},
+    }
+    for route, samples in sorted(recorder.samples.items()):
+        report['routes'][route] = {
+            'requests': len(samples),
+            'errors': recorder.errors.get(route, 0),
+            'per_sec': len(samples) / elapsed if elapsed else 0.0,
+            'p50': percentile(samples, 50),
+            'p95': percentile(samples, 95),
+            'p99': percentile(samples, 99),
+        }
+    return report
+
+
+def find_regressions(report, baseline, tolerance, min_ms):
+    """Human-readable regressions of `report` against `baseline`"""
+    regressions = []
+    limit = 1 + tolerance / 100
+    for route, stats in report['routes'].items():
+        base = baseline['routes'].get(route)
+        if base and stats['p95'] > base['p95'] * limit and stats['p95'] - base['p95'] >= min_ms:
+            regressions.append(f"{route}: p95 {base['p95']:.1f} -> {stats['p95']:.1f} ms")
+        if stats['errors'] and not (base or {}).get('errors'):
+            regressions.append(f"{route}: {stats['errors']} failed requests")
+    if report['requests_per_sec'] * limit < baseline['requests_per_sec']:
+        regressions.append(f"throughput {baseline['requests_per_sec']:.1f} -> "
+                           f"{report['requests_per_sec']:.1f} req/s")
+    return regressions
+
+
+def print_report(report, baseline=None):
+    print(f"{report['users']} users, mix {report['mix']}: {report['requests']} requests in "
+          f"{report['elapsed']:.1f}s, {report['requests_per_sec']:.1f} req/s")
+    if baseline:
+        change = (report['requests_per_sec'] / baseline['requests_per_sec'] - 1) * 100 \
+            if baseline['requests_per_sec'] else 0.0
+        print(f"baseline: {baseline['requests_per_sec']:.1f} req/s ({change:+.1f}%)")
+        if (baseline['mix'], baseline['users']) != (report['mix'], report['users']):
+            print(f"note: the baseline ran mix {baseline['mix']} with {baseline['users']} users")
+    width = max([len(route) for route in report['routes']] + [5]) + 2
+    print(f"{'route':<{width}}{'req':>7}{'err':>6}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}"
+          + (f"{'base p95':>10}" if baseline else '') + "  ms")
+    for route, s in report['routes'].items():
+        line = (f"{route:<{width}}{s['requests']:>7}{s['errors']:>6}{s['per_sec']:>8.1f}"
+                f"{s['p50']:>9.1f}{s['p95']:>9.1f}{s['p99']:>9.1f}")
+        if baseline:
+            base = baseline['routes'].get(route)
+            line += f"{base['p95']:>10.1f}" if base else f"{'-':>10}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000', help='app to load (default: %(default)s)')
+    parser.add_argument('--users', type=int, default=8, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=60, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='unmeasured seconds before that')
+    parser.add_argument('--mix', choices=sorted(MIXES), default='default')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keep', action='store_true', help='keep the BENCH- customers and their bookings')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--compare', help='compare against a report written earlier with --json')
+    parser.add_argument('--tolerance', type=float, default=20, help='allowed slowdown in percent')
+    parser.add_argument('--min-ms', type=float, default=5, help='ignore p95 slowdowns smaller than this')
+    args = parser.parse_args()
+
+    conn = get_db()
+    cur = conn.cursor()
+    fx = load_fixtures(cur)
+    conn.commit()
+
+    try:
+        report = run(args, fx)
+    finally:
+        if not args.keep:
+            therapists = cleanup(cur)
+            conn.commit()
+            # The app caches schedules and open transactions in Redis; drop the deleted bookings
+            refresh_schedules(cur, *therapists)
+            invalidate_all_dashboard_cache()
+        cur.close()
+        conn.close()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if baseline:
+        regressions = find_regressions(report, baseline, args.tolerance, args.min_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions (tolerance {args.tolerance:g}%)")
+
+
+if __name__ == '__main__':
+    main()
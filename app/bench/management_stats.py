@@ -0,0 +1,198 @@
+"""
+Management dashboard period statistics benchmark.
+
+Adds --years of synthetic history (--visits-per-day completed visits for one
+BENCH- customer, removed again unless --keep), then times the old
+one-query-per-period-per-metric path against management.get_period_stats:
+
+    python -m bench.management_stats                     # 3 years, 150 visits/day
+    python -m bench.management_stats --years 5 --json stats.json
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from db import get_db
+from blueprints.management import PERIODS, get_period_stats
+
+BENCH_NRIC = 'BENCH-STATS'
+
+# The statements the dashboard used to run for every period
+LEGACY_SQL = [
+    """
+        SELECT p.payment_method, COALESCE(SUM(p.payment_amount), 0) as total
+        FROM payments p
+        JOIN transactions t ON p.tid = t.tid
+        WHERE p.payment_time >= %(start)s AND p.payment_time < %(end)s
+        GROUP BY p.payment_method
+        ORDER BY total DESC
+    """,
+    """
+        SELECT COUNT(*)
+        FROM transaction_items ti
+        JOIN transactions t ON ti.tid = t.tid
+        WHERE ti.actual_start >= %(start)s AND ti.actual_start < %(end)s
+    """,
+    """
+        SELECT COALESCE(SUM(payment_amount), 0)
+        FROM payments p
+        WHERE p.payment_time >= %(start)s AND p.payment_time < %(end)s
+    """,
+    """
+        SELECT COALESCE(AVG(transaction_total), 0), COUNT(*)
+        FROM (
+            SELECT t.tid, SUM(ti.cost - ti.item_discount) as transaction_total
+            FROM transactions t
+            JOIN transaction_items ti ON t.tid = ti.tid
+            WHERE t.created_at >= %(start)s AND t.created_at < %(end)s
+              AND t.status IN ('completed', 'paid')
+            GROUP BY t.tid
+        ) transaction_totals
+    """,
+    """
+        SELECT COALESCE(AVG(EXTRACT(EPOCH FROM (ti.actual_end - ti.actual_start))/60), 0), COUNT(*)
+        FROM transaction_items ti
+        JOIN transactions t ON ti.tid = t.tid
+        WHERE ti.actual_start IS NOT NULL AND ti.actual_end IS NOT NULL
+          AND ti.actual_start >= %(start)s AND ti.actual_start < %(end)s
+          AND t.status IN ('completed', 'paid')
+    """,
+]
+
+
+def seed_history(cur, years, visits_per_day):
+    """Completed two-service visits spread evenly over the last `years`; returns the bench cid"""
+    cur.execute("SELECT (CURRENT_DATE - make_interval(years => %s))::date", (years,))
+    since = cur.fetchone()[0]
+    cur.execute("SELECT create_transaction_partitions(%s, CURRENT_DATE)", (since,))
+
+    cur.execute("""
+        INSERT INTO customers (nric_fin_passport_no, name, gender, mobile_number, country_code)
+        VALUES (%s, 'Bench Stats', 'Female', '80000000', 'SG')
+        RETURNING cid
+    """, (BENCH_NRIC,))
+    cid = cur.fetchone()[0]
+    cur.execute("SELECT MIN(eid) FROM employees")
+    eid = cur.fetchone()[0]
+    cur.execute("SELECT MIN(rid) FROM room")
+    rid = cur.fetchone()[0]
+    cur.execute("""
+        SELECT ARRAY_AGG(sid ORDER BY sid), ARRAY_AGG(base_cost ORDER BY sid)
+        FROM services WHERE base_cost > 0
+    """)
+    sids, costs = cur.fetchone()
+
+    cur.execute("""
+        INSERT INTO transactions (cid, cashier_eid, entry_time, created_at, status)
+        SELECT %(cid)s, %(eid)s, ts, ts, 'pending'
+        FROM generate_series(%(since)s::timestamptz, NOW() - INTERVAL '2 hours',
+                             make_interval(secs => 86400.0 / %(per_day)s)) AS ts
+    """, {'cid': cid, 'eid': eid, 'since': since, 'per_day': visits_per_day})
+    cur.execute("""
+        INSERT INTO transaction_items (tid, sid, therapist_eid, rid, scheduled_start,
+                                       actual_start, actual_end, cost)
+        SELECT t.tid, (%(sids)s::bigint[])[k], %(eid)s, %(rid)s,
+               t.entry_time + make_interval(mins => 5 + 60 * n),
+               t.entry_time + make_interval(mins => 5 + 60 * n),
+               t.entry_time + make_interval(mins => 55 + 60 * n + (t.tid %% 10)::int),
+               (%(costs)s::numeric[])[k]
+        FROM transactions t
+        CROSS JOIN generate_series(0, 1) AS n
+        CROSS JOIN LATERAL (SELECT 1 + ((t.tid + n) %% cardinality(%(sids)s::bigint[]))::int AS k) s
+        WHERE t.cid = %(cid)s
+    """, {'cid': cid, 'eid': eid, 'rid': rid, 'sids': sids, 'costs': costs})
+    cur.execute("""
+        INSERT INTO payments (tid, payment_method, payment_amount, payment_time)
+        SELECT t.tid,
+               (ARRAY['Cash', 'Credit Card', 'NETS', 'PayNow', 'eWallet'])[1 + (t.tid %% 5)::int]::paymentmethod_enum,
+               t.total_cost - t.total_discount,
+               t.entry_time + INTERVAL '2 hours'
+        FROM transactions t
+        WHERE t.cid = %s
+    """, (cid,))
+    cur.execute("""
+        UPDATE transactions
+        SET exit_time = entry_time + INTERVAL '2 hours 5 minutes', status = 'completed'
+        WHERE cid = %s
+    """, (cid,))
+    cur.execute("ANALYZE")
+    return cid
+
+
+def period_starts(now):
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        'daily': today_start,
+        'weekly': today_start - timedelta(days=today_start.weekday()),
+        'monthly': today_start.replace(day=1),
+        'yearly': today_start.replace(month=1, day=1),
+    }
+
+
+def run_legacy(cur, starts, end):
+    for period in PERIODS:
+        for sql in LEGACY_SQL:
+            cur.execute(sql, {'start': starts[period], 'end': end})
+            cur.fetchall()
+
+
+def time_ms(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--visits-per-day', type=int, default=150)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--keep', action='store_true', help='keep the synthetic history')
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args()
+
+    conn = get_db()
+    cur = conn.cursor()
+
+    start = time.time()
+    cid = seed_history(cur, args.years, args.visits_per_day)
+    conn.commit()
+    cur.execute("SELECT COUNT(*) FROM transactions WHERE cid = %s", (cid,))
+    visits = cur.fetchone()[0]
+    print(f"history: {args.years} years, {visits} synthetic visits added in {time.time() - start:.1f}s")
+
+    now = datetime.now()
+    starts = period_starts(now)
+    timings = {'legacy': [], 'period_stats': []}
+    for _ in range(args.runs):
+        timings['legacy'].append(time_ms(lambda: run_legacy(cur, starts, now)))
+        timings['period_stats'].append(time_ms(lambda: get_period_stats(cur, starts, now)))
+    conn.rollback()
+
+    report = {'years': args.years, 'visits': visits, 'runs': args.runs,
+              'statements': {'legacy': len(PERIODS) * len(LEGACY_SQL), 'period_stats': 3}}
+    print(f"{'implementation':<16}{'queries':>8}{'p50':>10}{'p95':>10}  ms")
+    for impl, values in timings.items():
+        report[impl] = {'p50': percentile(values, 50), 'p95': percentile(values, 95)}
+        print(f"{impl:<16}{report['statements'][impl]:>8}"
+              f"{report[impl]['p50']:>10.2f}{report[impl]['p95']:>10.2f}")
+
+    if not args.keep:
+        cur.execute("DELETE FROM transactions WHERE cid = %s", (cid,))
+        cur.execute("DELETE FROM customers WHERE cid = %s", (cid,))
+        conn.commit()
+    cur.close()
+    conn.close()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""
+Query plan regression check for the SQL the blueprints run.
+
+Drives the read-only pages and API routes in-process through the Flask test
+client, using real ids from the database. Every statement they execute is
+captured with db.capture_queries() and run again under EXPLAIN (ANALYZE,
+BUFFERS) in a transaction that is rolled back. A query is named after its
+route endpoint and SQL fingerprint, e.g. cashier.cashier_dashboard/3f2a9c01de.
+Its plan shape (node types, tables and indexes, with partitions folded into
+their parent table), the shared buffers it touched and its execution time
+are compared with a report saved earlier:
+
+    make generate ARGS="--years 3"                      # plans only mean something at scale
+    python -m bench.query_plans --json plans.json
+    python -m bench.query_plans --compare plans.json    # exit status 1 on a regression
+
+A query regresses when its plan shape changes (the change is printed as a
+diff), when it touches more than --buffer-tolerance percent more buffers,
+or when it is more than --time-tolerance percent slower. Buffer counts
+repeat exactly on the same data, while single-query timings are noisy, so
+the time budget is looser and slowdowns under --min-ms are ignored. A new sequential scan over more than --seq-scan-rows
+rows is always a regression. The --json report is sorted and indented, so
+two reports also diff cleanly with plain diff.
+"""
+import argparse
+import difflib
+import json
+import sys
+import time
+import urllib.parse
+from datetime import date, datetime, timedelta
+from app import app
+from db import get_db, capture_queries
+from instrumentation import normalize_sql, sql_fingerprint
+from roster import load_roster, invalidate_roster
+from leaderboard import invalidate_leaderboard
+from blueprints.cashier.cache_utils import invalidate_all_dashboard_cache
+
+EXPLAINED = ('select', 'with', 'insert', 'update', 'delete')
+MIN_BUFFERS = 64                 # buffer growth below this many pages is noise
+SMALL_DATASET = 100000           # fewer visits than this and the plans are not representative
+
+# (method, path, form); {placeholders} are filled from load_fixtures()
+ROUTES = [
+    ('GET', '/', None),
+    ('GET', '/cashier/{cashier}', None),
+    ('GET', '/cashier-redis/{cashier}', None),
+    ('GET', '/cashier/new-transaction', None),
+    ('GET', '/cashier/api/search-customers?q={name_prefix}&by=name', None),
+    ('GET', '/cashier/transaction/{tid}', None),
+    ('GET', '/cashier/transaction/{tid}/schedule', None),
+    ('POST', '/cashier/transaction/{tid}/add-service-step2',
+     {'scheduled_date': '{tomorrow}', 'scheduled_hour': '18', 'scheduled_minute': '00'}),
+    ('POST', '/cashier/transaction/{tid}/add-service-step3', {'service_id': '{sid}'}),
+    ('GET', '/cashier/api/edit-options/{tid}?ttid={ttid}', None),
+    ('GET', '/api/search-customers?q={name_prefix}&by=name', None),
+    ('GET', '/api/search-customers?q={mobile_prefix}&by=mobile', None),
+    ('GET', '/api/customers?q={name_prefix}', None),
+    ('GET', '/customer/{cid}', None),
+    ('GET', '/customer/{cid}/invoices?before={invoice_before}&before_tid={invoice_before_tid}', None),
+    ('GET', '/therapist/{therapist}', None),
+    ('GET', '/therapist/{therapist}/api/schedule', None),
+    ('POST', '/management/', {'management_id': '{manager}'}),
+    ('GET', '/management/therapist-admin', None),
+    ('GET', '/management/api/search-therapists?q={therapist_prefix}', None),
+    ('GET', '/management/api/therapist/{therapist}', None),
+    ('GET', '/management/api/room-utilization?start={month_ago}&end={today}', None),
+    ('GET', '/police/day/{today}', None),
+    ('GET', '/police/week/{today}', None),
+    ('GET', '/police/6months/{today}', None),
+    ('GET', '/police/month/{today}/export.csv', None),
+    ('GET', '/police/api/visitor?id={nric}', None),
+]
+
+
+def load_fixtures(cur):
+    """Ids and search terms for ROUTES: the busiest customer, their latest visit, active staff"""
+    roster = load_roster(cur)
+    missing = [category for category in ('cashier', 'therapist', 'management') if not roster[category]]
+    if missing:
+        raise SystemExit(f"no active {', '.join(missing)} on the roster; load seeds.sql first")
+    cur.execute("""
+        SELECT c.cid, c.name, c.mobile_number, c.nric_fin_passport_no
+        FROM customer_stats cs
+        JOIN customers c ON c.cid = cs.cid
+        ORDER BY cs.visit_count DESC, cs.cid
+        LIMIT 1
+    """)
+    customer = cur.fetchone()
+    if not customer:
+        raise SystemExit("no customer has visited yet; load seeds.sql or run make generate first")
+    cid, name, mobile, nric = customer
+
+    cur.execute("""
+        SELECT h.tid, MIN(ti.ttid)
+        FROM transaction_header h
+        LEFT JOIN transaction_items ti ON ti.tid = h.tid
+        WHERE h.cid = %s
+        GROUP BY h.tid, h.entry_time
+        ORDER BY h.entry_time DESC NULLS LAST, h.tid DESC
+        LIMIT 1
+    """, (cid,))
+    tid, ttid = cur.fetchone()
+    # "Load older" cursor halfway down the customer's invoice history
+    cur.execute("""
+        SELECT entry_time, tid FROM transaction_header
+        WHERE cid = %s AND entry_time IS NOT NULL
+        ORDER BY entry_time DESC, tid DESC
+        OFFSET (SELECT COUNT(*) / 2 FROM transaction_header WHERE cid = %s)
+        LIMIT 1
+    """, (cid, cid))
+    invoice_before, invoice_before_tid = cur.fetchone() or (datetime.now(), tid)
+    cur.execute("""
+        SELECT sid FROM services
+        WHERE base_cost > 0 AND (active_until IS NULL OR active_until >= CURRENT_DATE)
+        ORDER BY sid LIMIT 1
+    """)
+    sid = cur.fetchone()[0]
+
+    today = date.today()
+    return {
+        'cashier': roster['cashier'][0][0],
+        'therapist': roster['therapist'][0][0],
+        'therapist_prefix': roster['therapist'][0][1][:2],
+        'manager': roster['management'][0][0],
+        'cid': cid,
+        'name_prefix': name[:3],
+        'mobile_prefix': mobile[:4],
+        'nric': nric,
+        'tid': tid,
+        'ttid': ttid or 0,
+        'sid': sid,
+        'invoice_before': invoice_before.isoformat(),
+        'invoice_before_tid': invoice_before_tid,
+        'today': today.isoformat(),
+        'tomorrow': (today + timedelta(days=1)).isoformat(),
+        'month_ago': (today - timedelta(days=30)).isoformat(),
+    }
+
+
+def capture_route_queries(fx):
+    """{(endpoint, fingerprint): {'route', 'sql', 'calls'}} for every statement ROUTES execute"""
+    # Cached pages only reach Postgres on a miss, so start from empty caches
+    invalidate_roster()
+    invalidate_leaderboard()
+    invalidate_all_dashboard_cache()
+
+    urls = app.url_map.bind('localhost')
+    quoted = {key: urllib.parse.quote(str(value)) for key, value in fx.items()}
+    queries = {}
+    client = app.test_client()
+    for method, path, form in ROUTES:
+        url = path.format(**quoted)
+        endpoint = urls.match(url.split('?')[0], method)[0]
+        data = {key: value.format(**fx) for key, value in form.items()} if form else None
+        with capture_queries() as statements:
+            response = client.open(url, method=method, data=data)
+            response.get_data()         # streamed exports run their queries while the body is read
+            response.close()
+        if response.status_code >= 400:
+            print(f"warning: {method} {url} returned {response.status_code}")
+        for sql in statements:
+            if not sql.lstrip().lower().startswith(EXPLAINED):
+                continue
+            key = (endpoint, sql_fingerprint(sql))
+            if key in queries:
+                queries[key]['calls'] += 1
+            else:
+                queries[key] = {'route': f"{method} {path}", 'sql': sql, 'calls': 1}
+    return queries
+
+
+def partition_parents(cur):
+    """Partition (and partition index) name -> parent name"""
+    cur.execute("""
+        SELECT c.relname, p.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+    """)
+    return dict(cur.fetchall())
+
+
+def plan_shape(node, parents):
+    """Indented plan tree; Append children that only differ by partition are listed once"""
+    label = node['Node Type']
+    if 'Strategy' in node and node['Strategy'] != 'Plain':
+        label = f"{node['Strategy']} {label}"
+    if 'Join Type' in node and node['Join Type'] != 'Inner':
+        label += f" ({node['Join Type']})"
+    if 'Index Name' in node:
+        label += f" using {parents.get(node['Index Name'], node['Index Name'])}"
+    if 'Relation Name' in node:
+        label += f" on {parents.get(node['Relation Name'], node['Relation Name'])}"
+
+    children = [plan_shape(child, parents) for child in node.get('Plans', [])]
+    if node['Node Type'] in ('Append', 'Merge Append'):
+        children = [shape for i, shape in enumerate(children) if shape not in children[:i]]
+    return [label] + ['  ' + line for shape in children for line in shape]
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def seq_scans(plan, parents, min_rows):
+    """{table: rows read} for sequential scans reading more than min_rows rows in total"""
+    scanned = {}
+    for node in plan_nodes(plan):
+        if node['Node Type'] == 'Seq Scan':
+            table = parents.get(node['Relation Name'], node['Relation Name'])
+            rows = (node['Actual Rows'] + node.get('Rows Removed by Filter', 0)) * node['Actual Loops']
+            scanned[table] = scanned.get(table, 0) + rows
+    return {table: rows for table, rows in scanned.items() if rows > min_rows}
+
+
+def explain(cur, sql, parents, repeat, min_rows):
+    """Plan facts for one statement; the statement runs `repeat` times and is rolled back each time"""
+    times = []
+    try:
+        for _ in range(repeat):
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS, TIMING OFF, FORMAT JSON) " + sql)
+            result = cur.fetchone()[0][0]
+            cur.connection.rollback()
+            times.append(result['Execution Time'])
+    except Exception as e:
+        cur.connection.rollback()
+        return {'error': str(e).strip().splitlines()[0]}
+    plan = result['Plan']
+    return {
+        'shape': plan_shape(plan, parents),
+        'buffers': plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0),
+        'ms': round(min(times), 3),
+        'rows': plan['Actual Rows'],
+        'seq_scans': seq_scans(plan, parents, min_rows),
+    }
+
+
+def find_regressions(report, baseline, args):
+    """(name, message, shape diff or None) for every regression against the baseline"""
+    regressions = []
+    for name, query in report['queries'].items():
+        base = baseline['queries'].get(name)
+        if base is None:
+            continue
+        if 'error' in query:
+            if 'error' not in base:
+                regressions.append((name, f"now fails: {query['error']}", None))
+            continue
+        if 'error' in base:
+            continue
+        if query['shape'] != base['shape']:
+            diff = difflib.unified_diff(base['shape'], query['shape'], 'baseline', 'now', lineterm='', n=2)
+            regressions.append((name, "plan shape changed", '\n'.join(diff)))
+        buffer_limit = base['buffers'] * (1 + args.buffer_tolerance / 100)
+        if query['buffers'] > buffer_limit and query['buffers'] - base['buffers'] >= MIN_BUFFERS:
+            regressions.append((name, f"buffers {base['buffers']} -> {query['buffers']}", None))
+        time_limit = base['ms'] * (1 + args.time_tolerance / 100)
+        if query['ms'] > time_limit and query['ms'] - base['ms'] >= args.min_ms:
+            regressions.append((name, f"time {base['ms']:.1f} -> {query['ms']:.1f} ms", None))
+        for table, rows in query['seq_scans'].items():
+            if table not in base['seq_scans']:
+                regressions.append((name, f"new sequential scan on {table} ({rows:,} rows)", None))
+    return regressions
+
+
+def print_report(report, baseline=None):
+    print(f"{len(report['queries'])} queries from {len(ROUTES)} routes, "
+          f"{report['visits']:,} visits in transaction_header")
+    print(f"{'query':<58}{'calls':>6}{'ms':>10}{'buffers':>9}{'base ms':>10}{'base buf':>9}  seq scans")
+    for name, query in report['queries'].items():
+        base = (baseline or {}).get('queries', {}).get(name, {})
+        if 'error' in query:
+            print(f"{name:<58}{query['calls']:>6}  error: {query['error']}")
+            continue
+        base_ms = f"{base['ms']:>10.1f}" if 'ms' in base else f"{'-':>10}"
+        base_buffers = f"{base['buffers']:>9}" if 'buffers' in base else f"{'-':>9}"
+        scans = ', '.join(f"{table} ({rows:,})" for table, rows in query['seq_scans'].items())
+        print(f"{name:<58}{query['calls']:>6}{query['ms']:>10.1f}{query['buffers']:>9}"
+              f"{base_ms}{base_buffers}  {scans}")
+    if baseline:
+        for name in sorted(set(baseline['queries']) - set(report['queries'])):
+            print(f"not run this time: {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--compare', help='compare against a report written earlier with --json')
+    parser.add_argument('--repeat', type=int, default=3, help='EXPLAIN ANALYZE runs per query (fastest counts)')
+    parser.add_argument('--buffer-tolerance', type=float, default=25, help='allowed buffer growth in percent')
+    parser.add_argument('--time-tolerance', type=float, default=100, help='allowed slowdown in percent')
+    parser.add_argument('--min-ms', type=float, default=10, help='ignore slowdowns smaller than this')
+    parser.add_argument('--seq-scan-rows', type=int, default=10000,
+                        help='report sequential scans reading more rows than this')
+    args = parser.parse_args()
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        fx = load_fixtures(cur)
+        parents = partition_parents(cur)
+        cur.execute("""
+            SELECT COALESCE(SUM(c.reltuples), 0)::bigint
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'transaction_header'::regclass AND c.reltuples > 0
+        """)
+        visits = cur.fetchone()[0]
+        conn.commit()
+        if visits < SMALL_DATASET:
+            print(f"warning: only ~{visits:,} visits; run `make generate` first for production-like plans")
+
+        started = time.time()
+        queries = capture_route_queries(fx)
+        report = {'visits': visits, 'queries': {}}
+        for (endpoint, fingerprint), query in sorted(queries.items()):
+            facts = explain(cur, query['sql'], parents, args.repeat, args.seq_scan_rows)
+            report['queries'][f"{endpoint}/{fingerprint}"] = {
+                'route': query['route'],
+                'calls': query['calls'],
+                'sql': normalize_sql(query['sql']),
+                **facts,
+            }
+        print(f"explained in {time.time() - started:.1f}s")
+    finally:
+        cur.close()
+        conn.close()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if baseline:
+        regressions = find_regressions(report, baseline, args)
+        for name, message, diff in regressions:
+            print(f"REGRESSION {name} ({report['queries'][name]['route']}): {message}")
+            if diff:
+                print(diff)
+        if regressions:
+            sys.exit(1)
+        print("no plan regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Write-heavy transaction benchmark.
+
+Replays the cashier write path (add item, change discount, take payments,
+record exit) against throwaway transactions and reports throughput plus
+update/HOT/dead-tuple counters and relation sizes for the transaction tables.
+
+Works against both the old single `transactions` table and the split
+header/totals schema, so run it once before and once after a schema change:
+
+    python -m bench.txn_writes --json before.json
+    python -m bench.txn_writes --compare before.json
+"""
+import argparse
+import json
+import time
+from db import get_db
+
+WATCHED_TABLES = ['transactions', 'transaction_header', 'transaction_totals',
+                  'transaction_items', 'payments']
+
+
+def table_stats(cur):
+    """Update counters and on-disk size for every watched table that exists"""
+    try:
+        cur.execute("SELECT pg_stat_force_next_flush()")  # PostgreSQL 15+
+    except Exception:
+        cur.connection.rollback()
+        time.sleep(1)
+
+    # Partitions are rolled up into their parent table
+    cur.execute("""
+        SELECT COALESCE(parent.relname, c.relname) AS table_name,
+               COALESCE(SUM(s.n_tup_upd), 0),
+               COALESCE(SUM(s.n_tup_hot_upd), 0),
+               COALESCE(SUM(s.n_dead_tup), 0),
+               SUM(pg_relation_size(c.oid)),
+               SUM(pg_indexes_size(c.oid))
+        FROM pg_class c
+        LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+        LEFT JOIN pg_class parent ON parent.oid = i.inhparent
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE COALESCE(parent.relname, c.relname) = ANY(%s) AND c.relkind = 'r'
+        GROUP BY 1
+        ORDER BY 1
+    """, (WATCHED_TABLES,))
+    return {row[0]: {'updates': row[1], 'hot_updates': row[2], 'dead_tuples': row[3],
+                     'heap_bytes': row[4], 'index_bytes': row[5]}
+            for row in cur.fetchall()}
+
+
+def pick_fixtures(cur):
+    """Any customer, cashier, service, therapist and room to build transactions from"""
+    cur.execute("SELECT MIN(cid) FROM customers")
+    cid = cur.fetchone()[0]
+    cur.execute("SELECT MIN(eid) FROM employees")
+    eid = cur.fetchone()[0]
+    cur.execute("SELECT sid, base_cost FROM services ORDER BY sid LIMIT 1")
+    sid, cost = cur.fetchone()
+    cur.execute("SELECT MIN(rid) FROM room")
+    rid = cur.fetchone()[0]
+    return cid, eid, sid, float(cost), rid
+
+
+def run_one(cur, fixtures):
+    """One customer visit: 2 items, a discount edit, 3 split payments, exit"""
+    cid, eid, sid, cost, rid = fixtures
+    cur.execute("""
+        INSERT INTO transactions (cid, cashier_eid, entry_time, status,
+                                  total_cost, total_discount, total_paid,
+                                  billlevel_discount, billlevel_discount_type)
+        VALUES (%s, %s, CURRENT_TIMESTAMP, 'pending', 0, 0, 0, 0, 'none')
+        RETURNING tid
+    """, (cid, eid))
+    tid = cur.fetchone()[0]
+
+    ttids = []
+    for _ in range(2):
+        cur.execute("""
+            INSERT INTO transaction_items (tid, sid, therapist_eid, rid, scheduled_start, cost)
+            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP, %s)
+            RETURNING ttid
+        """, (tid, sid, eid, rid, cost))
+        ttids.append(cur.fetchone()[0])
+
+    cur.execute("UPDATE transaction_items SET item_discount = 5 WHERE ttid = %s", (ttids[0],))
+    for ttid in ttids:
+        cur.execute("UPDATE transaction_items SET actual_start = CURRENT_TIMESTAMP WHERE ttid = %s", (ttid,))
+        cur.execute("UPDATE transaction_items SET actual_end = CURRENT_TIMESTAMP WHERE ttid = %s", (ttid,))
+
+    due = cost * 2 - 5
+    for method, amount in (('Cash', due / 3), ('NETS', due / 3), ('PayNow', due - 2 * round(due / 3, 2))):
+        cur.execute("""
+            INSERT INTO payments (tid, payment_method, payment_amount, payment_time)
+            VALUES (%s, %s::paymentmethod_enum, %s, CURRENT_TIMESTAMP)
+        """, (tid, method, round(amount, 2)))
+
+    cur.execute("""
+        UPDATE transactions
+        SET exit_time = CURRENT_TIMESTAMP + INTERVAL '1 second', status = 'completed'
+        WHERE tid = %s
+    """, (tid,))
+    return tid
+
+
+def diff_stats(before, after):
+    result = {}
+    for table, stats in after.items():
+        base = before.get(table, {})
+        result[table] = {
+            'updates': stats['updates'] - base.get('updates', 0),
+            'hot_updates': stats['hot_updates'] - base.get('hot_updates', 0),
+            'dead_tuples': stats['dead_tuples'],
+            'heap_bytes': stats['heap_bytes'] - base.get('heap_bytes', 0),
+            'index_bytes': stats['index_bytes'] - base.get('index_bytes', 0),
+        }
+    return result
+
+
+def print_report(report, baseline=None):
+    print(f"visits: {report['visits']}  elapsed: {report['elapsed']:.2f}s  "
+          f"throughput: {report['visits_per_sec']:.1f} visits/s")
+    if baseline:
+        change = (report['visits_per_sec'] / baseline['visits_per_sec'] - 1) * 100
+        print(f"baseline throughput: {baseline['visits_per_sec']:.1f} visits/s ({change:+.1f}%)")
+    print(f"{'table':<22}{'updates':>10}{'hot %':>8}{'dead':>8}{'+heap KB':>10}{'+index KB':>11}")
+    for table, s in sorted(report['tables'].items()):
+        hot = (s['hot_updates'] / s['updates'] * 100) if s['updates'] else 0.0
+        print(f"{table:<22}{s['updates']:>10}{hot:>7.1f}%{s['dead_tuples']:>8}"
+              f"{s['heap_bytes'] // 1024:>10}{s['index_bytes'] // 1024:>11}")
+    if baseline:
+        print("-- baseline --")
+        for table, s in sorted(baseline['tables'].items()):
+            hot = (s['hot_updates'] / s['updates'] * 100) if s['updates'] else 0.0
+            print(f"{table:<22}{s['updates']:>10}{hot:>7.1f}%{s['dead_tuples']:>8}"
+                  f"{s['heap_bytes'] // 1024:>10}{s['index_bytes'] // 1024:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--visits', type=int, default=2000)
+    parser.add_argument('--keep', action='store_true', help='keep the generated transactions')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--compare', help='print against a report written earlier with --json')
+    args = parser.parse_args()
+
+    conn = get_db()
+    cur = conn.cursor()
+    fixtures = pick_fixtures(cur)
+    conn.commit()
+
+    before = table_stats(cur)
+    conn.commit()
+
+    tids = []
+    start = time.time()
+    for _ in range(args.visits):
+        tids.append(run_one(cur, fixtures))
+        conn.commit()
+    elapsed = time.time() - start
+
+    after = table_stats(cur)
+    conn.commit()
+
+    report = {
+        'visits': args.visits,
+        'elapsed': elapsed,
+        'visits_per_sec': args.visits / elapsed if elapsed else 0.0,
+        'tables': diff_stats(before, after),
+    }
+
+    if not args.keep:
+        cur.execute("DELETE FROM transactions WHERE tid = ANY(%s)", (tids,))
+        conn.commit()
+    cur.close()
+    conn.close()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
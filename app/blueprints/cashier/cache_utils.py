@@ -1,5 +1,6 @@
 # cache_utils.py - Shared cache management functions
 from db import get_redis
+from metrics import record_invalidation
 import json
 from decimal import Decimal
 from datetime import datetime, date
@@ -35,6 +36,7 @@ def invalidate_transactions_cache():
     try:
         redis_client = get_redis()
         redis_client.delete(CACHE_KEY_TRANSACTIONS)
+        record_invalidation(CACHE_KEY_TRANSACTIONS)
     except Exception as e:
         print(f"Cache invalidation failed: {e}")
 
@@ -45,6 +47,7 @@ def invalidate_availability_cache():
         keys_to_delete = [CACHE_KEY_STAFF, CACHE_KEY_ROOMS, CACHE_KEY_BUSY]
         for key in keys_to_delete:
             redis_client.delete(key)
+            record_invalidation(key)
     except Exception as e:
         print(f"Cache invalidation failed: {e}")
 
@@ -1,6 +1,7 @@
 from flask import render_template, request, redirect, url_for, jsonify, session
 from . import cashier_bp
 from db import get_db
+from autocomplete import lookup_customers, index_customer
 
 @cashier_bp.route('/cashier/new-transaction')
 def new_transaction():
@@ -16,29 +17,7 @@ def search_customers_cashier():
     if not query or len(query) < 2:
         return jsonify([])
     
-    conn = get_db()
-    cur = conn.cursor()
-    
-    if search_by == 'mobile':
-        cur.execute("""
-            SELECT cid, name, mobile_number, nric_fin_passport_no, country_code
-            FROM customers
-            WHERE mobile_number ILIKE %s
-            ORDER BY name
-            LIMIT 10
-        """, (f'%{query}%',))
-    else:
-        cur.execute("""
-            SELECT cid, name, mobile_number, nric_fin_passport_no, country_code
-            FROM customers
-            WHERE name ILIKE %s
-            ORDER BY name
-            LIMIT 10
-        """, (f'%{query}%',))
-    
-    results = cur.fetchall()
-    cur.close()
-    conn.close()
+    results = lookup_customers(query, search_by)
     
     customers = []
     for row in results:
@@ -76,6 +55,8 @@ def register_customer():
         cur.close()
         conn.close()
         
+        index_customer(cid, name, mobile, nric, country_code)
+        
         return redirect(url_for('cashier.create_transaction_for_customer', cid=cid))
     
     conn = get_db()
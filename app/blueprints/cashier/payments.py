@@ -1,6 +1,7 @@
 from flask import request, redirect, url_for, flash, current_app, session
 from . import cashier_bp
 from db import get_db
+from leaderboard import refresh_leaderboard
 from .cache_utils import invalidate_transactions_cache
 import traceback
 
@@ -75,6 +76,9 @@ def add_payment(tid):
             if outstanding > 0:
                 flash(f'Outstanding balance: ${outstanding:.2f}', 'info')
         
+        # The payment may have moved the status to paid/completed
+        refresh_leaderboard(cur, tid)
+        
     except Exception as e:
         conn.rollback()
         current_app.logger.error(f"Payment failed: {str(e)}")
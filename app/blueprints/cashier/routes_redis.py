@@ -145,9 +145,7 @@ def cashier_dashboard_redis(eid):
     if cached_txn:
         transactions = json.loads(cached_txn)
         cache_hits += 1
-        print(f"CACHE HIT: {CACHE_KEY_TRANSACTIONS}")
     else:
-        print(f"CACHE MISS: {CACHE_KEY_TRANSACTIONS}")
         cur = conn.cursor()
         cur.execute("""
             SELECT t.tid, c.cid, c.name, t.entry_time,
@@ -174,9 +172,7 @@ def cashier_dashboard_redis(eid):
     if cached_staff:
         available_staff = json.loads(cached_staff)
         cache_hits += 1
-        print(f"CACHE HIT: {CACHE_KEY_STAFF}")
     else:
-        print(f"CACHE MISS: {CACHE_KEY_STAFF}")
         cur = conn.cursor()
         cur.execute("""
             SELECT e.work_name, rd.role_type
@@ -207,9 +203,7 @@ def cashier_dashboard_redis(eid):
     if cached_rooms:
         available_rooms = json.loads(cached_rooms)
         cache_hits += 1
-        print(f"CACHE HIT: {CACHE_KEY_ROOMS}")
     else:
-        print(f"CACHE MISS: {CACHE_KEY_ROOMS}")
         cur = conn.cursor()
         cur.execute("""
             SELECT rid, room_name 
@@ -234,9 +228,7 @@ def cashier_dashboard_redis(eid):
     if cached_busy:
         busy_therapists = json.loads(cached_busy)
         cache_hits += 1
-        print(f"CACHE HIT: {CACHE_KEY_BUSY}")
     else:
-        print(f"CACHE MISS: {CACHE_KEY_BUSY}")
         cur = conn.cursor()
         cur.execute("""
             SELECT e.work_name, r.room_name, c.name, ti.scheduled_end,
@@ -261,7 +253,6 @@ def cashier_dashboard_redis(eid):
     conn.close()
     
     total_time = time.time() - start_time
-    print(f"Total: {cache_hits} hits, {cache_misses} misses")
     
     return render_template('cashier_redis.html',
                          cashier=cashier,
@@ -1,7 +1,10 @@
 from flask import render_template, request, redirect, url_for, session, jsonify
 from datetime import datetime
+import json
 from . import cashier_bp
 from db import get_db, get_redis
+from leaderboard import refresh_leaderboard
+from schedule import refresh_schedules
 from .cache_utils import serialize_data, invalidate_availability_cache, invalidate_all_dashboard_cache
 
 def refresh_availability_cache(redis_client):
@@ -299,6 +302,7 @@ def add_service_final(tid):
     """, (tid, service_id, therapist_id, room_id, scheduled_start, scheduled_end, cost, item_discount, item_discount_type))
     
     conn.commit()
+    refresh_schedules(cur, therapist_id)
     
     # Clear session
     for key in [f'txn_{tid}_service_id', f'txn_{tid}_scheduled_start', f'txn_{tid}_scheduled_end']:
@@ -326,7 +330,7 @@ def delete_transaction_item(ttid):
     
     # Verify item exists and hasn't started
     cur.execute("""
-        SELECT tid, actual_start, cost 
+        SELECT tid, actual_start, cost, therapist_eid 
         FROM transaction_items 
         WHERE ttid = %s
     """, (ttid,))
@@ -355,6 +359,7 @@ def delete_transaction_item(ttid):
     """, (item[2], tid))
     
     conn.commit()
+    refresh_schedules(cur, item[3])
     cur.close()
     conn.close()
     
@@ -374,7 +379,7 @@ def start_service(ttid):
     cur = conn.cursor()
     
     cur.execute("""
-        SELECT tid, actual_start, actual_end 
+        SELECT tid, actual_start, actual_end, therapist_eid 
         FROM transaction_items 
         WHERE ttid = %s
     """, (ttid,))
@@ -397,6 +402,7 @@ def start_service(ttid):
     """, (ttid,))
     
     conn.commit()
+    refresh_schedules(cur, item[3])
     cur.close()
     conn.close()
     
@@ -416,7 +422,7 @@ def end_service(ttid):
     cur = conn.cursor()
     
     cur.execute("""
-        SELECT tid, actual_start, actual_end 
+        SELECT tid, actual_start, actual_end, therapist_eid 
         FROM transaction_items 
         WHERE ttid = %s
     """, (ttid,))
@@ -444,6 +450,8 @@ def end_service(ttid):
     """, (ttid,))
     
     conn.commit()
+    refresh_leaderboard(cur, item[0])
+    refresh_schedules(cur, item[3])
     cur.close()
     conn.close()
     
@@ -576,7 +584,7 @@ def full_edit_item():
     cur = conn.cursor()
     
     # Verify item hasn't started
-    cur.execute("SELECT actual_start, tid FROM transaction_items WHERE ttid = %s", (ttid,))
+    cur.execute("SELECT actual_start, tid, therapist_eid FROM transaction_items WHERE ttid = %s", (ttid,))
     item = cur.fetchone()
     
     if not item:
@@ -644,6 +652,7 @@ def full_edit_item():
           cost, item_discount, item_discount_type, ttid))
     
     conn.commit()
+    refresh_schedules(cur, item[2], therapist_id)
     cur.close()
     conn.close()
     
@@ -1,6 +1,7 @@
 from flask import render_template, request, redirect, url_for, session
 from . import cashier_bp
 from db import get_db
+from leaderboard import refresh_leaderboard
 from .cache_utils import invalidate_transactions_cache
 
 @cashier_bp.route('/cashier/create-transaction', methods=['POST'])
@@ -156,6 +157,7 @@ def record_exit(tid):
     """, (new_status, tid))
     
     conn.commit()
+    refresh_leaderboard(cur, tid)
     cur.close()
     conn.close()
     
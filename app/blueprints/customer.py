@@ -1,5 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, jsonify
+from datetime import datetime
 from db import get_db
+from customer_search import search_customers, escape_like
+from autocomplete import lookup_customers
+from invoice_archive import CLOSED_STATUSES, get_watermark, fetch_archived_invoices
 
 customer_bp = Blueprint('customer', __name__)
 
@@ -24,28 +28,18 @@ def customer_login():
     conn = get_db()
     cur = conn.cursor()
     
-    if search_by == 'mobile':
-        cur.execute("""
-            SELECT cid, name, mobile_number 
-            FROM customers 
-            WHERE mobile_number ILIKE %s
-            LIMIT 1
-        """, (f'%{search_term}%',))
-    elif search_by == 'name':
-        cur.execute("""
-            SELECT cid, name, mobile_number 
-            FROM customers 
-            WHERE name ILIKE %s
-            LIMIT 1
-        """, (f'%{search_term}%',))
+    if search_by in ('mobile', 'name'):
+        # Best-ranked match from the shared trigram/prefix search
+        matches = search_customers(cur, search_term, search_by, limit=1)
+        result = matches[0] if matches else None
     else:  # cid
         cur.execute("""
             SELECT cid, name, mobile_number 
             FROM customers 
             WHERE cid = %s
         """, (search_term,))
+        result = cur.fetchone()
     
-    result = cur.fetchone()
     cur.close()
     conn.close()
     
@@ -70,31 +64,8 @@ def search_customers_api():
     if not query or len(query) < 2:
         return jsonify([])
     
-    conn = get_db()
-    cur = conn.cursor()
-    
-    if search_by == 'mobile':
-        # Search by mobile number (partial match)
-        cur.execute("""
-            SELECT cid, name, mobile_number, nric_fin_passport_no
-            FROM customers
-            WHERE mobile_number ILIKE %s
-            ORDER BY name
-            LIMIT 10
-        """, (f'%{query}%',))
-    else:
-        # Search by name (partial match)
-        cur.execute("""
-            SELECT cid, name, mobile_number, nric_fin_passport_no
-            FROM customers
-            WHERE name ILIKE %s
-            ORDER BY name
-            LIMIT 10
-        """, (f'%{query}%',))
-    
-    results = cur.fetchall()
-    cur.close()
-    conn.close()
+    # Redis prefix index; falls back to the ranked trigram/mobile SQL search
+    results = lookup_customers(query, search_by)
     
     # Convert to list of dicts for JSON
     customers = []
@@ -108,71 +79,180 @@ def search_customers_api():
     
     return jsonify(customers)
 
+CUSTOMER_PAGE_SIZE = 25
+CUSTOMER_PAGE_MAX = 100
+
+# Keyset page over idx_customers_name_cid; the optional prefix filter is a
+# range on the same index, so every page costs the same however many customers
+CUSTOMER_PAGE_SQL = """
+        SELECT cid, name, mobile_number, lower(name)
+        FROM customers
+        WHERE lower(name) LIKE lower(%(prefix)s)
+          AND (%(after_name)s::text IS NULL
+               OR (lower(name), cid) > (%(after_name)s, %(after_cid)s))
+        ORDER BY lower(name), cid
+        LIMIT %(limit)s
+    """
+
+@customer_bp.route('/api/customers')
+def list_customers_api():
+    """Paginated customer list for the landing page picker.
+    
+    ?q= filters by name prefix; pass the returned `next` values back as
+    ?after_name=&after_cid= to fetch the following page.
+    """
+    query = request.args.get('q', '').strip()
+    after_name = request.args.get('after_name')
+    after_cid = request.args.get('after_cid', type=int)
+    limit = max(1, min(request.args.get('limit', CUSTOMER_PAGE_SIZE, type=int), CUSTOMER_PAGE_MAX))
+    if after_name is None or after_cid is None:
+        after_name = after_cid = None
+    
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(CUSTOMER_PAGE_SQL, {
+        'prefix': escape_like(query) + '%',
+        'after_name': after_name,
+        'after_cid': after_cid,
+        'limit': limit + 1,
+    })
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = {'after_name': page[-1][3], 'after_cid': page[-1][0]}
+    
+    return jsonify({
+        'customers': [{'cid': r[0], 'name': r[1], 'mobile': r[2]} for r in page],
+        'next': next_cursor
+    })
+
+INVOICES_PAGE_SIZE = 20
+
+INVOICE_PAGE_SQL = """
+        SELECT t.tid, t.entry_time, t.total_cost, t.total_discount, 
+               (t.total_cost - t.total_discount), t.total_paid, t.status
+        FROM transactions t
+        WHERE t.cid = %(cid)s
+          {archive_filter}
+          AND (%(before_time)s::timestamptz IS NULL
+               OR (t.entry_time, t.tid) < (%(before_time)s, %(before_tid)s))
+        ORDER BY t.entry_time DESC NULLS LAST, t.tid DESC
+        LIMIT %(limit)s
+    """
+
+# Closed invoices older than the archive watermark are served from MongoDB
+ARCHIVE_FILTER = "AND (t.entry_time >= %(watermark)s OR t.status NOT IN %(closed)s)"
+
+def fetch_invoice_page(cur, cid, before_time=None, before_tid=None, tz=None):
+    """One page of a customer's invoices, newest first, keyed on (entry_time, tid).
+
+    Returns (invoice_details, next_cursor, sql); next_cursor is None on the last page.
+    """
+    watermark = get_watermark()
+    archived = []
+    if watermark is not None:
+        try:
+            archived = fetch_archived_invoices(cid, watermark, tz=tz,
+                                               before=(before_time, before_tid) if before_time else None,
+                                               limit=INVOICES_PAGE_SIZE + 1)
+        except Exception as e:
+            print(f"Invoice archive read failed, using Postgres only: {e}")
+            watermark = None
+    
+    sql = INVOICE_PAGE_SQL.format(archive_filter=ARCHIVE_FILTER if watermark is not None else '')
+    cur.execute(sql, {
+        'cid': cid,
+        'watermark': watermark,
+        'closed': CLOSED_STATUSES,
+        'before_time': before_time,
+        'before_tid': before_tid,
+        'limit': INVOICES_PAGE_SIZE + 1,
+    })
+    rows = cur.fetchall()
+    
+    # Archived documents in the same row shape the template reads
+    archived_items = {}
+    for doc in archived:
+        rows.append((doc['tid'], doc['entry_time'], doc['total_cost'], doc['total_discount'],
+                     doc['amount_due'], doc['total_paid'], doc['status']))
+        archived_items[doc['tid']] = [
+            (i['service'], i['therapist'], i['cost'], i['item_discount'], i['net'])
+            for i in doc['items']
+        ]
+    rows.sort(key=lambda r: (r[1], r[0]), reverse=True)
+    
+    page = rows[:INVOICES_PAGE_SIZE]
+    next_cursor = None
+    if len(rows) > INVOICES_PAGE_SIZE:
+        next_cursor = {'before': page[-1][1].isoformat(), 'before_tid': page[-1][0]}
+    
+    # Items for every Postgres invoice on the page in one query
+    items_by_tid = {}
+    live_tids = [r[0] for r in page if r[0] not in archived_items]
+    if live_tids:
+        cur.execute("""
+            SELECT ti.tid, s.name, e.work_name, ti.cost, ti.item_discount, (ti.cost - ti.item_discount)
+            FROM transaction_items ti
+            JOIN services s ON ti.sid = s.sid
+            JOIN employees e ON ti.therapist_eid = e.eid
+            WHERE ti.tid = ANY(%s)
+            ORDER BY ti.tid, ti.ttid
+        """, (live_tids,))
+        for row in cur.fetchall():
+            items_by_tid.setdefault(row[0], []).append(row[1:])
+    
+    invoice_details = []
+    for inv in page:
+        items = archived_items.get(inv[0], items_by_tid.get(inv[0], []))
+        invoice_details.append({'invoice': inv, 'invoice_items': items})
+    
+    return invoice_details, next_cursor, sql
+
 @customer_bp.route('/customer/<int:cid>')
 def customer_dashboard(cid):
     """Customer dashboard"""
     conn = get_db()
     cur = conn.cursor()
     
-    # Get customer info
-    cur.execute("SELECT name FROM customers WHERE cid = %s", (cid,))
+    # Get customer info (NOW() carries the session time zone for archived rows)
+    cur.execute("SELECT name, NOW() FROM customers WHERE cid = %s", (cid,))
     customer = cur.fetchone()
     if not customer:
         return "Customer not found", 404
     
-    # SQL queries as strings to display
+    # Summary rows kept current by the customer_stats triggers
     top_therapists_sql = """
-        SELECT e.work_name, COUNT(*) as services_done
-        FROM transaction_items ti
-        JOIN employees e ON ti.therapist_eid = e.eid
-        JOIN transactions t ON ti.tid = t.tid
-        WHERE t.cid = %s AND t.status IN ('completed', 'paid')
-        GROUP BY e.eid, e.work_name
-        ORDER BY services_done DESC
+        SELECT e.work_name, cts.services_done
+        FROM customer_therapist_stats cts
+        JOIN employees e ON cts.therapist_eid = e.eid
+        WHERE cts.cid = %s AND cts.services_done > 0
+        ORDER BY cts.services_done DESC
         LIMIT 3
     """
     
-    last_therapist_sql = """
-        SELECT e.work_name, ti.actual_end, s.name
-        FROM transaction_items ti
-        JOIN employees e ON ti.therapist_eid = e.eid
-        JOIN services s ON ti.sid = s.sid
-        JOIN transactions t ON ti.tid = t.tid
-        WHERE t.cid = %s AND ti.actual_end IS NOT NULL
-        ORDER BY ti.actual_end DESC
-        LIMIT 1
+    summary_sql = """
+        SELECT e.work_name, cs.last_service_end, s.name,
+               cs.lifetime_spend, cs.visit_count, cs.last_visit
+        FROM customer_stats cs
+        LEFT JOIN employees e ON cs.last_service_eid = e.eid
+        LEFT JOIN services s ON cs.last_service_sid = s.sid
+        WHERE cs.cid = %s
     """
     
-    invoices_sql = """
-        SELECT t.tid, t.entry_time, t.total_cost, t.total_discount, 
-               (t.total_cost - t.total_discount), t.total_paid, t.status
-        FROM transactions t
-        WHERE t.cid = %s
-        ORDER BY t.entry_time DESC
-    """
-    
-    # Execute queries
     cur.execute(top_therapists_sql, (cid,))
     top_therapists = cur.fetchall()
     
-    cur.execute(last_therapist_sql, (cid,))
-    last_therapist = cur.fetchone()
+    cur.execute(summary_sql, (cid,))
+    summary = cur.fetchone()
+    last_therapist = None
+    if summary and summary[1] is not None:
+        last_therapist = (summary[0], summary[1], summary[2])
     
-    cur.execute(invoices_sql, (cid,))
-    invoices = cur.fetchall()
-    
-    # Invoice items
-    invoice_details = []
-    for inv in invoices:
-        cur.execute("""
-            SELECT s.name, e.work_name, ti.cost, ti.item_discount, (ti.cost - ti.item_discount)
-            FROM transaction_items ti
-            JOIN services s ON ti.sid = s.sid
-            JOIN employees e ON ti.therapist_eid = e.eid
-            WHERE ti.tid = %s
-        """, (inv[0],))
-        items = cur.fetchall()
-        invoice_details.append({'invoice': inv, 'invoice_items': items})
+    invoice_details, next_cursor, invoices_sql = fetch_invoice_page(cur, cid, tz=customer[1].tzinfo)
     
     cur.close()
     conn.close()
@@ -182,9 +262,36 @@ def customer_dashboard(cid):
                          cid=cid,
                          top_therapists=top_therapists,
                          last_therapist=last_therapist,
+                         summary=summary,
                          invoices=invoice_details,
+                         next_cursor=next_cursor,
                          sql_queries={
                              'top_therapists': top_therapists_sql,
-                             'last_therapist': last_therapist_sql,
+                             'last_therapist': summary_sql,
                              'invoices': invoices_sql
-                         })
\ No newline at end of file
+                         })
+
+@customer_bp.route('/customer/<int:cid>/invoices')
+def customer_invoices_page(cid):
+    """Older invoices for the dashboard's "Load older" button (HTML fragment)"""
+    before = request.args.get('before')
+    before_tid = request.args.get('before_tid', type=int)
+    if not before or before_tid is None:
+        return "Missing cursor", 400
+    try:
+        before_time = datetime.fromisoformat(before)
+    except ValueError:
+        return "Invalid cursor", 400
+    
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT NOW()")
+    tz = cur.fetchone()[0].tzinfo
+    invoice_details, next_cursor, _ = fetch_invoice_page(cur, cid, before_time, before_tid, tz=tz)
+    cur.close()
+    conn.close()
+    
+    return render_template('customer_invoices.html',
+                         cid=cid,
+                         invoices=invoice_details,
+                         next_cursor=next_cursor)
\ No newline at end of file
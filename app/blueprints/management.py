@@ -1,5 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
 from db import get_db
+from autocomplete import autocomplete_employees, index_employee
+from roster import invalidate_roster
+from leaderboard import invalidate_leaderboard
+from widgets import run_widgets, widget
+from reports import register_report, read_report, enqueue_report, REPORTS
+from room_utilization import get_room_utilization, MAX_RANGE_DAYS
 from datetime import datetime, date, timedelta
 import time
 
@@ -14,204 +20,203 @@ def debug_time():
         'timezone': time.tzname if hasattr(time, 'tzname') else 'unknown'
     })
 
-def get_payment_breakdown(cur, start_date, end_date=None):
+PERIODS = ('daily', 'weekly', 'monthly', 'yearly')
+LATE_CHANGE_DAYS = 7    # refunds, cancellations and late payments still land in a closed month
+
+
+def _period_filters(aggregate, column, condition=''):
+    """One `aggregate FILTER (...)` column per period, in PERIODS order"""
+    return ',\n               '.join(
+        f"{aggregate} FILTER (WHERE {column} >= %({period})s{condition})" for period in PERIODS
+    )
+
+
+def get_period_stats(cur, starts, end_date=None):
     """
-    Get payment breakdown by method for a given date range
-    Returns list of dicts with method and amount
+    Services, revenue, payment breakdown and averages for every period at once
+    `starts` maps each name in PERIODS to its start day; all periods end at
+    end_date's day. Reads the daily rollup tables (kept by triggers), one query
+    per rollup: the WHERE clause covers the earliest start and FILTER splits
+    the sums per period.
     """
     if end_date is None:
         end_date = datetime.now()
-    
-    query = """
+    params = {period: start.date() if isinstance(start, datetime) else start
+              for period, start in starts.items()}
+    params.update(since=min(params.values()), until=end_date.date())
+    width = len(PERIODS)
+    stats = {period: {'payments': []} for period in PERIODS}
+    
+    # Payment method breakdown, plus the () grouping set as total revenue
+    cur.execute(f"""
         SELECT 
-            p.payment_method,
-            COALESCE(SUM(p.payment_amount), 0) as total
-        FROM payments p
-        JOIN transactions t ON p.tid = t.tid
-        WHERE p.payment_time >= %s 
-          AND p.payment_time < %s
-        GROUP BY p.payment_method
-        ORDER BY total DESC
-    """
+            d.payment_method,
+            GROUPING(d.payment_method) as is_total,
+            {_period_filters('SUM(d.amount)', 'd.day', ' AND d.payments > 0')}
+        FROM daily_payment_totals d
+        WHERE d.day >= %(since)s 
+          AND d.day <= %(until)s
+        GROUP BY GROUPING SETS ((d.payment_method), ())
+    """, params)
+    
+    for period in PERIODS:
+        stats[period]['revenue'] = 0.0
+    for row in cur.fetchall():
+        for period, amount in zip(PERIODS, row[2:]):
+            if amount is None:
+                continue  # no payments of this method in the period
+            if row[1]:
+                stats[period]['revenue'] = float(amount)
+            else:
+                stats[period]['payments'].append({'method': row[0], 'amount': float(amount)})
+    for period in PERIODS:
+        stats[period]['payments'].sort(key=lambda p: p['amount'], reverse=True)
     
-    cur.execute(query, (start_date, end_date))
-    results = cur.fetchall()
+    # Services started, and completed services with their total minutes
+    cur.execute(f"""
+        SELECT 
+            {_period_filters('SUM(d.services)', 'd.day')},
+            {_period_filters('SUM(d.completed_minutes)', 'd.day')},
+            {_period_filters('SUM(d.completed_services)', 'd.day')}
+        FROM daily_therapist_totals d
+        WHERE d.day >= %(since)s 
+          AND d.day <= %(until)s
+    """, params)
+    
+    row = cur.fetchone()
+    for i, period in enumerate(PERIODS):
+        completed = row[2 * width + i] or 0
+        stats[period]['services'] = row[i] or 0
+        stats[period]['avg_duration_minutes'] = float(row[width + i]) / completed if completed else 0.0
+        stats[period]['completed_services'] = completed
     
-    return [{'method': row[0], 'amount': float(row[1])} for row in results]
+    # Average spend per visit (total transaction value / number of transactions)
+    cur.execute(f"""
+        SELECT 
+            {_period_filters('SUM(d.spend)', 'd.day')},
+            {_period_filters('SUM(d.visits)', 'd.day')}
+        FROM daily_visit_totals d
+        WHERE d.day >= %(since)s 
+          AND d.day <= %(until)s
+    """, params)
+    
+    row = cur.fetchone()
+    for i, period in enumerate(PERIODS):
+        visits = row[width + i] or 0
+        stats[period]['avg_spend_per_visit'] = float(row[i]) / visits if visits else 0.0
+        stats[period]['total_visits'] = visits
+    
+    return stats
 
 
-def get_services_and_revenue(cur, start_date, end_date=None):
-    """
-    Get total services count and revenue for a date range
-    """
-    if end_date is None:
-        end_date = datetime.now()
-    
-    # Count services (transaction items)
-    cur.execute("""
-        SELECT COUNT(*)
-        FROM transaction_items ti
-        JOIN transactions t ON ti.tid = t.tid
-        WHERE ti.actual_start >= %s 
-          AND ti.actual_start < %s
-    """, (start_date, end_date))
-    
-    services = cur.fetchone()[0]
-    
-    # Get total revenue (from payments, not transaction totals to match reality)
-    cur.execute("""
-        SELECT COALESCE(SUM(payment_amount), 0)
-        FROM payments p
-        WHERE p.payment_time >= %s 
-          AND p.payment_time < %s
-    """, (start_date, end_date))
-    
-    revenue = float(cur.fetchone()[0])
-    
-    return services, revenue
+def empty_period_stats():
+    """Zeroed get_period_stats result, shown while the real figures are unavailable"""
+    return {period: {'payments': [], 'revenue': 0.0, 'services': 0,
+                     'avg_duration_minutes': 0.0, 'completed_services': 0,
+                     'avg_spend_per_visit': 0.0, 'total_visits': 0}
+            for period in PERIODS}
 
 
-def get_room_utilization(cur):
-    """
-    Get 3 most used and 3 least used rooms using RIGHT JOIN
-    Shows ALL rooms even if never booked (0 usage)
-    """
-    query = """
+def get_top_therapists(cur, start_date, end_date):
+    """Top 5 therapists by revenue between two days: (work_name, services, revenue)"""
+    cur.execute("""
         SELECT 
-            r.room_name,
-            COUNT(ti.ttid) as booking_count,
-            COALESCE(SUM(ti.cost - ti.item_discount), 0) as revenue
-        FROM transaction_items ti
-        RIGHT JOIN room r ON ti.rid = r.rid
-        GROUP BY r.rid, r.room_name
-        ORDER BY booking_count DESC
-    """
-    cur.execute(query)
-    all_rooms = cur.fetchall()
-    
-    # Split into most used (top 3) and least used (bottom 3)
-    most_used = all_rooms[:3] if len(all_rooms) >= 3 else all_rooms
-    least_used = all_rooms[-3:] if len(all_rooms) >= 3 else all_rooms
+            e.work_name,
+            SUM(d.services) as service_count,
+            SUM(d.revenue) as revenue
+        FROM daily_therapist_totals d
+        JOIN employees e ON e.eid = d.therapist_eid
+        WHERE d.day >= %s
+          AND d.day <= %s
+        GROUP BY e.eid, e.work_name
+        HAVING SUM(d.services) > 0
+        ORDER BY revenue DESC
+        LIMIT 5
+    """, (start_date.date(), end_date.date()))
     
-    return {
-        'most_used': [{'name': r[0], 'bookings': r[1], 'revenue': float(r[2])} for r in most_used],
-        'least_used': [{'name': r[0], 'bookings': r[1], 'revenue': float(r[2])} for r in least_used]
-    }
+    return cur.fetchall()
 
 
-def get_average_metrics(cur, start_date, end_date=None):
-    """
-    Calculate average spend per visit and average service duration
-    Uses AVG function for both financial and time metrics
-    """
-    if end_date is None:
-        end_date = datetime.now()
-    
-    # Average spend per visit (total transaction value / number of transactions)
-    cur.execute("""
-        SELECT 
-            COALESCE(AVG(transaction_total), 0) as avg_spend_per_visit,
-            COUNT(*) as total_visits
-        FROM (
-            SELECT 
-                t.tid,
-                SUM(ti.cost - ti.item_discount) as transaction_total
-            FROM transactions t
-            JOIN transaction_items ti ON t.tid = ti.tid
-            WHERE t.created_at >= %s 
-              AND t.created_at < %s
-              AND t.status IN ('completed', 'paid')
-            GROUP BY t.tid
-        ) transaction_totals
-    """, (start_date, end_date))
-    
-    avg_spend_result = cur.fetchone()
-    avg_spend = float(avg_spend_result[0]) if avg_spend_result[0] else 0.0
-    total_visits = avg_spend_result[1]
-    
-    # Average service duration in minutes (actual time spent)
+def get_working_now(cur):
+    """Services in progress: (work_name, room_name, ttid, scheduled_end, minutes_left)"""
     cur.execute("""
         SELECT 
-            COALESCE(AVG(
-                EXTRACT(EPOCH FROM (ti.actual_end - ti.actual_start))/60
-            ), 0) as avg_duration_minutes,
-            COUNT(*) as completed_services
+            e.work_name,
+            r.room_name,
+            ti.ttid,
+            ti.scheduled_end,
+            EXTRACT(EPOCH FROM (ti.scheduled_end - NOW()))/60 as minutes_left
         FROM transaction_items ti
-        JOIN transactions t ON ti.tid = t.tid
+        JOIN employees e ON ti.therapist_eid = e.eid
+        JOIN room r ON ti.rid = r.rid
         WHERE ti.actual_start IS NOT NULL
-          AND ti.actual_end IS NOT NULL
-          AND ti.actual_start >= %s 
-          AND ti.actual_start < %s
-          AND t.status IN ('completed', 'paid')
-    """, (start_date, end_date))
+          AND ti.actual_end IS NULL
+          AND ti.scheduled_end > NOW()
+        ORDER BY ti.scheduled_end
+    """)
     
-    avg_duration_result = cur.fetchone()
-    avg_duration = float(avg_duration_result[0]) if avg_duration_result[0] else 0.0
-    completed_services = avg_duration_result[1]
+    return cur.fetchall()
+
+
+def get_available_therapists(cur):
+    """Active therapists with no service in progress"""
+    cur.execute("""
+        SELECT DISTINCT e.work_name
+        FROM employees e
+        JOIN roles r ON e.eid = r.eid
+        JOIN role_definition rd ON r.rdid = rd.rdid
+        WHERE rd.role_category = 'therapist'
+          AND (e.employment_end IS NULL OR e.employment_end > CURRENT_DATE)
+          AND r.start_date <= CURRENT_DATE
+          AND (r.end_date IS NULL OR r.end_date > CURRENT_DATE)
+          AND e.eid NOT IN (
+              SELECT therapist_eid 
+              FROM transaction_items 
+              WHERE actual_start IS NOT NULL 
+                AND actual_end IS NULL
+          )
+        ORDER BY e.work_name
+    """)
     
-    return {
-        'avg_spend_per_visit': avg_spend,
-        'total_visits': total_visits,
-        'avg_duration_minutes': avg_duration,
-        'completed_services': completed_services
-    }
+    return cur.fetchall()
 
 
-def get_high_spenders_last_month(cur):
+def get_high_spenders(cur, month):
     """
-    Find customers spending 30% above last month's average
-    Uses CTE with HAVING clause for post-aggregation filtering
+    Find customers spending 30% above the average of `month` (its first day)
+    Reads the per-month rows of the customer_stats summary (kept by triggers)
     """
     query = """
-        WITH monthly_stats AS (
-            -- First get the overall average
-            SELECT AVG(total_spent) as avg_spending
-            FROM (
-                SELECT SUM(ti.cost - ti.item_discount) as total_spent
-                FROM customers c
-                JOIN transactions t ON c.cid = t.cid
-                JOIN transaction_items ti ON t.tid = ti.tid
-                WHERE ti.actual_start >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '1 month')
-                  AND ti.actual_start < DATE_TRUNC('month', CURRENT_DATE)
-                  AND t.status IN ('completed', 'paid')
-                GROUP BY c.cid
-                -- HAVING can be used here if needed for minimum thresholds
-            ) customer_totals
+        WITH monthly_customer_spending AS (
+            -- Spending per customer for last month
+            SELECT cms.cid, cms.spend as total_spent, cms.visits as visit_count
+            FROM customer_monthly_spend cms
+            WHERE cms.month = %s::date
+              AND cms.visits > 0
         ),
-        monthly_customer_spending AS (
-            -- Calculate total spending per customer for last month
-            SELECT 
-                c.cid,
-                c.name,
-                c.mobile_number,
-                SUM(ti.cost - ti.item_discount) as total_spent,
-                COUNT(DISTINCT t.tid) as visit_count,
-                SUM(ti.cost - ti.item_discount) as customer_total
-            FROM customers c
-            JOIN transactions t ON c.cid = t.cid
-            JOIN transaction_items ti ON t.tid = ti.tid
-            WHERE ti.actual_start >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '1 month')
-              AND ti.actual_start < DATE_TRUNC('month', CURRENT_DATE)
-              AND t.status IN ('completed', 'paid')
-            GROUP BY c.cid, c.name, c.mobile_number
-            HAVING SUM(ti.cost - ti.item_discount) > 0  -- HAVING: Only customers who actually spent money
+        monthly_stats AS (
+            -- Overall average across customers who visited
+            SELECT AVG(total_spent) as avg_spending
+            FROM monthly_customer_spending
         )
         SELECT 
-            mcs.cid,
-            mcs.name,
-            mcs.mobile_number,
+            c.cid,
+            c.name,
+            c.mobile_number,
             mcs.total_spent,
             mcs.visit_count,
             ROUND(mcs.total_spent / NULLIF(mcs.visit_count, 0), 2) as avg_per_visit,
             ms.avg_spending as last_month_average,
             ROUND(((mcs.total_spent - ms.avg_spending) / ms.avg_spending * 100), 1) as percent_above_average
         FROM monthly_customer_spending mcs
+        JOIN customers c ON c.cid = mcs.cid
         CROSS JOIN monthly_stats ms
-        WHERE mcs.total_spent >= ms.avg_spending * 1.30
+        WHERE mcs.total_spent > 0
+          AND mcs.total_spent >= ms.avg_spending * 1.30
         ORDER BY mcs.total_spent DESC
     """
     
-    cur.execute(query)
+    cur.execute(query, (month,))
     results = cur.fetchall()
     
     return [{
@@ -226,6 +231,50 @@ def get_high_spenders_last_month(cur):
     } for row in results]
 
 
+def _last_month(today):
+    return {'month': (today.replace(day=1) - timedelta(days=1)).replace(day=1).isoformat()}
+
+
+def _month_settled(params, today):
+    month = date.fromisoformat(params['month'])
+    next_month = (month + timedelta(days=32)).replace(day=1)
+    return today >= next_month + timedelta(days=LATE_CHANGE_DAYS)
+
+
+def _last_four_weeks(today):
+    return {'start': (today - timedelta(days=27)).isoformat(), 'end': today.isoformat()}
+
+
+def _room_range(start, end):
+    """(start, end) dates from two YYYY-MM-DD strings, or None if not a valid range"""
+    try:
+        start, end = date.fromisoformat(start or ''), date.fromisoformat(end or '')
+    except ValueError:
+        return None
+    if end < start or (end - start).days >= MAX_RANGE_DAYS:
+        return None
+    return start, end
+
+
+def get_room_stats(cur, room_range=None):
+    """(room occupancy, computed_at): a custom range is computed on the spot,
+    the default four-week window comes from the report job"""
+    if room_range:
+        return get_room_utilization(cur, *room_range), datetime.now()
+    return read_report(cur, 'room_utilization')
+
+
+# Background report jobs (see reports.py): the dashboard shows the stored
+# results. Room occupancy changes with every booking and is recomputed when
+# stale (final once its window has passed); last month's high spenders are
+# final LATE_CHANGE_DAYS after the month has closed, until then late payments,
+# refunds and cancellations keep changing them.
+register_report('room_utilization', get_room_utilization, params=_last_four_weeks,
+                is_final=lambda params, today: params['end'] < today.isoformat())
+register_report('high_spenders', get_high_spenders, params=_last_month,
+                is_final=_month_settled)
+
+
 @management_bp.route('/', methods=['GET', 'POST'])
 def dashboard():
     """Main management dashboard"""
@@ -268,131 +317,73 @@ def dashboard():
     month_start = today_start.replace(day=1)
     year_start = today_start.replace(month=1, day=1)
     
-    # Get stats for each period
-    daily_services, daily_revenue = get_services_and_revenue(cur, today_start)
-    weekly_services, weekly_revenue = get_services_and_revenue(cur, week_start)
-    monthly_services, monthly_revenue = get_services_and_revenue(cur, month_start)
-    yearly_services, yearly_revenue = get_services_and_revenue(cur, year_start)
-    
-    # Get payment breakdowns
-    daily_payments = get_payment_breakdown(cur, today_start)
-    weekly_payments = get_payment_breakdown(cur, week_start)
-    monthly_payments = get_payment_breakdown(cur, month_start)
-    yearly_payments = get_payment_breakdown(cur, year_start)
-    
-    # Package data for template
-    daily = {
-        'services': daily_services,
-        'revenue': daily_revenue,
-        'payments': daily_payments
-    }
-    weekly = {
-        'services': weekly_services,
-        'revenue': weekly_revenue,
-        'payments': weekly_payments
-    }
-    monthly = {
-        'services': monthly_services,
-        'revenue': monthly_revenue,
-        'payments': monthly_payments
-    }
-    yearly = {
-        'services': yearly_services,
-        'revenue': yearly_revenue,
-        'payments': yearly_payments
-    }
-    
-    # Top 5 therapists this month
-    cur.execute("""
-        SELECT 
-            e.work_name,
-            COUNT(ti.ttid) as service_count,
-            COALESCE(SUM(ti.cost - ti.item_discount), 0) as revenue
-        FROM employees e
-        JOIN transaction_items ti ON e.eid = ti.therapist_eid
-        JOIN transactions t ON ti.tid = t.tid
-        WHERE ti.actual_start >= %s
-          AND ti.actual_start < %s
-        GROUP BY e.eid, e.work_name
-        ORDER BY revenue DESC
-        LIMIT 5
-    """, (month_start, now))
-    
-    top_therapists = cur.fetchall()
-    
-    # Currently working (services in progress)
-    cur.execute("""
-        SELECT 
-            e.work_name,
-            r.room_name,
-            ti.ttid,
-            ti.scheduled_end,
-            EXTRACT(EPOCH FROM (ti.scheduled_end - NOW()))/60 as minutes_left
-        FROM transaction_items ti
-        JOIN employees e ON ti.therapist_eid = e.eid
-        JOIN room r ON ti.rid = r.rid
-        WHERE ti.actual_start IS NOT NULL
-          AND ti.actual_end IS NULL
-          AND ti.scheduled_end > NOW()
-        ORDER BY ti.scheduled_end
-    """)
-    
-    working_now = cur.fetchall()
-    
-    # Available therapists (not in working_now)
-    cur.execute("""
-        SELECT DISTINCT e.work_name
-        FROM employees e
-        JOIN roles r ON e.eid = r.eid
-        JOIN role_definition rd ON r.rdid = rd.rdid
-        WHERE rd.role_type ILIKE '%therapist%'
-          AND (e.employment_end IS NULL OR e.employment_end > CURRENT_DATE)
-          AND r.start_date <= CURRENT_DATE
-          AND (r.end_date IS NULL OR r.end_date > CURRENT_DATE)
-          AND e.eid NOT IN (
-              SELECT therapist_eid 
-              FROM transaction_items 
-              WHERE actual_start IS NOT NULL 
-                AND actual_end IS NULL
-          )
-        ORDER BY e.work_name
-    """)
-    
-    available = cur.fetchall()
-    
-    # ========== ADVANCED SQL QUERIES ==========
-    
-    # Get room utilization (RIGHT JOIN)
-    room_stats = get_room_utilization(cur)
-    
-    # Get average metrics for all periods (AVG function)
-    daily_avg = get_average_metrics(cur, today_start)
-    weekly_avg = get_average_metrics(cur, week_start)
-    monthly_avg = get_average_metrics(cur, month_start)
-    yearly_avg = get_average_metrics(cur, year_start)
-    
-    # Get high spenders (CTE + HAVING)
-    high_spenders = get_high_spenders_last_month(cur)
-    
     cur.close()
     conn.close()
     
+    room_range = _room_range(request.args.get('room_from'), request.args.get('room_to'))
+    
+    # Independent widgets run side by side on pooled connections; a slow one
+    # falls back to its last value (or placeholder) instead of stalling the page
+    widgets, degraded = run_widgets({
+        'period_stats': widget(get_period_stats, {
+            'daily': today_start,
+            'weekly': week_start,
+            'monthly': month_start,
+            'yearly': year_start,
+        }, now, placeholder=empty_period_stats(), key=today_start),
+        'top_therapists': widget(get_top_therapists, month_start, now, placeholder=[], key=month_start),
+        'working_now': widget(get_working_now, placeholder=[]),
+        'available': widget(get_available_therapists, placeholder=[]),
+        'room_stats': widget(get_room_stats, room_range, placeholder=(None, None)),
+        'high_spenders': widget(read_report, 'high_spenders', placeholder=(None, None)),
+    })
+    stats = widgets['period_stats']
+    room_stats, room_stats_at = widgets['room_stats']
+    high_spenders, high_spenders_at = widgets['high_spenders']
+    
     return render_template('management.html',
                          manager=manager,
-                         daily=daily,
-                         weekly=weekly,
-                         monthly=monthly,
-                         yearly=yearly,
-                         top_therapists=top_therapists,
-                         working_now=working_now,
-                         available=available,
+                         daily=stats['daily'],
+                         weekly=stats['weekly'],
+                         monthly=stats['monthly'],
+                         yearly=stats['yearly'],
+                         top_therapists=widgets['top_therapists'],
+                         working_now=widgets['working_now'],
+                         available=widgets['available'],
                          # ADVANCED SQL DATA
-                         room_stats=room_stats,
-                         daily_avg=daily_avg,
-                         weekly_avg=weekly_avg,
-                         monthly_avg=monthly_avg,
-                         yearly_avg=yearly_avg,
-                         high_spenders=high_spenders)
+                         room_stats=room_stats or {'rooms': [], 'hours': [], 'most_used': [], 'least_used': []},
+                         room_stats_at=room_stats_at,
+                         daily_avg=stats['daily'],
+                         weekly_avg=stats['weekly'],
+                         monthly_avg=stats['monthly'],
+                         yearly_avg=stats['yearly'],
+                         high_spenders=high_spenders or [],
+                         high_spenders_at=high_spenders_at,
+                         degraded=degraded)
+
+
+@management_bp.route('/api/room-utilization')
+def room_utilization_api():
+    """Room occupancy (total and per hour of day) for ?start=YYYY-MM-DD&end=YYYY-MM-DD"""
+    room_range = _room_range(request.args.get('start'), request.args.get('end'))
+    if not room_range:
+        return jsonify({'error': f'start and end must be YYYY-MM-DD, at most {MAX_RANGE_DAYS} days apart'}), 400
+    
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        return jsonify(get_room_utilization(cur, *room_range))
+    finally:
+        cur.close()
+        conn.close()
+
+
+@management_bp.route('/reports/refresh', methods=['POST'])
+def refresh_reports():
+    """Queue a forced recompute of every dashboard report"""
+    queued = sum(enqueue_report(name, force=True) for name in REPORTS)
+    flash(f'{queued} report(s) queued for refresh' if queued else 'Reports are already being refreshed', 'success')
+    return redirect(url_for('management.dashboard'))
 
 
 @management_bp.route('/therapist-admin')
@@ -462,6 +453,10 @@ def add_therapist():
         ))
         
         conn.commit()
+        invalidate_roster()
+        invalidate_leaderboard()
+        index_employee(eid, request.form['work_name'], request.form['full_name'],
+                       request.form['mobile'], request.form['employment_end'] or None)
         flash(f'Therapist {request.form["work_name"]} added successfully!', 'success')
         
     except Exception as e:
@@ -480,6 +475,12 @@ def search_therapists():
     """AJAX endpoint for therapist search"""
     query = request.args.get('q', '')
     
+    # Served from the Redis index; Postgres only when it is unavailable or a
+    # 3+ character query has no prefix hit (substring matches)
+    results = autocomplete_employees(query)
+    if results or (results is not None and len(query.strip()) < 3):
+        return jsonify(results)
+    
     conn = get_db()
     cur = conn.cursor()
     
@@ -624,6 +625,10 @@ def update_therapist():
             flash('Therapist updated successfully!', 'success')
         
         conn.commit()
+        invalidate_roster()
+        invalidate_leaderboard()
+        index_employee(int(request.form['eid']), request.form['work_name'], request.form['full_name'],
+                       request.form['mobile'], new_end_date)
         
     except Exception as e:
         conn.rollback()
@@ -666,6 +671,8 @@ def add_role():
         ))
         
         conn.commit()
+        invalidate_roster()
+        invalidate_leaderboard()
         flash('Role added successfully!', 'success')
         
     except Exception as e:
@@ -694,6 +701,8 @@ def end_role():
         """, (request.form['rid'],))
         
         conn.commit()
+        invalidate_roster()
+        invalidate_leaderboard()
         flash('Role ended successfully!', 'success')
         
     except Exception as e:
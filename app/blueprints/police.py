@@ -1,61 +1,314 @@
-from flask import Blueprint, render_template, redirect, url_for
-from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, request, Response, stream_with_context, jsonify
+from datetime import datetime, date as date_type, timedelta
 from db import get_db
+import csv
+import io
+import json
 
 police_bp = Blueprint('police', __name__)
 
+PAGE_SIZE = 200             # rows per HTML page (keyset pagination)
+EXPORT_FETCH_SIZE = 2000    # rows per round trip of the export's server-side cursor
+
+PERIOD_LABELS = {
+    'day': '1 Day',
+    'week': '1 Week', 
+    'month': '1 Month (30 days)',
+    '3months': '3 Months',
+    '6months': '6 Months'
+}
+
+# Periods are half-open [date, date + span) so entry_time is compared against
+# constants and idx_transactions_entry_time can serve the range
+PERIOD_SPANS = {
+    'day': '1 day',
+    'week': '7 days',
+    'month': '30 days',
+    '3months': '3 months',
+    '6months': '6 months'
+}
+
+EXPORT_COLUMNS = ['name', 'id_number', 'nationality', 'entry_time', 'exit_time']
+
+
+def period_range(cur, period, date):
+    """
+    (start, end, live_from, live_until) days of a period: [start, end) is the
+    period and [live_from, live_until) spans its days without a snapshot
+    Elapsed days are frozen into police_snapshots the first time they are
+    asked for, unless someone who entered that day is still inside, so
+    normally only today is read from transactions. The caller commits.
+    """
+    cur.execute("SELECT %(date)s::date, (%(date)s::date + %(span)s::interval)::date",
+                {'date': date, 'span': PERIOD_SPANS.get(period, PERIOD_SPANS['day'])})
+    start, end = cur.fetchone()
+    
+    cur.execute("""
+        INSERT INTO police_snapshots (day, visitors, visits)
+        SELECT d.day, v.visitors, v.visits
+        FROM generate_series(%(start)s::date, LEAST(%(end)s::date, CURRENT_DATE) - 1, INTERVAL '1 day') AS d(day)
+        CROSS JOIN LATERAL (
+            SELECT
+                COALESCE(jsonb_agg(jsonb_build_array(
+                    c.name, c.nric_fin_passport_no, nc.default_nationality,
+                    t.entry_time, t.exit_time, t.tid
+                ) ORDER BY t.entry_time, t.tid), '[]'::jsonb) as visitors,
+                COUNT(t.tid) as visits,
+                BOOL_OR(t.exit_time IS NULL) as still_inside
+            FROM transactions t
+            JOIN customers c ON t.cid = c.cid
+            JOIN nationcode nc ON c.country_code = nc.country_code
+            WHERE t.entry_time >= d.day
+              AND t.entry_time < d.day + INTERVAL '1 day'
+        ) v
+        WHERE v.still_inside IS NOT TRUE
+          AND NOT EXISTS (SELECT 1 FROM police_snapshots s WHERE s.day = d.day)
+        ON CONFLICT (day) DO NOTHING
+    """, {'start': start, 'end': end})
+    
+    cur.execute("""
+        SELECT COALESCE(MIN(d.day)::date, %(end)s::date), COALESCE(MAX(d.day)::date + 1, %(end)s::date)
+        FROM generate_series(%(start)s::date, %(end)s::date - 1, INTERVAL '1 day') AS d(day)
+        WHERE NOT EXISTS (SELECT 1 FROM police_snapshots s WHERE s.day = d.day)
+    """, {'start': start, 'end': end})
+    return (start, end, *cur.fetchone())
+
+
+def visitor_query(keyset=False):
+    """
+    Visitor log SQL for a period_range(), ordered by (entry_time, tid) for paging and exports
+    Each day comes from its snapshot if it has one and from transactions
+    otherwise; a day still open can sit before or between frozen ones.
+    """
+    after = "WHERE (entry_time, tid) > (%(after_time)s, %(after_tid)s)" if keyset else ""
+    return f"""
+        SELECT name, nric_fin_passport_no, default_nationality, entry_time, exit_time, tid
+        FROM (
+            SELECT 
+                v->>0 as name, 
+                v->>1 as nric_fin_passport_no, 
+                v->>2 as default_nationality, 
+                (v->>3)::timestamptz as entry_time, 
+                (v->>4)::timestamptz as exit_time,
+                (v->>5)::bigint as tid
+            FROM police_snapshots s
+            CROSS JOIN jsonb_array_elements(s.visitors) v
+            WHERE s.day >= %(from_day)s
+              AND s.day < %(end)s
+            UNION ALL
+            SELECT 
+                c.name, 
+                c.nric_fin_passport_no, 
+                nc.default_nationality, 
+                t.entry_time, 
+                t.exit_time,
+                t.tid
+            FROM transactions t
+            JOIN customers c ON t.cid = c.cid
+            JOIN nationcode nc ON c.country_code = nc.country_code
+            WHERE t.entry_time >= GREATEST(%(from_day)s, %(live_from)s)
+              AND t.entry_time < %(live_until)s
+              AND NOT EXISTS (SELECT 1 FROM police_snapshots s WHERE s.day = t.entry_time::date)
+        ) visitors
+        {after}
+        ORDER BY entry_time ASC, tid ASC
+    """
+
+
+def visitor_params(cur, period, date, after_time=None, after_tid=None):
+    start, end, live_from, live_until = period_range(cur, period, date)
+    cur.connection.commit()     # keep the frozen days even if the page fails later
+    from_day = start
+    if after_time:
+        # Snapshot days before the page's first row can be skipped outright
+        cur.execute("SELECT GREATEST(%s::timestamptz::date, %s::date)", (after_time, start))
+        from_day = cur.fetchone()[0]
+    return {
+        'from_day': from_day,
+        'end': end,
+        'live_from': live_from,
+        'live_until': live_until,
+        'after_time': after_time,
+        'after_tid': after_tid,
+    }
+
+
 @police_bp.route('/police')
 def police_dashboard():
     return redirect(url_for('police.police_view', period='day', date=datetime.now().strftime('%Y-%m-%d')))
 
 @police_bp.route('/police/<period>/<date>')
 def police_view(period, date):
+    """One keyset page of the visitor log (?after_time=&after_tid= from the previous page)"""
+    after_time = request.args.get('after_time')
+    after_tid = request.args.get('after_tid', type=int)
+    keyset = bool(after_time and after_tid is not None)
+    
     conn = get_db()
     cur = conn.cursor()
-    
-    base_query = """
-        SELECT 
-            c.name, 
-            c.nric_fin_passport_no, 
-            nc.default_nationality, 
-            t.entry_time, 
-            t.exit_time
-        FROM transactions t
-        JOIN customers c ON t.cid = c.cid
-        JOIN nationcode nc ON c.country_code = nc.country_code
-        WHERE t.entry_time IS NOT NULL
-    """
-    
-    if period == 'day':
-        query = base_query + " AND t.entry_time::date = %s ORDER BY t.entry_time ASC"
-        cur.execute(query, (date,))
-    elif period == 'week':
-        query = base_query + " AND t.entry_time >= %s AND t.entry_time < %s::date + INTERVAL '7 days' ORDER BY t.entry_time ASC"
-        cur.execute(query, (date, date))
-    elif period == 'month':
-        query = base_query + " AND t.entry_time >= %s AND t.entry_time < %s::date + INTERVAL '30 days' ORDER BY t.entry_time ASC"
-        cur.execute(query, (date, date))
-    elif period == '3months':
-        query = base_query + " AND t.entry_time >= %s AND t.entry_time <= (%s::date + INTERVAL '3 months' - INTERVAL '1 day') ORDER BY t.entry_time ASC"
-        cur.execute(query, (date, date))
-    elif period == '6months':
-        query = base_query + " AND t.entry_time >= %s AND t.entry_time <= (%s::date + INTERVAL '6 months' - INTERVAL '1 day') ORDER BY t.entry_time ASC"
-        cur.execute(query, (date, date))
-    else:
-        query = base_query + " AND t.entry_time::date = %s ORDER BY t.entry_time ASC"
-        cur.execute(query, (date,))
-    
+    params = visitor_params(cur, period, date, after_time if keyset else None, after_tid)
+    params['limit'] = PAGE_SIZE + 1
+    cur.execute(visitor_query(keyset) + " LIMIT %(limit)s", params)
     records = cur.fetchall()
     cur.close()
     conn.close()
     
-    period_labels = {
-        'day': '1 Day',
-        'week': '1 Week', 
-        'month': '1 Month (30 days)',
-        '3months': '3 Months',
-        '6months': '6 Months'
-    }
-    period_label = period_labels.get(period, period)
+    # One extra row tells whether there is a next page
+    next_page = None
+    if len(records) > PAGE_SIZE:
+        records = records[:PAGE_SIZE]
+        next_page = {'after_time': records[-1][3].isoformat(), 'after_tid': records[-1][5]}
+    
+    period_label = PERIOD_LABELS.get(period, period)
+    
+    return render_template('police.html', records=records, period=period, date=date, period_label=period_label,
+                           next_page=next_page, first_page=not keyset, page_size=PAGE_SIZE)
+
+
+def stream_visitors(period, date, format_rows):
+    """Yield export chunks from a named (server-side) cursor, EXPORT_FETCH_SIZE rows at a time"""
+    conn = get_db()
+    setup = conn.cursor()
+    params = visitor_params(setup, period, date)
+    setup.close()
+    cur = conn.cursor(name='police_export')
+    try:
+        cur.execute(visitor_query(), params)
+        while True:
+            rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            yield format_rows(rows)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _csv_rows(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([r[0], r[1], r[2], _iso(r[3]), _iso(r[4]) or ''] for r in rows)
+    return buffer.getvalue()
+
+
+def _jsonl_rows(rows):
+    return ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, (r[0], r[1], r[2], _iso(r[3]), _iso(r[4]))))) + '\n'
+                   for r in rows)
+
+
+@police_bp.route('/police/<period>/<date>/export.<fmt>')
+def police_export(period, date, fmt):
+    """Full visitor log for a period as streamed CSV or JSON lines"""
+    if fmt == 'csv':
+        header = ','.join(EXPORT_COLUMNS) + '\r\n'
+        mimetype, format_rows = 'text/csv', _csv_rows
+    elif fmt == 'jsonl':
+        header = ''
+        mimetype, format_rows = 'application/x-ndjson', _jsonl_rows
+    else:
+        return "Unsupported export format", 404
+    
+    def generate():
+        yield header
+        yield from stream_visitors(period, date, format_rows)
+    
+    filename = f"police_{period}_{date}.{fmt}"
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+def _parse_day(value):
+    """date from YYYY-MM-DD, None if empty; raises ValueError if malformed"""
+    return date_type.fromisoformat(value) if value else None
+
+
+def get_visits(cur, cid, since=None, until=None, before_time=None, before_tid=None, limit=PAGE_SIZE):
+    """
+    One customer's visits newest first, as (tid, entry_time, exit_time)
+    Matches idx_transactions_cid_entry (cid, entry_time DESC NULLS LAST, tid
+    DESC), so each partition answers with one index probe however long the
+    history is.
+    """
+    conditions = ["h.cid = %(cid)s", "h.entry_time IS NOT NULL"]
+    if since:
+        conditions.append("h.entry_time >= %(since)s")
+    if until:
+        conditions.append("h.entry_time < %(until)s")
+    if before_time and before_tid is not None:
+        conditions.append("(h.entry_time, h.tid) < (%(before_time)s, %(before_tid)s)")
+    cur.execute(f"""
+        SELECT h.tid, h.entry_time, h.exit_time
+        FROM transaction_header h
+        WHERE {' AND '.join(conditions)}
+        ORDER BY h.entry_time DESC NULLS LAST, h.tid DESC
+        LIMIT %(limit)s
+    """, {
+        'cid': cid,
+        'since': since,
+        'until': until + timedelta(days=1) if until else None,
+        'before_time': before_time,
+        'before_tid': before_tid,
+        'limit': limit,
+    })
+    return cur.fetchall()
+
+
+@police_bp.route('/police/api/visitor')
+def visitor_lookup_api():
+    """
+    Entry/exit history of one person by NRIC/FIN/passport number, newest first
+    ?id=...&from=YYYY-MM-DD&to=YYYY-MM-DD (both optional, inclusive), paged
+    with ?before_time=&before_tid= from the previous response's "next".
+    """
+    id_number = (request.args.get('id') or '').strip()
+    if not id_number:
+        return jsonify({'error': 'id is required'}), 400
+    try:
+        since, until = _parse_day(request.args.get('from')), _parse_day(request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD'}), 400
+    before_time = request.args.get('before_time')
+    before_tid = request.args.get('before_tid', type=int)
+    limit = max(1, min(request.args.get('limit', PAGE_SIZE, type=int), PAGE_SIZE))
+    
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT c.cid, c.name, c.nric_fin_passport_no, nc.default_nationality
+            FROM customers c
+            JOIN nationcode nc ON c.country_code = nc.country_code
+            WHERE c.nric_fin_passport_no = %s
+        """, (id_number,))
+        customer = cur.fetchone()
+        if not customer:
+            return jsonify({'error': 'No customer with that ID', 'id_number': id_number}), 404
+        visits = get_visits(cur, customer[0], since, until, before_time, before_tid, limit + 1)
+    finally:
+        cur.close()
+        conn.close()
+    
+    # One extra row tells whether there is a next page
+    next_page = None
+    if len(visits) > limit:
+        visits = visits[:limit]
+        next_page = {'before_time': visits[-1][1].isoformat(), 'before_tid': visits[-1][0]}
     
-    return render_template('police.html', records=records, period=period, date=date, period_label=period_label)
+    return jsonify({
+        'name': customer[1],
+        'id_number': customer[2],
+        'nationality': customer[3],
+        'from': since.isoformat() if since else None,
+        'to': until.isoformat() if until else None,
+        'visits': [{
+            'tid': tid,
+            'entry_time': _iso(entry_time),
+            'exit_time': _iso(exit_time),
+            'still_inside': exit_time is None,
+        } for tid, entry_time, exit_time in visits],
+        'next': next_page,
+    })
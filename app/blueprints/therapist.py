@@ -1,5 +1,7 @@
-from flask import Blueprint, render_template, request, redirect, url_for, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, current_app, jsonify
 from db import get_db
+from leaderboard import LEADERBOARD_SQL, leaderboard_position
+from schedule import get_schedule, SCHEDULE_DAYS
 
 therapist_bp = Blueprint('therapist', __name__)
 
@@ -27,7 +29,8 @@ def therapist_dashboard(eid):
     if not therapist:
         return "Therapist not found", 404
     
-    # Jobs Today - services completed today
+    # Jobs today and yesterday - services completed, one half-open range on
+    # (therapist_eid, actual_start) split by day afterwards
     cur.execute("""
         SELECT 
             s.name as service_name,
@@ -35,109 +38,54 @@ def therapist_dashboard(eid):
             ti.actual_start,
             ti.actual_end,
             c.cid,
-            c.name as customer_name
+            c.name as customer_name,
+            ti.actual_start >= CURRENT_DATE as is_today
         FROM transaction_items ti
         JOIN services s ON ti.sid = s.sid
         JOIN transactions t ON ti.tid = t.tid
         JOIN customers c ON t.cid = c.cid
         WHERE ti.therapist_eid = %s
-            AND ti.actual_start::date = CURRENT_DATE
+            AND ti.actual_start >= CURRENT_DATE - 1
+            AND ti.actual_start < CURRENT_DATE + 1
             AND ti.actual_end IS NOT NULL
         ORDER BY ti.actual_start DESC
     """, (eid,))
-    jobs_today = cur.fetchall()
+    jobs = cur.fetchall()
+    jobs_today = [job for job in jobs if job[6]]
+    jobs_yesterday = [job for job in jobs if not job[6]]
     
-    # Jobs Yesterday - services completed yesterday
-    cur.execute("""
-        SELECT 
-            s.name as service_name,
-            ti.cost - ti.item_discount as final_cost,
-            ti.actual_start,
-            ti.actual_end,
-            c.cid,
-            c.name as customer_name
-        FROM transaction_items ti
-        JOIN services s ON ti.sid = s.sid
-        JOIN transactions t ON ti.tid = t.tid
-        JOIN customers c ON t.cid = c.cid
-        WHERE ti.therapist_eid = %s
-            AND ti.actual_start::date = CURRENT_DATE - INTERVAL '1 day'
-            AND ti.actual_end IS NOT NULL
-        ORDER BY ti.actual_start DESC
+    # Stats for different periods, summed from the daily rollup (at most a year of rows)
+    periods = [
+        ('today', "d.day = CURRENT_DATE"),
+        ('week', "d.day >= DATE_TRUNC('week', CURRENT_DATE)"),
+        ('month', "d.day >= DATE_TRUNC('month', CURRENT_DATE)"),
+        ('ytd', "d.day >= DATE_TRUNC('year', CURRENT_DATE)")
+    ]
+    columns = ',\n               '.join(
+        f"COALESCE(SUM(d.paid_services) FILTER (WHERE {sql}), 0), "
+        f"COALESCE(SUM(d.paid_revenue) FILTER (WHERE {sql}), 0)"
+        for _, sql in periods
+    )
+    cur.execute(f"""
+        SELECT {columns}
+        FROM daily_therapist_totals d
+        WHERE d.therapist_eid = %s AND d.day >= DATE_TRUNC('year', CURRENT_DATE)
     """, (eid,))
-    jobs_yesterday = cur.fetchall()
-    
-    # Stats for different periods
+    result = cur.fetchone()
     stats = {}
-    for period, sql in [
-        ('today', "ti.actual_start::date = CURRENT_DATE"),
-        ('week', "ti.actual_start >= DATE_TRUNC('week', CURRENT_DATE)"),
-        ('month', "ti.actual_start >= DATE_TRUNC('month', CURRENT_DATE)"),
-        ('ytd', "ti.actual_start >= DATE_TRUNC('year', CURRENT_DATE)")
-    ]:
-        cur.execute(f"""
-            SELECT COUNT(*), COALESCE(SUM(cost - item_discount), 0)
-            FROM transaction_items ti
-            JOIN transactions t ON ti.tid = t.tid
-            WHERE ti.therapist_eid = %s AND {sql} AND t.status IN ('completed', 'paid')
-        """, (eid,))
-        result = cur.fetchone()
-        stats[period] = (result[0], float(result[1]) if result[1] else 0.0)
+    for i, (period, _) in enumerate(periods):
+        stats[period] = (result[2 * i], float(result[2 * i + 1]))
     
     # ============================================
-    # REAL WINDOW FUNCTION - Monthly Leaderboard
+    # Monthly Leaderboard - Redis sorted set kept in step with LEADERBOARD_SQL
     # ============================================
     
-    window_function_sql = """
-WITH therapist_revenue AS (
-    SELECT 
-        e.eid,
-        e.work_name,
-        COALESCE(SUM(ti.cost - ti.item_discount), 0) as revenue
-    FROM employees e
-    JOIN roles r ON e.eid = r.eid 
-        AND r.start_date <= CURRENT_DATE
-        AND (r.end_date IS NULL OR r.end_date > CURRENT_DATE)
-    JOIN role_definition rd ON r.rdid = rd.rdid 
-        AND (rd.role_type ILIKE '%%Therapist%%' 
-             OR rd.role_type ILIKE '%%Beautician%%' 
-             OR rd.role_type ILIKE '%%Doctor%%')
-    LEFT JOIN transaction_items ti ON e.eid = ti.therapist_eid
-        AND ti.actual_start >= DATE_TRUNC('month', CURRENT_DATE)
-        AND ti.actual_end IS NOT NULL
-    LEFT JOIN transactions t ON ti.tid = t.tid AND t.status IN ('completed', 'paid')
-    WHERE (e.employment_end IS NULL OR e.employment_end >= CURRENT_DATE)
-    GROUP BY e.eid, e.work_name
-),
-ranked_therapists AS (
-    SELECT 
-        eid,
-        work_name,
-        revenue,
-        RANK() OVER (ORDER BY revenue DESC) as rank,
-        LAG(revenue, 1) OVER (ORDER BY revenue DESC) as person_above_revenue,
-        LEAD(revenue, 1) OVER (ORDER BY revenue DESC) as person_below_revenue,
-        FIRST_VALUE(revenue) OVER (ORDER BY revenue DESC) as leader_revenue,
-        COUNT(*) OVER () as total_therapists
-    FROM therapist_revenue
-)
-SELECT * FROM ranked_therapists
-WHERE eid = %(eid)s;
-    """.strip()
-        
-    # Execute window function query
-    cur.execute(window_function_sql, {'eid': eid})
-    row = cur.fetchone()
+    position = leaderboard_position(cur, eid)
     
-    if row:
-        revenue = float(row[2]) if row[2] else 0.0
-        rank = row[3]
-        person_above = float(row[4]) if row[4] else None
-        person_below = float(row[5]) if row[5] else None
-        leader_revenue = float(row[6]) if row[6] else 0.0
-        total_therapists = row[7]
+    if position:
+        revenue, rank, person_above, person_below, leader_revenue, total_therapists = position
         
-        # Calculate gaps using window function results
+        # Calculate gaps from the therapist's neighbours on the board
         gap_to_leader = leader_revenue - revenue
         
         if person_below:
@@ -155,7 +103,7 @@ WHERE eid = %(eid)s;
         
         leaderboard = {
             'eid': eid,
-            'work_name': row[1],
+            'work_name': therapist[1],
             'revenue': revenue,
             'rank': rank,
             'total_therapists': total_therapists,
@@ -170,7 +118,7 @@ WHERE eid = %(eid)s;
             'is_leader': rank == 1
         }
         
-        current_app.logger.info(f"Window Function Leaderboard: Rank {rank} of {total_therapists}, Revenue ${revenue}")
+        current_app.logger.info(f"Leaderboard: Rank {rank} of {total_therapists}, Revenue ${revenue}")
     else:
         # Therapist not found in list (shouldn't happen, but handle gracefully)
         leaderboard = {
@@ -234,6 +182,14 @@ LIMIT 5;
                          jobs_yesterday=jobs_yesterday,
                          stats=stats, 
                          leaderboard=leaderboard,
-                         window_sql=window_function_sql,
+                         window_sql=LEADERBOARD_SQL,
                          top_customers=top_customers_converted,
-                         top_customers_sql=top_customers_sql)
\ No newline at end of file
+                         top_customers_sql=top_customers_sql,
+                         schedule=get_schedule(eid),
+                         schedule_days=SCHEDULE_DAYS)
+
+
+@therapist_bp.route('/therapist/<int:eid>/api/schedule')
+def therapist_schedule_api(eid):
+    """Upcoming bookings for the next SCHEDULE_DAYS days, served from the Redis schedule cache"""
+    return jsonify({'eid': eid, 'days': SCHEDULE_DAYS, 'bookings': get_schedule(eid)})
\ No newline at end of file
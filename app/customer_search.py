@@ -0,0 +1,91 @@
+# customer_search.py - Shared customer look-up for the customer and cashier blueprints
+#
+# Names go through the pg_trgm GIN index (idx_customers_name_trgm): substring
+# matches plus typo-tolerant word similarity, ranked with prefix hits first.
+# Mobile numbers are matched on digits only: prefix via idx_customers_mobile,
+# "last N digits" via the reversed idx_customers_mobile_suffix, then any
+# substring via the trigram index once there are 3+ digits.
+import re
+
+SEARCH_LIMIT = 10
+MIN_QUERY_LENGTH = 2
+
+CUSTOMER_COLUMNS = "c.cid, c.name, c.mobile_number, c.nric_fin_passport_no, c.country_code"
+
+NAME_SEARCH_SQL = f"""
+    SELECT {CUSTOMER_COLUMNS}
+    FROM customers c
+    WHERE c.name ILIKE %(contains)s
+       OR %(q)s <%% c.name
+    ORDER BY (c.name ILIKE %(prefix)s) DESC,
+             word_similarity(%(q)s, c.name) DESC,
+             c.name
+    LIMIT %(limit)s
+"""
+
+# Two characters hold no complete trigram, so only whole-name prefixes
+NAME_PREFIX_SQL = f"""
+    SELECT {CUSTOMER_COLUMNS}
+    FROM customers c
+    WHERE lower(c.name) LIKE %(prefix)s
+    ORDER BY lower(c.name)
+    LIMIT %(limit)s
+"""
+
+MOBILE_SEARCH_SQL = f"""
+    WITH hits AS (
+        (SELECT cid, 0 AS rank FROM customers
+         WHERE mobile_number LIKE %(prefix)s
+         ORDER BY mobile_number LIMIT %(limit)s)
+        UNION ALL
+        (SELECT cid, 1 AS rank FROM customers
+         WHERE reverse(mobile_number) LIKE %(suffix)s
+         ORDER BY reverse(mobile_number) LIMIT %(limit)s)
+        UNION ALL
+        (SELECT cid, 2 AS rank FROM customers
+         WHERE %(substring)s AND mobile_number LIKE %(contains)s
+         LIMIT %(limit)s)
+    )
+    SELECT {CUSTOMER_COLUMNS}
+    FROM (SELECT cid, MIN(rank) AS rank FROM hits GROUP BY cid) h
+    JOIN customers c ON c.cid = h.cid
+    ORDER BY h.rank, c.name
+    LIMIT %(limit)s
+"""
+
+
+def escape_like(text):
+    """Escape LIKE wildcards so user input only matches literally"""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_customers(cur, query, search_by='name', limit=SEARCH_LIMIT):
+    """Ranked customer matches as (cid, name, mobile, nric, country_code) rows"""
+    query = (query or '').strip()
+
+    if search_by == 'mobile':
+        digits = re.sub(r'\D', '', query)
+        if len(digits) < MIN_QUERY_LENGTH:
+            return []
+        cur.execute(MOBILE_SEARCH_SQL, {
+            'prefix': digits + '%',
+            'suffix': digits[::-1] + '%',
+            'contains': '%' + digits + '%',
+            'substring': len(digits) >= 3,
+            'limit': limit,
+        })
+        return cur.fetchall()
+
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+    pattern = escape_like(query)
+    if len(query) < 3:
+        cur.execute(NAME_PREFIX_SQL, {'prefix': pattern.lower() + '%', 'limit': limit})
+    else:
+        cur.execute(NAME_SEARCH_SQL, {
+            'q': query,
+            'contains': '%' + pattern + '%',
+            'prefix': pattern + '%',
+            'limit': limit,
+        })
+    return cur.fetchall()
@@ -0,0 +1,165 @@
+# instrumentation.py - Per-request DB / Redis timings, Server-Timing headers and structured logs
+#
+# Cursors from db.get_db() / db.get_pool() and clients from db.get_redis()
+# report every statement and command here. While a request is running they
+# are summed on its RequestTimings, held in a ContextVar that widgets.py copies
+# into its worker threads. After the view, init_app's hooks send the totals
+# back as a Server-Timing header (visible in the browser's network panel).
+# Once the body has been sent (streamed exports included) they write one JSON
+# log line per request and pass the totals to the on_request_finished()
+# hooks (metrics.py). Statements slower than SLOW_QUERY_MS are logged on
+# their own with their fingerprint, inside a request or not.
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from flask import request
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '250'))
+SLOW_SQL_CHARS = 500                    # normalized SQL kept in a slow-query log line
+
+logger = logging.getLogger('spa.timing')
+_current = ContextVar('request_timings', default=None)
+_finished_hooks = []                    # fn(method, status, timings) after each request
+
+
+def normalize_sql(sql):
+    """Statement without literals, IN-list lengths or layout, so calls with other parameters match"""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", '?', sql)
+    sql = re.sub(r"\?(?:\s*,\s*\?)+", '?', sql)
+    return re.sub(r"\s+", ' ', sql).strip().lower()
+
+
+def sql_fingerprint(sql):
+    """Short stable id of normalize_sql(sql)"""
+    return hashlib.md5(normalize_sql(sql).encode()).hexdigest()[:10]
+
+
+def cache_family(key):
+    """Key without its id parts: spa:schedule:12 -> spa:schedule"""
+    return ':'.join(part for part in str(key).split(':')
+                    if part and not any(c.isdigit() for c in part)) or 'other'
+
+
+def log_event(event, **fields):
+    logger.info(json.dumps({'event': event, **fields}, default=str))
+
+
+class RequestTimings:
+    """What one request spent in Postgres and Redis; updated from widget threads too"""
+
+    def __init__(self, endpoint=None):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.db_ms = 0.0
+        self.db_queries = 0
+        self.db_rows = 0
+        self.redis_ms = 0.0
+        self.redis_commands = 0
+        self.cache = {}                 # key family -> [hits, misses]
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def cache_totals(self):
+        return (sum(hits for hits, _ in self.cache.values()),
+                sum(misses for _, misses in self.cache.values()))
+
+    def server_timing(self):
+        hits, misses = self.cache_totals()
+        return ', '.join([
+            f'db;dur={self.db_ms:.1f};desc="{self.db_queries} queries, {self.db_rows} rows"',
+            f'redis;dur={self.redis_ms:.1f};desc="{self.redis_commands} commands"',
+            f'cache;desc="{hits} hits, {misses} misses"',
+            f'app;dur={self.elapsed_ms():.1f}',
+        ])
+
+
+def on_request_finished(fn):
+    """Call fn(method, status, timings) once each request's body has been sent"""
+    _finished_hooks.append(fn)
+    return fn
+
+
+def current_timings():
+    """The running request's RequestTimings, or None outside a request"""
+    return _current.get()
+
+
+def record_query(sql, ms, rows):
+    timings = _current.get()
+    if timings is not None:
+        with timings.lock:
+            timings.db_ms += ms
+            timings.db_queries += 1
+            timings.db_rows += max(rows, 0)
+    if ms >= SLOW_QUERY_MS:
+        log_event('slow_query', ms=round(ms, 1), rows=rows, fingerprint=sql_fingerprint(sql),
+                  sql=normalize_sql(sql)[:SLOW_SQL_CHARS],
+                  endpoint=timings.endpoint if timings is not None else None)
+
+
+def record_redis(commands, ms):
+    timings = _current.get()
+    if timings is not None:
+        with timings.lock:
+            timings.redis_ms += ms
+            timings.redis_commands += commands
+
+
+def record_cache(key, hit):
+    timings = _current.get()
+    if timings is not None:
+        with timings.lock:
+            counts = timings.cache.setdefault(cache_family(key), [0, 0])
+            counts[0 if hit else 1] += 1
+
+
+def init_app(app):
+    """Time every request of `app`; adds the Server-Timing header and the per-request log line"""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    @app.before_request
+    def start_timing():
+        _current.set(RequestTimings(request.endpoint))
+
+    @app.after_request
+    def add_server_timing(response):
+        timings = _current.get()
+        if timings is None:
+            return response
+        response.headers['Server-Timing'] = timings.server_timing()
+        method, path = request.method, request.path
+
+        def log_request():
+            hits, misses = timings.cache_totals()
+            log_event('request', method=method, path=path, endpoint=timings.endpoint,
+                      status=response.status_code, ms=round(timings.elapsed_ms(), 1),
+                      db_ms=round(timings.db_ms, 1), db_queries=timings.db_queries, db_rows=timings.db_rows,
+                      redis_ms=round(timings.redis_ms, 1), redis_commands=timings.redis_commands,
+                      cache_hits=hits, cache_misses=misses,
+                      cache={family: {'hits': h, 'misses': m} for family, (h, m) in timings.cache.items()})
+            for hook in _finished_hooks:
+                try:
+                    hook(method, response.status_code, timings)
+                except Exception as e:
+                    print(f"Request hook {hook.__name__} failed: {e}")
+
+        # Runs after the last byte, so streamed bodies are included
+        response.call_on_close(log_request)
+        return response
+
+    @app.teardown_request
+    def stop_timing(exc):
+        _current.set(None)
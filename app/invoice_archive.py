@@ -0,0 +1,280 @@
+# invoice_archive.py - Cold archive of closed invoices in MongoDB
+#
+# Closed invoices (completed/refunded/cancelled) whose entry_time is older than
+# ARCHIVE_AFTER_DAYS are copied into self-contained documents in
+# spa_archive.invoices. A meta document records the watermark: after a
+# successful run every closed invoice that entered before it is in Mongo, so
+# readers take closed invoices older than the watermark from Mongo and
+# everything else from Postgres. Documents of invoices since deleted or
+# reopened in Postgres are removed again by the next run. Readers reuse the
+# watermark for WATERMARK_TTL seconds (it only moves forward, so an old one
+# just sends more invoices to Postgres) and, after a Mongo failure, skip Mongo
+# for RETRY_AFTER seconds instead of waiting out its timeout on every request.
+import os
+import time
+from itertools import islice
+from datetime import datetime, timezone
+from decimal import Decimal
+from bson.decimal128 import Decimal128
+from pymongo import ReplaceOne, ASCENDING, DESCENDING
+from db import get_db, get_mongo
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+CLOSED_STATUSES = ('completed', 'refunded', 'cancelled')
+META_ID = 'invoices'
+WATERMARK_TTL = 60
+RETRY_AFTER = 30
+
+_watermark = (None, 0.0)        # (watermark, monotonic time it expires)
+_unavailable_until = 0.0
+
+
+def to_mongo(value):
+    """NUMERIC -> Decimal128 so archived amounts stay exact"""
+    if isinstance(value, Decimal):
+        return Decimal128(value)
+    return value
+
+
+def from_mongo(value):
+    """Decimal128 -> Decimal, the type the templates already format"""
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return value
+
+
+def ensure_indexes(mongo):
+    mongo.invoices.create_index([('cid', ASCENDING), ('entry_time', DESCENDING), ('tid', DESCENDING)])
+    mongo.invoices.create_index([('entry_time', ASCENDING)])
+
+
+def build_invoice_documents(cur, tids):
+    """One denormalized document per tid: header, totals, items, payments, refunds"""
+    cur.execute("""
+        SELECT t.tid, t.cid, c.name, e.work_name, t.entry_time, t.exit_time, t.status,
+               t.billlevel_discount, t.billlevel_discount_type,
+               t.total_cost, t.total_discount, t.total_paid
+        FROM transactions t
+        JOIN customers c ON t.cid = c.cid
+        LEFT JOIN employees e ON t.cashier_eid = e.eid
+        WHERE t.tid = ANY(%s)
+    """, (tids,))
+    docs = {}
+    for row in cur.fetchall():
+        docs[row[0]] = {
+            '_id': row[0],
+            'tid': row[0],
+            'cid': row[1],
+            'customer_name': row[2],
+            'cashier': row[3],
+            'entry_time': row[4],
+            'exit_time': row[5],
+            'status': row[6],
+            'billlevel_discount': to_mongo(row[7]),
+            'billlevel_discount_type': row[8],
+            'total_cost': to_mongo(row[9]),
+            'total_discount': to_mongo(row[10]),
+            'amount_due': to_mongo(row[9] - row[10]),
+            'total_paid': to_mongo(row[11]),
+            'items': [],
+            'payments': [],
+            'refunds': [],
+        }
+
+    cur.execute("""
+        SELECT ti.tid, ti.ttid, s.name, e.work_name, r.room_name,
+               ti.scheduled_start, ti.scheduled_end, ti.actual_start, ti.actual_end,
+               ti.cost, ti.item_discount, ti.item_discount_type
+        FROM transaction_items ti
+        JOIN services s ON ti.sid = s.sid
+        LEFT JOIN employees e ON ti.therapist_eid = e.eid
+        LEFT JOIN room r ON ti.rid = r.rid
+        WHERE ti.tid = ANY(%s)
+        ORDER BY ti.tid, ti.ttid
+    """, (tids,))
+    for row in cur.fetchall():
+        docs[row[0]]['items'].append({
+            'ttid': row[1],
+            'service': row[2],
+            'therapist': row[3],
+            'room': row[4],
+            'scheduled_start': row[5],
+            'scheduled_end': row[6],
+            'actual_start': row[7],
+            'actual_end': row[8],
+            'cost': to_mongo(row[9]),
+            'item_discount': to_mongo(row[10]),
+            'item_discount_type': row[11],
+            'net': to_mongo(row[9] - row[10]),
+        })
+
+    cur.execute("""
+        SELECT tid, pid, payment_method, payment_amount, payment_time
+        FROM payments
+        WHERE tid = ANY(%s)
+        ORDER BY tid, payment_time
+    """, (tids,))
+    for row in cur.fetchall():
+        docs[row[0]]['payments'].append({
+            'pid': row[1], 'method': row[2], 'amount': to_mongo(row[3]), 'time': row[4]
+        })
+
+    cur.execute("""
+        SELECT tid, refid, refund_method, refund_amount, refund_reason, refund_time
+        FROM refunds
+        WHERE tid = ANY(%s)
+        ORDER BY tid, refund_time
+    """, (tids,))
+    for row in cur.fetchall():
+        docs[row[0]]['refunds'].append({
+            'refid': row[1], 'method': row[2], 'amount': to_mongo(row[3]),
+            'reason': row[4], 'time': row[5]
+        })
+
+    return list(docs.values())
+
+
+def remove_stale_documents(mongo, cur, watermark, batch_size=1000):
+    """Delete archived documents whose invoice is no longer closed in Postgres; returns the count.
+
+    Only documents from the oldest invoice still in Postgres onwards are
+    checked: older ones belong to months detached from the database
+    (scripts/partitions.py detach), of which the archive is the only copy.
+    Their ids are streamed and checked batch_size at a time, so memory stays
+    flat however large the archive grows.
+    """
+    cur.execute("SELECT MIN(entry_time) FROM transaction_header")
+    live_from = cur.fetchone()[0]
+    if live_from is None:
+        return 0
+    docs = mongo.invoices.find({'entry_time': {'$gte': live_from, '$lt': watermark}},
+                               {'_id': 1}).batch_size(batch_size)
+    removed = 0
+    while True:
+        batch = [doc['_id'] for doc in islice(docs, batch_size)]
+        if not batch:
+            break
+        cur.execute("""
+            SELECT tid FROM transaction_totals
+            WHERE tid = ANY(%s) AND status IN %s
+        """, (batch, CLOSED_STATUSES))
+        closed = {row[0] for row in cur.fetchall()}
+        stale = [tid for tid in batch if tid not in closed]
+        if stale:
+            mongo.invoices.delete_many({'_id': {'$in': stale}})
+            removed += len(stale)
+    return removed
+
+
+def archive_closed_invoices(days=ARCHIVE_AFTER_DAYS, batch_size=500):
+    """Copy closed invoices older than `days` into Mongo; returns (written, removed).
+
+    Only invoices entered since the previous watermark, or changed since the
+    previous run (e.g. refunded later), are copied again. Documents of invoices
+    deleted or reopened since are removed.
+    """
+    mongo = get_mongo()
+    ensure_indexes(mongo)
+    meta = mongo.archive_meta.find_one({'_id': META_ID}) or {}
+    prev_watermark = meta.get('watermark')
+    prev_run = meta.get('last_run')
+
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT NOW(), NOW() - make_interval(days => %s)", (days,))
+    run_started, cutoff = cur.fetchone()
+    if prev_watermark and prev_watermark > cutoff:
+        cutoff = prev_watermark
+
+    cur.execute("""
+        SELECT tid
+        FROM transactions
+        WHERE entry_time < %s
+          AND status IN %s
+          AND (%s::timestamptz IS NULL
+               OR entry_time >= %s
+               OR updated_at >= %s)
+        ORDER BY tid
+    """, (cutoff, CLOSED_STATUSES, prev_watermark, prev_watermark, prev_run))
+    tids = [row[0] for row in cur.fetchall()]
+
+    written = 0
+    for i in range(0, len(tids), batch_size):
+        docs = build_invoice_documents(cur, tids[i:i + batch_size])
+        now = datetime.now(timezone.utc)
+        ops = [ReplaceOne({'_id': d['_id']}, dict(d, archived_at=now), upsert=True)
+               for d in docs]
+        if ops:
+            mongo.invoices.bulk_write(ops, ordered=False)
+        written += len(ops)
+
+    removed = remove_stale_documents(mongo, cur, cutoff)
+    cur.close()
+    conn.close()
+
+    mongo.archive_meta.replace_one(
+        {'_id': META_ID},
+        {'_id': META_ID, 'watermark': cutoff, 'last_run': run_started,
+         'archived': written, 'removed': removed},
+        upsert=True
+    )
+    return written, removed
+
+
+def _mark_unavailable(e):
+    global _unavailable_until
+    _unavailable_until = time.monotonic() + RETRY_AFTER
+    print(f"Invoice archive unavailable, Postgres only for {RETRY_AFTER}s: {e}")
+
+
+def get_watermark():
+    """Entry-time watermark of the archive, or None when Mongo is unavailable/empty"""
+    global _watermark
+    now = time.monotonic()
+    if now < _unavailable_until:
+        return None
+    watermark, expires = _watermark
+    if now < expires:
+        return watermark
+    try:
+        meta = get_mongo().archive_meta.find_one({'_id': META_ID})
+    except Exception as e:
+        _mark_unavailable(e)
+        return None
+    watermark = meta['watermark'] if meta else None
+    _watermark = (watermark, now + WATERMARK_TTL)
+    return watermark
+
+
+def fetch_archived_invoices(cid, watermark, tz=None, before=None, limit=None):
+    """Archived invoices of a customer, newest first, as plain dicts.
+
+    `before` is an (entry_time, tid) keyset cursor; only older invoices are
+    returned. Mongo hands datetimes back in UTC; pass `tz` to show them in the
+    same zone as the rows read from Postgres.
+    """
+    def convert(value):
+        value = from_mongo(value)
+        if tz is not None and isinstance(value, datetime):
+            return value.astimezone(tz)
+        return value
+
+    query = {'cid': cid, 'entry_time': {'$lt': watermark}}
+    if before is not None:
+        before_time, before_tid = before
+        query['$or'] = [{'entry_time': {'$lt': before_time}},
+                        {'entry_time': before_time, 'tid': {'$lt': before_tid}}]
+    docs = get_mongo().invoices.find(query).sort([('entry_time', DESCENDING), ('tid', DESCENDING)])
+    if limit:
+        docs = docs.limit(limit)
+    invoices = []
+    try:
+        for doc in docs:
+            doc = {k: convert(v) for k, v in doc.items()}
+            for key in ('items', 'payments', 'refunds'):
+                doc[key] = [{k: convert(v) for k, v in sub.items()} for sub in doc[key]]
+            invoices.append(doc)
+    except Exception as e:
+        _mark_unavailable(e)
+        raise
+    return invoices
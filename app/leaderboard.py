@@ -0,0 +1,157 @@
+# leaderboard.py - Monthly therapist revenue leaderboard as a Redis sorted set
+#
+# One sorted set per month (eid -> revenue from ended services on completed /
+# paid transactions), so a therapist's rank, neighbours and the leader come
+# from O(log n) ZSET lookups instead of ranking every therapist in SQL on each
+# page view. Writers call refresh_leaderboard(tid) after committing a change
+# that can move revenue (service ended, payment made, exit recorded); it sets
+# the affected therapists' scores from the daily rollup, so repeated or
+# out-of-order calls are harmless. The set is rebuilt from LEADERBOARD_SQL when
+# it is missing, after staff/role changes, and on the first read after
+# midnight (nightly reconciliation).
+from db import get_redis
+from metrics import record_invalidation
+
+LEADERBOARD_PREFIX = "spa:leaderboard:"          # + YYYY-MM -> ZSET eid -> revenue
+LEADERBOARD_KEEP_DAYS = 40                       # old months linger this long after a rebuild
+
+# The leaderboard's definition: every active therapist with this month's revenue
+LEADERBOARD_SQL = """
+WITH therapist_revenue AS (
+    SELECT
+        e.eid,
+        e.work_name,
+        COALESCE(SUM(ti.cost - ti.item_discount), 0) as revenue
+    FROM employees e
+    JOIN roles r ON e.eid = r.eid
+        AND r.start_date <= CURRENT_DATE
+        AND (r.end_date IS NULL OR r.end_date > CURRENT_DATE)
+    JOIN role_definition rd ON r.rdid = rd.rdid
+        AND rd.role_category = 'therapist'
+    LEFT JOIN (transaction_items ti
+               JOIN transactions t ON ti.tid = t.tid AND t.status IN ('completed', 'paid'))
+        ON e.eid = ti.therapist_eid
+        AND ti.actual_start >= DATE_TRUNC('month', CURRENT_DATE)
+        AND ti.actual_end IS NOT NULL
+    WHERE (e.employment_end IS NULL OR e.employment_end >= CURRENT_DATE)
+    GROUP BY e.eid, e.work_name
+)
+SELECT
+    eid,
+    work_name,
+    revenue,
+    RANK() OVER (ORDER BY revenue DESC) as rank,
+    LAG(revenue, 1) OVER (ORDER BY revenue DESC) as person_above_revenue,
+    LEAD(revenue, 1) OVER (ORDER BY revenue DESC) as person_below_revenue,
+    FIRST_VALUE(revenue) OVER (ORDER BY revenue DESC) as leader_revenue,
+    COUNT(*) OVER () as total_therapists
+FROM therapist_revenue
+""".strip()
+
+
+def _month_key(cur):
+    cur.execute("""
+        SELECT TO_CHAR(CURRENT_DATE, 'YYYY-MM'),
+               CEIL(EXTRACT(EPOCH FROM (CURRENT_DATE + 1)::timestamptz - NOW()))::int
+    """)
+    month, seconds_to_midnight = cur.fetchone()
+    return LEADERBOARD_PREFIX + month, max(seconds_to_midnight, 1)
+
+
+def rebuild_leaderboard(cur):
+    """
+    Reconcile this month's set with LEADERBOARD_SQL
+    Returns (therapists, drifted): how many members the set now has, and how
+    many had a missing or different score before the rebuild.
+    """
+    key, seconds_to_midnight = _month_key(cur)
+    cur.execute(LEADERBOARD_SQL)
+    scores = {str(row[0]): float(row[2]) for row in cur.fetchall()}
+
+    redis_client = get_redis()
+    current = dict(redis_client.zrange(key, 0, -1, withscores=True))
+    drifted = sum(1 for eid, score in scores.items() if abs(current.get(eid, -1) - score) > 0.005)
+    drifted += len(set(current) - set(scores))
+
+    pipe = redis_client.pipeline()
+    pipe.delete(key)
+    if scores:
+        pipe.zadd(key, scores)
+    pipe.expire(key, LEADERBOARD_KEEP_DAYS * 86400)
+    pipe.setex(key + ":built", seconds_to_midnight, 1)
+    pipe.execute()
+    return len(scores), drifted
+
+
+def invalidate_leaderboard():
+    """Force a rebuild on the next read (call after committing employee/role changes)"""
+    try:
+        redis_client = get_redis()
+        for key in redis_client.scan_iter(LEADERBOARD_PREFIX + "*:built"):
+            redis_client.delete(key)
+        record_invalidation(LEADERBOARD_PREFIX)
+    except Exception as e:
+        print(f"Leaderboard invalidation failed: {e}")
+
+
+def refresh_leaderboard(cur, tid):
+    """Re-score the therapists of transaction `tid` (call after committing the change)"""
+    try:
+        key, _ = _month_key(cur)
+        cur.execute("""
+            SELECT ti.therapist_eid,
+                   COALESCE((SELECT SUM(d.completed_revenue)
+                             FROM daily_therapist_totals d
+                             WHERE d.therapist_eid = ti.therapist_eid
+                               AND d.day >= DATE_TRUNC('month', CURRENT_DATE)), 0)
+            FROM (SELECT DISTINCT therapist_eid FROM transaction_items
+                  WHERE tid = %s AND therapist_eid IS NOT NULL) ti
+        """, (tid,))
+        scores = {str(eid): float(revenue) for eid, revenue in cur.fetchall()}
+        if scores:
+            # XX: only therapists already on the board; new ones arrive with the next rebuild
+            get_redis().zadd(key, scores, xx=True)
+    except Exception as e:
+        print(f"Leaderboard update failed: {e}")
+
+
+def leaderboard_position(cur, eid):
+    """
+    (revenue, rank, person_above_revenue, person_below_revenue, leader_revenue,
+    total_therapists) for `eid`, matching one row of LEADERBOARD_SQL, or None
+    if `eid` is not on the board. Falls back to SQL when Redis is unavailable.
+    """
+    try:
+        redis_client = get_redis()
+        key, _ = _month_key(cur)
+        if not redis_client.exists(key + ":built"):
+            rebuild_leaderboard(cur)
+
+        pipe = redis_client.pipeline()
+        pipe.zscore(key, eid)
+        pipe.zrevrank(key, eid)
+        pipe.zcard(key)
+        pipe.zrevrange(key, 0, 0, withscores=True)
+        score, position, total, leader = pipe.execute()
+        if score is None:
+            return None
+
+        # RANK() semantics: ties share a rank, so count the strictly higher scores
+        pipe = redis_client.pipeline()
+        pipe.zcount(key, f"({score}", "+inf")
+        pipe.zrevrange(key, max(position - 1, 0), position + 1, withscores=True)
+        higher, window = pipe.execute()
+        above = window[0][1] if position > 0 else None
+        below_index = 2 if position > 0 else 1
+        below = window[below_index][1] if len(window) > below_index else None
+        return score, higher + 1, above, below, leader[0][1], total
+    except Exception as e:
+        print(f"Leaderboard lookup failed, using SQL: {e}")
+
+    cur.execute(f"SELECT * FROM ({LEADERBOARD_SQL}) board WHERE eid = %s", (eid,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    revenue, rank, above, below, leader, total = row[2:]
+    return (float(revenue), rank, float(above) if above is not None else None,
+            float(below) if below is not None else None, float(leader), total)
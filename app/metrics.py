@@ -0,0 +1,208 @@
+# metrics.py - Prometheus text-format /metrics endpoint
+#
+# Request figures come from instrumentation.py: once a request has finished,
+# its latency goes into a histogram per endpoint (blueprint.view) and its DB
+# time and cache hits / misses are added to the counters below. Pool, Redis
+# and queue figures are read when /metrics is scraped. Everything is kept in
+# this process only and starts again from zero when the app restarts, which
+# Prometheus' rate() and increase() already allow for.
+import threading
+import time
+from flask import Response
+from db import get_pool, get_redis, get_redis_pool, get_db, DB_POOL_SIZE
+from instrumentation import on_request_finished, cache_family
+from reports import REPORT_QUEUE
+from widgets import pending_widgets
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)   # seconds
+SCRAPE_TIMEOUT = 2      # seconds per source, well inside Prometheus' default 10s scrape timeout
+
+_lock = threading.Lock()
+_latency = {}           # (endpoint, method) -> [bucket counts..., +Inf count, sum]
+_requests = {}          # (endpoint, method, status) -> count
+_db_seconds = {}        # endpoint -> seconds spent in Postgres
+_db_queries = {}        # endpoint -> statements run
+_cache = {}             # key family -> [hits, misses]
+_invalidations = {}     # key family -> count
+_started = time.time()
+
+
+def _observe(method, status, timings):
+    endpoint = timings.endpoint or 'unmatched'
+    seconds = timings.elapsed_ms() / 1000
+    with _lock:
+        counts = _latency.setdefault((endpoint, method), [0] * (len(LATENCY_BUCKETS) + 1) + [0.0])
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                counts[i] += 1
+        counts[-2] += 1
+        counts[-1] += seconds
+        key = (endpoint, method, str(status))
+        _requests[key] = _requests.get(key, 0) + 1
+        _db_seconds[endpoint] = _db_seconds.get(endpoint, 0.0) + timings.db_ms / 1000
+        _db_queries[endpoint] = _db_queries.get(endpoint, 0) + timings.db_queries
+        for family, (hits, misses) in timings.cache.items():
+            total = _cache.setdefault(family, [0, 0])
+            total[0] += hits
+            total[1] += misses
+
+
+on_request_finished(_observe)
+
+
+def record_invalidation(key):
+    """Count one invalidation of key's family (call from the invalidate_* helpers)"""
+    family = cache_family(key)
+    with _lock:
+        _invalidations[family] = _invalidations.get(family, 0) + 1
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+class _Exposition:
+    """Prometheus text format, one HELP/TYPE block per metric"""
+
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, help_text, samples):
+        """samples: [(labels dict, value)], or [(suffix, labels dict, value)] for histograms"""
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} {kind}')
+        for sample in samples:
+            suffix, labels, value = sample if len(sample) == 3 else ('', *sample)
+            label_text = ','.join(f'{k}="{_label(v)}"' for k, v in labels.items())
+            self.lines.append(f'{name}{suffix}{{{label_text}}} {_number(value)}' if label_text
+                              else f'{name}{suffix} {_number(value)}')
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def _request_metrics(out):
+    with _lock:
+        latency = {key: list(counts) for key, counts in _latency.items()}
+        requests = dict(_requests)
+        db_seconds, db_queries = dict(_db_seconds), dict(_db_queries)
+        cache = {family: list(counts) for family, counts in _cache.items()}
+        invalidations = dict(_invalidations)
+
+    samples = []
+    for (endpoint, method), counts in sorted(latency.items()):
+        labels = {'endpoint': endpoint, 'method': method}
+        for bound, count in zip(LATENCY_BUCKETS, counts):
+            samples.append(('_bucket', {**labels, 'le': f'{bound:g}'}, count))
+        samples.append(('_bucket', {**labels, 'le': '+Inf'}, counts[-2]))
+        samples.append(('_sum', labels, counts[-1]))
+        samples.append(('_count', labels, counts[-2]))
+    out.metric('spa_http_request_duration_seconds', 'histogram',
+               'Time from before_request until the response body was sent', samples)
+    out.metric('spa_http_requests_total', 'counter', 'Requests by endpoint, method and status',
+               [({'endpoint': e, 'method': m, 'status': s}, n) for (e, m, s), n in sorted(requests.items())])
+    out.metric('spa_http_request_db_seconds_total', 'counter', 'Postgres time spent by requests, per endpoint',
+               [({'endpoint': e}, v) for e, v in sorted(db_seconds.items())])
+    out.metric('spa_http_request_db_queries_total', 'counter', 'Statements run by requests, per endpoint',
+               [({'endpoint': e}, v) for e, v in sorted(db_queries.items())])
+
+    out.metric('spa_cache_hits_total', 'counter', 'Redis GET hits during requests, per key family',
+               [({'family': f}, hits) for f, (hits, _) in sorted(cache.items())])
+    out.metric('spa_cache_misses_total', 'counter', 'Redis GET misses during requests, per key family',
+               [({'family': f}, misses) for f, (_, misses) in sorted(cache.items())])
+    out.metric('spa_cache_hit_ratio', 'gauge', 'Hits / (hits + misses) since start, per key family',
+               [({'family': f}, hits / (hits + misses)) for f, (hits, misses) in sorted(cache.items())
+                if hits + misses])
+    out.metric('spa_cache_invalidations_total', 'counter',
+               'Cache invalidations after writes to the tables behind them, per key family',
+               [({'family': f}, n) for f, n in sorted(invalidations.items())])
+
+
+def _db_metrics(out):
+    # Not created by a scrape: it would connect, and it is empty until a dashboard uses it
+    pool = get_pool(create=False)
+    # ThreadedConnectionPool keeps checked-out connections in _used and idle ones in _pool
+    out.metric('spa_db_pool_connections', 'gauge', 'Connections of the shared widget pool by state',
+               [({'state': 'in_use'}, len(pool._used) if pool else 0),
+                ({'state': 'idle'}, len(pool._pool) if pool else 0)])
+    out.metric('spa_db_pool_max_connections', 'gauge', 'Size limit of the shared widget pool',
+               [({}, DB_POOL_SIZE)])
+    out.metric('spa_db_pool_waiting', 'gauge', 'Widget queries queued for a worker thread and pooled connection',
+               [({}, pending_widgets())])
+
+    # get_db() connections are not pooled, so count them on the server
+    # One attempt: get_db()'s retries would outlast the scrape when Postgres is down
+    conn = get_db(max_retries=1, connect_timeout=SCRAPE_TIMEOUT)
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT COALESCE(state, 'unknown'), COUNT(*), COUNT(*) FILTER (WHERE wait_event_type = 'Lock')
+            FROM pg_stat_activity
+            WHERE datname = current_database() AND pid <> pg_backend_pid()
+            GROUP BY 1
+        """)
+        rows = cur.fetchall()
+        cur.close()
+    finally:
+        conn.close()
+    out.metric('spa_db_backends', 'gauge', 'Server connections to this database by state',
+               [({'state': state}, n) for state, n, _ in rows])
+    out.metric('spa_db_backends_waiting_on_locks', 'gauge', 'Server connections blocked on a lock',
+               [({}, sum(waiting for _, _, waiting in rows))])
+
+
+def _redis_metrics(out):
+    pool = get_redis_pool()
+    # redis-py 5 keeps these as plain attributes of ConnectionPool
+    out.metric('spa_redis_pool_connections', 'gauge', 'Connections of the shared Redis pool by state',
+               [({'state': 'in_use'}, len(pool._in_use_connections)),
+                ({'state': 'idle'}, len(pool._available_connections))])
+    out.metric('spa_redis_pool_created_connections', 'gauge', 'Connections the Redis pool has opened',
+               [({}, pool._created_connections)])
+
+    # Own connection with a socket timeout, so a hung Redis cannot stall the scrape
+    redis_client = get_redis(timeout=SCRAPE_TIMEOUT)
+    try:
+        info = redis_client.info()
+        queue_depth = redis_client.llen(REPORT_QUEUE)
+    finally:
+        redis_client.close()
+    out.metric('spa_redis_connected_clients', 'gauge', 'Clients connected to the Redis server',
+               [({}, info.get('connected_clients', 0))])
+    out.metric('spa_redis_used_memory_bytes', 'gauge', 'Memory used by the Redis server',
+               [({}, info.get('used_memory', 0))])
+    out.metric('spa_redis_keyspace_hits_total', 'counter', 'Server-wide key lookups that found the key',
+               [({}, info.get('keyspace_hits', 0))])
+    out.metric('spa_redis_keyspace_misses_total', 'counter', 'Server-wide key lookups that did not',
+               [({}, info.get('keyspace_misses', 0))])
+    out.metric('spa_redis_evicted_keys_total', 'counter', 'Keys evicted for the memory limit',
+               [({}, info.get('evicted_keys', 0))])
+    out.metric('spa_report_queue_depth', 'gauge', 'Report jobs waiting for the report worker',
+               [({}, queue_depth)])
+
+
+def render_metrics():
+    """All metrics as Prometheus text; a source that is down only loses its own block"""
+    out = _Exposition()
+    out.metric('spa_process_start_time_seconds', 'gauge', 'Unix time the app process started',
+               [({}, _started)])
+    _request_metrics(out)
+    for name, collect in (('postgres', _db_metrics), ('redis', _redis_metrics)):
+        ok = 1
+        try:
+            collect(out)
+        except Exception as e:
+            print(f"Metrics from {name} failed: {e}")
+            ok = 0
+        out.metric(f'spa_{name}_up', 'gauge', f'Whether the {name} metrics could be read', [({}, ok)])
+    return out.text()
+
+
+def init_metrics(app):
+    """Serve render_metrics() at /metrics"""
+    app.add_url_rule('/metrics', 'metrics',
+                     lambda: Response(render_metrics(), mimetype='text/plain; version=0.0.4'))
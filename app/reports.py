@@ -0,0 +1,194 @@
+# reports.py - Background report jobs with stored, timestamped results
+#
+# Heavier management analytics are registered here as reports: a function
+# fn(cur, **params) returning something JSON-serializable. The dashboard only
+# reads the latest stored result (report_results); computing happens in the
+# report worker (scripts/reports.py worker), which takes jobs from a Redis
+# list and re-queues stale results on a schedule. Results over closed periods
+# are stored as final and served forever without being recomputed. The same
+# loop runs the registered maintenance tasks (register_task) at their interval.
+import json
+import os
+import time
+from datetime import date
+from psycopg2.extras import Json
+from db import get_db, get_redis
+
+REPORT_QUEUE = "spa:reports:queue"
+REPORT_QUEUED = "spa:reports:queued"            # jobs already in the queue (dedupe)
+REPORT_MAX_AGE = int(os.environ.get('REPORT_MAX_AGE_SECONDS', '600'))
+REPORT_SCHEDULE = int(os.environ.get('REPORT_SCHEDULE_SECONDS', '60'))
+
+REPORTS = {}
+TASKS = {}              # name -> {'fn', 'every', 'next_run'}
+
+
+def register_report(name, fn, params=None, is_final=None, max_age=REPORT_MAX_AGE):
+    """
+    Register fn(cur, **params) as a report
+    params(today) gives the current parameter set (default: none);
+    is_final(params, today) says whether that result can never change again.
+    """
+    REPORTS[name] = {
+        'fn': fn,
+        'params': params or (lambda today: {}),
+        'is_final': is_final or (lambda params, today: False),
+        'max_age': max_age,
+    }
+
+
+def register_task(name, fn, every_seconds):
+    """Run fn() from the report worker every every_seconds (first run at worker start)"""
+    TASKS[name] = {'fn': fn, 'every': every_seconds, 'next_run': 0}
+
+
+def run_due_tasks():
+    """Run every registered task whose interval has passed; a failing task is retried next interval"""
+    for name, task in TASKS.items():
+        if time.monotonic() < task['next_run']:
+            continue
+        task['next_run'] = time.monotonic() + task['every']
+        try:
+            start = time.time()
+            result = task['fn']()
+            print(f"Task {name}: {result} in {time.time() - start:.2f}s")
+        except Exception as e:
+            print(f"Task {name} failed: {e}")
+
+
+def _still_final(name, params, stored_final):
+    # A stored final flag only holds while is_final still agrees, so results
+    # finalized under an earlier, looser rule get recomputed
+    return bool(stored_final) and REPORTS[name]['is_final'](params, date.today())
+
+
+def current_params(name):
+    return REPORTS[name]['params'](date.today())
+
+
+def _job(name, params, force=False):
+    return json.dumps({'report': name, 'params': params, 'force': force}, sort_keys=True)
+
+
+def enqueue_report(name, params=None, force=False):
+    """Queue a recompute for the worker; returns False if it was already queued"""
+    job = _job(name, current_params(name) if params is None else params, force)
+    try:
+        redis_client = get_redis()
+        if not redis_client.sadd(REPORT_QUEUED, job):
+            return False
+        redis_client.rpush(REPORT_QUEUE, job)
+        return True
+    except Exception as e:
+        print(f"Report enqueue failed: {e}")
+        return False
+
+
+def read_report(cur, name, params=None):
+    """
+    (result, computed_at) of the latest stored run, or (None, None) before the first
+    A missing or stale (older than max_age, not final) result is queued for recompute;
+    the stored one is still returned meanwhile.
+    """
+    if params is None:
+        params = current_params(name)
+    cur.execute("""
+        SELECT result, computed_at, is_final,
+               EXTRACT(EPOCH FROM (NOW() - computed_at))
+        FROM report_results
+        WHERE report = %s AND params = %s
+    """, (name, Json(params)))
+    row = cur.fetchone()
+    if row is None:
+        enqueue_report(name, params)
+        return None, None
+    result, computed_at, is_final, age = row
+    if not _still_final(name, params, is_final) and age > REPORTS[name]['max_age']:
+        enqueue_report(name, params)
+    return result, computed_at
+
+
+def compute_report(name, params=None, force=False):
+    """Run one report and store its result; a stored final result is kept unless forced"""
+    report = REPORTS[name]
+    if params is None:
+        params = current_params(name)
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        if not force:
+            cur.execute("""
+                SELECT result FROM report_results
+                WHERE report = %s AND params = %s AND is_final
+            """, (name, Json(params)))
+            row = cur.fetchone()
+            if row and _still_final(name, params, True):
+                return row[0]
+
+        start = time.time()
+        result = report['fn'](cur, **params)
+        duration_ms = int((time.time() - start) * 1000)
+        cur.execute("""
+            INSERT INTO report_results (report, params, result, computed_at, duration_ms, is_final)
+            VALUES (%s, %s, %s, NOW(), %s, %s)
+            ON CONFLICT (report, params) DO UPDATE
+            SET result = EXCLUDED.result,
+                computed_at = EXCLUDED.computed_at,
+                duration_ms = EXCLUDED.duration_ms,
+                is_final = EXCLUDED.is_final
+        """, (name, Json(params), Json(result), duration_ms,
+              report['is_final'](params, date.today())))
+        conn.commit()
+        return result
+    finally:
+        cur.close()
+        conn.close()
+
+
+def schedule_reports():
+    """Queue every registered report whose current result is missing or stale"""
+    conn = get_db()
+    cur = conn.cursor()
+    queued = 0
+    try:
+        for name, report in REPORTS.items():
+            params = current_params(name)
+            cur.execute("""
+                SELECT is_final, EXTRACT(EPOCH FROM (NOW() - computed_at))
+                FROM report_results
+                WHERE report = %s AND params = %s
+            """, (name, Json(params)))
+            row = cur.fetchone()
+            if row is None or (not _still_final(name, params, row[0]) and row[1] > report['max_age']):
+                queued += enqueue_report(name, params)
+    finally:
+        cur.close()
+        conn.close()
+    return queued
+
+
+def run_worker(schedule_seconds=REPORT_SCHEDULE):
+    """Process queued report jobs forever, running schedule_reports() and due tasks every schedule_seconds"""
+    next_schedule = 0
+    while True:
+        try:
+            if time.monotonic() >= next_schedule:
+                run_due_tasks()
+                schedule_reports()
+                next_schedule = time.monotonic() + schedule_seconds
+            redis_client = get_redis()
+            item = redis_client.blpop(REPORT_QUEUE, timeout=max(int(next_schedule - time.monotonic()), 1))
+            if item is None:
+                continue
+            job = item[1]
+            redis_client.srem(REPORT_QUEUED, job)
+            job = json.loads(job)
+            if job['report'] not in REPORTS:
+                print(f"Unknown report {job['report']!r} skipped")
+                continue
+            start = time.time()
+            compute_report(job['report'], job['params'], job['force'])
+            print(f"Report {job['report']} {job['params']} computed in {time.time() - start:.2f}s")
+        except Exception as e:
+            print(f"Report worker error: {e}")
+            time.sleep(5)
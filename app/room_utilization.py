@@ -0,0 +1,132 @@
+# room_utilization.py - Occupied minutes and occupancy per room and hour of day
+#
+# Bookings are loaded once for the whole date range (actual times once a
+# service has started, scheduled times before that), then a single sorted
+# sweep over their start/end events merges overlapping bookings per room into
+# occupied segments. The segments are split at hour boundaries to fill a
+# room x hour-of-day grid, so the cost is one indexed range query plus an
+# O(n log n) sort instead of one query per room and time slot.
+import os
+from datetime import date, datetime, time, timedelta
+
+OPEN_HOUR = int(os.environ.get('SPA_OPEN_HOUR', '0'))
+CLOSE_HOUR = int(os.environ.get('SPA_CLOSE_HOUR', '24'))
+MAX_RANGE_DAYS = 366
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def load_room_intervals(cur, window_start, window_end):
+    """(rid, room_name, start, end) of bookings overlapping the window, as local timestamps"""
+    # Services last well under a day, so a one-day lookback catches everything
+    # that started before the window but runs into it
+    cur.execute("""
+        SELECT r.rid, r.room_name, b.booked_from, b.booked_to
+        FROM room r
+        LEFT JOIN (
+            SELECT ti.rid,
+                   COALESCE(ti.actual_start, ti.scheduled_start)::timestamp as booked_from,
+                   COALESCE(ti.actual_end, ti.scheduled_end)::timestamp as booked_to
+            FROM transaction_items ti
+            JOIN transactions t ON t.tid = ti.tid
+            WHERE t.status <> 'cancelled'
+              AND ((ti.scheduled_start >= %(lookback)s AND ti.scheduled_start < %(end)s)
+                OR (ti.actual_start >= %(lookback)s AND ti.actual_start < %(end)s))
+        ) b ON b.rid = r.rid
+            AND b.booked_to > %(start)s
+            AND b.booked_from < %(end)s
+            AND b.booked_to > b.booked_from
+        ORDER BY r.rid
+    """, {'start': window_start, 'end': window_end, 'lookback': window_start - timedelta(days=1)})
+    return cur.fetchall()
+
+
+def sweep_occupancy(intervals, window_start, window_end):
+    """
+    Merge overlapping bookings per room with one sweep over sorted events
+    Returns {rid: [(start, end), ...]} occupied segments clipped to the window.
+    """
+    events = []
+    for rid, start, end in intervals:
+        start, end = max(start, window_start), min(end, window_end)
+        if start < end:
+            # -1 sorts before +1, so back-to-back bookings join into one segment
+            events.append((rid, start, 1))
+            events.append((rid, end, -1))
+    events.sort()
+
+    segments = {}
+    active, current_rid, opened = 0, None, None
+    for rid, moment, delta in events:
+        if rid != current_rid:
+            active, current_rid = 0, rid
+        if active == 0 and delta == 1:
+            opened = moment
+        active += delta
+        if active == 0:
+            room_segments = segments.setdefault(rid, [])
+            if room_segments and room_segments[-1][1] == opened:
+                room_segments[-1] = (room_segments[-1][0], moment)
+            else:
+                room_segments.append((opened, moment))
+    return segments
+
+
+def minutes_by_hour(segments):
+    """Occupied minutes per hour of day (24 floats) for one room's segments"""
+    by_hour = [0.0] * 24
+    for start, end in segments:
+        while start < end:
+            next_hour = start.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            chunk_end = min(end, next_hour)
+            by_hour[start.hour] += (chunk_end - start).total_seconds() / 60
+            start = chunk_end
+    return by_hour
+
+
+def get_room_utilization(cur, start, end):
+    """
+    Occupancy of every room between two days (inclusive)
+    Percentages are against the opening hours (SPA_OPEN_HOUR..SPA_CLOSE_HOUR)
+    of every day in the range; rooms are sorted busiest first.
+    """
+    start, end = _as_date(start), _as_date(end)
+    days = (end - start).days + 1
+    window_start = datetime.combine(start, time.min)
+    window_end = datetime.combine(end + timedelta(days=1), time.min)
+
+    rooms, intervals, bookings = {}, [], {}
+    for rid, room_name, booked_from, booked_to in load_room_intervals(cur, window_start, window_end):
+        rooms[rid] = room_name
+        if booked_from is not None:
+            intervals.append((rid, booked_from, booked_to))
+            bookings[rid] = bookings.get(rid, 0) + 1
+    segments = sweep_occupancy(intervals, window_start, window_end)
+
+    hours = list(range(OPEN_HOUR, CLOSE_HOUR))
+    capacity = days * len(hours) * 60
+    results = []
+    for rid, room_name in rooms.items():
+        by_hour = minutes_by_hour(segments.get(rid, []))
+        occupied = sum(by_hour[h] for h in hours)
+        results.append({
+            'rid': rid,
+            'name': room_name,
+            'bookings': bookings.get(rid, 0),
+            'occupied_minutes': round(occupied),
+            'percent': round(occupied / capacity * 100, 1) if capacity else 0.0,
+            'by_hour': [round(by_hour[h] / (days * 60) * 100, 1) for h in hours],
+        })
+    results.sort(key=lambda r: (-r['percent'], r['name']))
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': days,
+        'hours': hours,
+        'rooms': results,
+        'most_used': results[:3],
+        'least_used': results[-3:],
+    }
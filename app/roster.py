@@ -0,0 +1,64 @@
+# roster.py - Cached employee roster grouped by role category
+#
+# The landing page needs every currently employed staff member with an active
+# role, split into management / therapist / cashier logins. The grouped lists
+# are cached in Redis until midnight (when role and employment dates can tip
+# over) and dropped by invalidate_roster() whenever employees or roles change.
+import json
+from db import get_db, get_redis
+from metrics import record_invalidation
+
+ROSTER_KEY = "spa:roster"
+ROSTER_CATEGORIES = ('management', 'therapist', 'cashier')
+
+
+def load_roster(cur):
+    """{category: [(eid, work_name, name, role_type), ...]} straight from Postgres"""
+    cur.execute("""
+        SELECT e.eid, e.work_name, e.name, rd.role_type, rd.role_category
+        FROM employees e
+        JOIN roles r ON e.eid = r.eid
+            AND r.start_date <= CURRENT_DATE
+            AND (r.end_date IS NULL OR r.end_date > CURRENT_DATE)
+        JOIN role_definition rd ON r.rdid = rd.rdid
+        WHERE (e.employment_end IS NULL OR e.employment_end >= CURRENT_DATE)
+          AND rd.role_category IN %s
+        ORDER BY rd.role_type, e.work_name
+    """, (ROSTER_CATEGORIES,))
+    roster = {category: [] for category in ROSTER_CATEGORIES}
+    for row in cur.fetchall():
+        roster[row[4]].append(list(row[:4]))
+    return roster
+
+
+def get_roster():
+    """Grouped roster from Redis, rebuilt from Postgres on a miss"""
+    try:
+        cached = get_redis().get(ROSTER_KEY)
+        if cached:
+            return json.loads(cached)
+    except Exception as e:
+        print(f"Roster cache read failed: {e}")
+
+    conn = get_db()
+    cur = conn.cursor()
+    roster = load_roster(cur)
+    cur.execute("SELECT CEIL(EXTRACT(EPOCH FROM (CURRENT_DATE + 1)::timestamptz - NOW()))::int")
+    seconds_to_midnight = cur.fetchone()[0]
+    cur.close()
+    conn.close()
+
+    try:
+        get_redis().setex(ROSTER_KEY, max(seconds_to_midnight, 1), json.dumps(roster))
+    except Exception as e:
+        print(f"Roster cache write failed: {e}")
+    return roster
+
+
+def invalidate_roster():
+    """Drop the cached roster (call after committing employee/role changes)"""
+    try:
+        get_redis().delete(ROSTER_KEY)
+        record_invalidation(ROSTER_KEY)
+    except Exception as e:
+        print(f"Roster cache invalidation failed: {e}")
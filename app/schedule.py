@@ -0,0 +1,113 @@
+# schedule.py - Per-therapist upcoming schedule cached in Redis
+#
+# Each therapist's bookings from today through the next SCHEDULE_DAYS days are
+# kept as one JSON list in Redis, rewritten by the cashier booking writes
+# (add / edit / delete / start / end service) right after they commit. Tablets
+# polling the feed are served from Redis alone; Postgres is only read to
+# rebuild a missing key (first poll of the day, or after a Redis flush).
+import json
+from datetime import datetime, timedelta, timezone
+from db import get_db, get_redis
+
+SCHEDULE_PREFIX = "spa:schedule:"               # + eid -> JSON list of bookings
+SCHEDULE_DAYS = 7
+
+
+def load_schedules(cur, eids):
+    """{eid: [booking, ...]} for today through SCHEDULE_DAYS days ahead, straight from Postgres"""
+    cur.execute("""
+        SELECT
+            ti.therapist_eid,
+            ti.ttid,
+            ti.tid,
+            s.name as service_name,
+            c.name as customer_name,
+            r.room_name,
+            ti.scheduled_start,
+            ti.scheduled_end,
+            ti.actual_start,
+            ti.actual_end,
+            TO_CHAR(ti.scheduled_start, 'YYYY-MM-DD') as day,
+            TO_CHAR(ti.scheduled_start, 'HH24:MI') as start_time,
+            TO_CHAR(ti.scheduled_end, 'HH24:MI') as end_time
+        FROM transaction_items ti
+        JOIN services s ON ti.sid = s.sid
+        JOIN transactions t ON ti.tid = t.tid
+        JOIN customers c ON t.cid = c.cid
+        LEFT JOIN room r ON ti.rid = r.rid
+        WHERE ti.therapist_eid = ANY(%s)
+          AND ti.scheduled_start >= CURRENT_DATE
+          AND ti.scheduled_start < CURRENT_DATE + %s
+          AND t.status <> 'cancelled'
+        ORDER BY ti.scheduled_start
+    """, ([int(eid) for eid in eids], SCHEDULE_DAYS + 1))
+    schedules = {int(eid): [] for eid in eids}
+    for row in cur.fetchall():
+        schedules[row[0]].append({
+            'ttid': row[1],
+            'tid': row[2],
+            'service': row[3],
+            'customer': row[4],
+            'room': row[5],
+            'scheduled_start': row[6].isoformat(),
+            'scheduled_end': row[7].isoformat() if row[7] else None,
+            'status': 'done' if row[9] else 'in_progress' if row[8] else 'upcoming',
+            'day': row[10],
+            'start_time': row[11],
+            'end_time': row[12],
+        })
+    return schedules
+
+
+def _store(cur, schedules):
+    cur.execute("SELECT CEIL(EXTRACT(EPOCH FROM (CURRENT_DATE + 1)::timestamptz - NOW()))::int")
+    seconds_to_midnight = max(cur.fetchone()[0], 1)
+    pipe = get_redis().pipeline()
+    for eid, bookings in schedules.items():
+        # Expire at midnight so the window moves on with the date
+        pipe.setex(f"{SCHEDULE_PREFIX}{eid}", seconds_to_midnight, json.dumps(bookings))
+    pipe.execute()
+
+
+def refresh_schedules(cur, *eids):
+    """Rewrite the cached schedules of these therapists (call after committing a booking change)"""
+    eids = {int(eid) for eid in eids if eid}
+    if not eids:
+        return
+    try:
+        _store(cur, load_schedules(cur, eids))
+    except Exception as e:
+        print(f"Schedule cache refresh failed: {e}")
+
+
+def get_schedule(eid):
+    """A therapist's bookings that have not finished yet, up to SCHEDULE_DAYS days ahead"""
+    bookings = None
+    try:
+        cached = get_redis().get(f"{SCHEDULE_PREFIX}{eid}")
+        if cached is not None:
+            bookings = json.loads(cached)
+    except Exception as e:
+        print(f"Schedule cache read failed: {e}")
+
+    if bookings is None:
+        conn = get_db()
+        cur = conn.cursor()
+        try:
+            schedules = load_schedules(cur, [eid])
+            bookings = schedules[int(eid)]
+            try:
+                _store(cur, schedules)
+            except Exception as e:
+                print(f"Schedule cache write failed: {e}")
+        finally:
+            cur.close()
+            conn.close()
+
+    now = datetime.now(timezone.utc)
+    until = now + timedelta(days=SCHEDULE_DAYS)
+    return [b for b in bookings
+            if b['status'] != 'done'
+            and datetime.fromisoformat(b['scheduled_start']) < until
+            and (b['status'] == 'in_progress' or b['scheduled_end'] is None
+                 or datetime.fromisoformat(b['scheduled_end']) > now)]
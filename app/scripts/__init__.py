@@ -0,0 +1 @@
+# Operational commands - run inside the web container, e.g. python -m scripts.partitions ensure
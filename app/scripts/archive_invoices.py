@@ -0,0 +1,28 @@
+"""
+Copy closed invoices into the MongoDB cold archive.
+
+    python -m scripts.archive_invoices                # ARCHIVE_AFTER_DAYS (default 90)
+    python -m scripts.archive_invoices --days 30
+
+Safe to re-run: documents are upserted by tid and each run only picks up
+invoices that are new since the last watermark or changed since the last run,
+then removes documents of invoices deleted or reopened in Postgres. The report
+worker (scripts/reports.py worker) also runs this every hour.
+"""
+import argparse
+from invoice_archive import ARCHIVE_AFTER_DAYS, archive_closed_invoices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help='archive closed invoices that entered more than this many days ago')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    written, removed = archive_closed_invoices(args.days, args.batch_size)
+    print(f"Archived {written} invoice(s), removed {removed} stale document(s)")
+
+
+if __name__ == '__main__':
+    main()
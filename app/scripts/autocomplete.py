@@ -0,0 +1,22 @@
+"""
+Rebuild the Redis type-ahead index for customers and employees.
+
+    python -m scripts.autocomplete
+
+Registrations and employee edits keep the index current on their own; run
+this after bulk loads, direct SQL edits, or a Redis flush.
+"""
+import argparse
+from autocomplete import rebuild_autocomplete
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args()
+
+    customers, employees = rebuild_autocomplete()
+    print(f"Indexed {customers} customer(s) and {employees} employee(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,568 @@
+"""
+Deterministic synthetic dataset at production scale, bulk-loaded with COPY.
+
+    python -m scripts.generate load                                  # 3 years, 400 visits/day
+    python -m scripts.generate load --years 10 --visits-per-day 3000 --customers 2000000
+    python -m scripts.generate purge
+
+`load` adds customers, employees with dated role assignments, yearly price
+lists of the current service catalog and --years of visits ending yesterday:
+one to three services per visit (no therapist or room is double-booked),
+split payments, refunds and cancellations. The same --seed and arguments
+give the same rows on the same starting database.
+
+Everything is written in one transaction. The user triggers on the
+transaction tables are disabled inside it, so they can never be left off,
+and rows are streamed in with COPY. What the triggers would have maintained
+is then computed in bulk: the item and payment ids in partitioned_ids,
+transaction_totals from one aggregate over the loaded items, payments and
+refunds, then rebuild_customer_stats() and rebuild_daily_rollups(). Writes from other sessions wait for the load.
+
+Generated customers and employees have NRIC numbers starting with SYN-
+(added rooms are named SYN-<rid>); `purge` removes them with every
+transaction they appear in.
+"""
+import argparse
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+from db import get_db
+from leaderboard import invalidate_leaderboard
+
+SYNTH_PREFIX = 'SYN-'
+PRICE_LIST_NOTE = ' price list)'          # services added as "<description> (YYYY price list)"
+YEARLY_PRICE_RISE = 0.04
+COPY_BUFFER_BYTES = 16 * 1024 * 1024
+
+TRIGGER_TABLES = ['transaction_totals', 'transaction_items', 'payments', 'refunds']
+WRITTEN_TABLES = ['customers', 'employees', 'roles', 'services', 'room', 'transaction_header'] + TRIGGER_TABLES
+SEQUENCES = {
+    'customers_cid_seq': ('customers', 'cid'),
+    'employees_eid_seq': ('employees', 'eid'),
+    'roles_rid_seq': ('roles', 'rid'),
+    'services_sid_seq': ('services', 'sid'),
+    'room_rid_seq': ('room', 'rid'),
+    'transaction_header_tid_seq': ('transaction_header', 'tid'),
+    'transaction_items_ttid_seq': ('transaction_items', 'ttid'),
+    'payments_pid_seq': ('payments', 'pid'),
+    'refunds_refid_seq': ('refunds', 'refid'),
+}
+
+COPY_COLUMNS = {
+    'customers': ['cid', 'nric_fin_passport_no', 'name', 'gender', 'mobile_number', 'country_code'],
+    'employees': ['eid', 'nric_fin_passport_no', 'name', 'work_name', 'gender', 'mobile_number',
+                  'country_code', 'employment_start', 'employment_end'],
+    'roles': ['rid', 'eid', 'rdid', 'start_date', 'end_date'],
+    'room': ['rid', 'room_name'],
+    'services': ['sid', 'name', 'description', 'duration_minutes', 'base_cost', 'active_from',
+                 'active_until', 'rdid'],
+    'transaction_header': ['tid', 'cid', 'cashier_eid', 'entry_time', 'exit_time', 'created_at'],
+    'synthetic_visits': ['tid', 'billlevel_discount', 'billlevel_discount_type', 'status', 'updated_at'],
+    'transaction_items': ['ttid', 'tid', 'sid', 'therapist_eid', 'scheduled_start', 'scheduled_end',
+                          'actual_start', 'actual_end', 'cost', 'item_discount', 'item_discount_type', 'rid'],
+    'payments': ['pid', 'tid', 'payment_method', 'payment_amount', 'payment_time'],
+    'refunds': ['refid', 'tid', 'refund_method', 'refund_amount', 'refund_reason', 'refund_time'],
+}
+# Parents before children, so foreign keys are satisfied at every flush
+VISIT_TABLES = ['transaction_header', 'synthetic_visits', 'transaction_items', 'payments', 'refunds']
+
+FIRST_NAMES = {
+    'Female': ['Wei Ling', 'Siti', 'Mei Ling', 'Priya', 'Hui Min', 'Nurul', 'Jia Hui', 'Rachel',
+               'Farah', 'Xin Yi', 'Lakshmi', 'Aisyah', 'Kavitha', 'Amanda', 'Shu Fen', 'Grace'],
+    'Male': ['Muhammad', 'Ahmad', 'Rajesh', 'Jun Jie', 'Kumar', 'Daniel', 'Arjun', 'Hafiz',
+             'Zhi Hao', 'Bryan', 'Yong Sheng', 'Marcus', 'Wei Jie', 'Ravi', 'Irfan', 'Kelvin'],
+}
+LAST_NAMES = ['Tan', 'Lim', 'Lee', 'Ng', 'Wong', 'Goh', 'Chua', 'Koh', 'Teo', 'Ong', 'Bin Ismail',
+              'Binte Rahman', 'Pillai', 'Nair', 'Singh', 'Chong', 'Yeo', 'Sim', 'Low', 'Chan',
+              'Abdullah', 'Krishnan', 'Ho', 'Foo', 'Quek', 'Seah', 'Toh', 'Yap']
+WORK_NAMES = ['Alice', 'Bella', 'Cherry', 'Daisy', 'Eva', 'Fiona', 'Gigi', 'Hana', 'Ivy', 'Jade',
+              'Kiki', 'Lily', 'Mia', 'Nina', 'Olive', 'Pearl', 'Queenie', 'Rose', 'Sunny', 'Tina']
+COUNTRY_WEIGHTS = {'SG': 70, 'MY': 10, 'CN': 6, 'ID': 3, 'IN': 3, 'PH': 3}
+
+WEEKDAY_FACTORS = [0.8, 0.85, 0.9, 0.95, 1.1, 1.35, 1.25]       # Monday first
+# Arrivals per hour of day, shaped like the seeded history (busy late evening into the night)
+HOURLY_ARRIVALS = [216, 185, 146, 103, 70, 52, 30, 5, 5, 22, 68, 73,
+                   78, 91, 156, 186, 176, 160, 149, 208, 157, 231, 273, 314]
+ITEM_COUNTS, ITEM_COUNT_WEIGHTS = [1, 2, 3], [72, 22, 6]
+SPLIT_COUNTS, SPLIT_WEIGHTS = [1, 2, 3], [75, 20, 5]
+PAYMENT_METHODS = ['Credit Card', 'PayNow', 'NETS', 'Cash', 'eWallet', 'Voucher']
+PAYMENT_WEIGHTS = [30, 25, 20, 15, 8, 2]
+REFUND_REASONS = ['Service cut short', 'Customer complaint', 'Double charged', 'Therapist unavailable']
+CANCEL_RATE = 0.015
+VISITS_PER_THERAPIST = 4               # default --therapists / --rooms: visits per day each can take
+SERVICE_TRIES = 3                      # services a customer considers before accepting a long wait
+MAX_WAIT = timedelta(hours=1)
+REFUND_RATE = 0.01
+
+
+class CopyWriter:
+    """Per-table COPY text buffers, streamed to the server once they grow past COPY_BUFFER_BYTES"""
+
+    def __init__(self, cur, tables):
+        self.cur = cur
+        self.tables = tables
+        self.buffers = {table: io.StringIO() for table in tables}
+        self.rows = {table: 0 for table in tables}
+        self.size = 0
+
+    def add(self, table, *values):
+        line = '\t'.join('\\N' if v is None else str(v) for v in values) + '\n'
+        self.buffers[table].write(line)
+        self.rows[table] += 1
+        self.size += len(line)
+        if self.size >= COPY_BUFFER_BYTES:
+            self.flush()
+
+    def flush(self):
+        for table in self.tables:
+            buffer = self.buffers[table]
+            if buffer.tell():
+                buffer.seek(0)
+                self.cur.copy_expert(f"COPY {table} ({', '.join(COPY_COLUMNS[table])}) FROM STDIN", buffer)
+                self.buffers[table] = io.StringIO()
+        self.size = 0
+
+
+def _ts(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _next_ids(cur):
+    """First free id of every generated table (the tables are locked, so nobody else takes them)"""
+    ids = {}
+    for table, column in SEQUENCES.values():
+        cur.execute(f"SELECT COALESCE(MAX({column}), 0) + 1 FROM {table}")
+        ids[table] = cur.fetchone()[0]
+    return ids
+
+
+def _set_sequences(cur):
+    for sequence, (table, column) in SEQUENCES.items():
+        cur.execute(f"SELECT setval(%s, GREATEST((SELECT MAX({column}) FROM {table}), 1))", (sequence,))
+
+
+def _disable_triggers(cur, tables):
+    # Inside the load transaction: a failure rolls the triggers back on too
+    for table in tables:
+        cur.execute(f"ALTER TABLE {table} DISABLE TRIGGER USER")
+
+
+def _enable_triggers(cur, tables):
+    for table in tables:
+        cur.execute(f"ALTER TABLE {table} ENABLE TRIGGER USER")
+
+
+def _refresh_derived(cur, start, end):
+    """Recompute what the disabled triggers maintain, and drop caches over the touched days"""
+    cur.execute("SELECT rebuild_customer_stats()")
+    cur.execute("SELECT rebuild_daily_rollups()")
+    cur.execute("DELETE FROM police_snapshots WHERE day >= %s AND day <= %s", (start, end))
+    cur.execute("DELETE FROM report_results")
+
+
+def generate_people(rng, writer, ids, args, start, end, role_types, services):
+    """
+    Customers, employees and their role assignments (therapists spread over
+    the therapist roles in proportion to the services each role performs)
+    Returns (customer ids, visit weights, cashier roles, therapist roles) with
+    roles as (eid, rdid, start_date, end_date) tuples.
+    """
+    countries = list(COUNTRY_WEIGHTS)
+    country_weights = list(COUNTRY_WEIGHTS.values())
+
+    cids, weights = [], []
+    for cid in range(ids['customers'], ids['customers'] + args.customers):
+        gender = rng.choice(['Female', 'Male'])
+        name = f"{rng.choice(FIRST_NAMES[gender])} {rng.choice(LAST_NAMES)}"
+        mobile = f"{rng.choice('89')}{rng.randrange(10 ** 7):07d}"
+        writer.add('customers', cid, f"{SYNTH_PREFIX}{cid}", name, gender, mobile,
+                   rng.choices(countries, country_weights)[0])
+        cids.append(cid)
+        # Heavy-tailed loyalty: a few regulars make most of the visits
+        weights.append(rng.paretovariate(1.2))
+
+    employees = ([('cashier', rdid) for rdid in rng.choices(role_types['cashier'], k=args.cashiers)]
+                 + [('management', rdid) for rdid in rng.choices(role_types['management'], k=args.managers)])
+    # At least one therapist per therapist role is employed for the whole range
+    founders = list(role_types['therapist'])
+    employees += [('therapist', rdid) for rdid in founders]
+    demand = [sum(1 for service in services if service[0] == rdid) + 1 for rdid in founders]
+    employees += [('therapist', rdid)
+                  for rdid in rng.choices(founders, demand, k=max(args.therapists - len(founders), 0))]
+
+    roles = {'cashier': [], 'therapist': [], 'management': []}
+    role_id = ids['roles']
+    span = (end - start).days
+    for index, (category, rdid) in enumerate(employees):
+        eid = ids['employees'] + index
+        founder = category != 'therapist' or index - args.cashiers - args.managers < len(founders)
+        hired = start - timedelta(days=rng.randrange(30, 730)) if founder or rng.random() < 0.6 \
+            else start + timedelta(days=rng.randrange(max(span - 60, 1)))
+        left = None
+        if not founder and rng.random() < 0.25:
+            left = hired + timedelta(days=rng.randrange(180, 1100))
+            left = left if left < end else None
+
+        gender = 'Female' if category == 'therapist' and rng.random() < 0.85 else rng.choice(['Female', 'Male'])
+        name = f"{rng.choice(FIRST_NAMES[gender])} {rng.choice(LAST_NAMES)}"
+        writer.add('employees', eid, f"{SYNTH_PREFIX}E{eid}", name,
+                   f"{rng.choice(WORK_NAMES)} {eid}", gender, f"9{rng.randrange(10 ** 7):07d}",
+                   rng.choices(countries, country_weights)[0], hired, left)
+
+        assignments = [(rdid, hired, left)]
+        # Some therapists cross-train into a second service role later on
+        if category == 'therapist' and len(role_types['therapist']) > 1 and rng.random() < 0.2:
+            second = rng.choice([r for r in role_types['therapist'] if r != rdid])
+            trained = hired + timedelta(days=rng.randrange(90, 720))
+            if left is None or trained < left:
+                assignments.append((second, trained, left))
+        for role_rdid, role_start, role_end in assignments:
+            writer.add('roles', role_id, eid, role_rdid, role_start, role_end)
+            role_id += 1
+            roles[category].append((eid, role_rdid, role_start, role_end))
+    return cids, weights, roles['cashier'], roles['therapist']
+
+
+def generate_price_lists(cur, writer, ids, start):
+    """
+    The current catalog, plus one row per earlier year (prices
+    YEARLY_PRICE_RISE lower per year back) for dates before a service's
+    active_from. Existing price-list rows are reused.
+    Returns [(rdid, duration_minutes, [(first_day, last_day, sid, cost), ...])].
+    """
+    cur.execute("""
+        SELECT sid, name, description, duration_minutes, base_cost, active_from, rdid
+        FROM services
+        WHERE active_until IS NULL AND base_cost > 0 AND description NOT LIKE %s
+        ORDER BY sid
+    """, ('%' + PRICE_LIST_NOTE,))
+    catalog = cur.fetchall()
+    cur.execute("SELECT name, description, active_from, rdid, sid FROM services WHERE description LIKE %s",
+                ('%' + PRICE_LIST_NOTE,))
+    existing = {row[:4]: row[4] for row in cur.fetchall()}
+
+    services = []
+    next_sid = ids['services']
+    for sid, name, description, duration, cost, active_from, rdid in catalog:
+        versions = [(active_from, date.max, sid, float(cost))]
+        for year in range(start.year, active_from.year):
+            first, last = date(year, 1, 1), min(date(year, 12, 31), active_from - timedelta(days=1))
+            versioned = f"{description} ({year}{PRICE_LIST_NOTE}"
+            price = round(float(cost) / (1 + YEARLY_PRICE_RISE) ** (active_from.year - year))
+            version_sid = existing.get((name, versioned, first, rdid))
+            if version_sid is None:
+                version_sid = next_sid
+                next_sid += 1
+                writer.add('services', version_sid, name, versioned, duration, max(price, 1), first, last, rdid)
+            versions.append((first, last, version_sid, float(max(price, 1))))
+        services.append((rdid, duration, versions))
+    return services
+
+
+def generate_visits(rng, writer, ids, args, start, end, people, services, rooms):
+    """Stream every visit from start to end (inclusive) into the COPY buffers; returns the visit count"""
+    cids, weights, cashier_roles, therapist_roles = people
+    cum_weights, total = [], 0.0
+    for weight in weights:
+        total += weight
+        cum_weights.append(total)
+    popularity = [rng.uniform(0.3, 3.0) for _ in services]
+
+    tid, ttid, pid, refid = (ids['transaction_header'], ids['transaction_items'],
+                             ids['payments'], ids['refunds'])
+    # When each therapist and room is next free; kept across days so late queues carry over
+    therapist_free, room_free = {}, {}
+    days = (end - start).days + 1
+    visits = 0
+    started = time.time()
+    day = start
+    while day <= end:
+        on_duty = [eid for eid, _, first, last in cashier_roles if first <= day and (last is None or day <= last)]
+        # Late services run past midnight, so therapists must still hold the role tomorrow
+        staff = {}
+        for eid, rdid, first, last in therapist_roles:
+            if first <= day and (last is None or day < last):
+                staff.setdefault(rdid, []).append(eid)
+        menu = [index for index, service in enumerate(services) if service[0] in staff]
+        menu_weights = [popularity[index] for index in menu]
+        if not on_duty or not menu:
+            day += timedelta(days=1)
+            continue
+
+        # Weekly rhythm, slow growth over the range and some day-to-day noise
+        growth = 0.8 + 0.4 * (day - start).days / max(days - 1, 1)
+        count = round(args.visits_per_day * WEEKDAY_FACTORS[day.weekday()] * growth * rng.uniform(0.9, 1.1))
+        midnight = datetime.combine(day, datetime.min.time())
+        arrivals = sorted(hour * 60 + rng.randrange(60)
+                          for hour in rng.choices(range(24), HOURLY_ARRIVALS, k=count))
+
+        for cid, arrival in zip(rng.choices(cids, cum_weights=cum_weights, k=count), arrivals):
+            entry = midnight + timedelta(minutes=arrival)
+            if rng.random() < CANCEL_RATE:
+                writer.add('transaction_header', tid, cid, rng.choice(on_duty), _ts(entry),
+                           _ts(entry + timedelta(minutes=rng.randrange(5, 20))), _ts(entry))
+                writer.add('synthetic_visits', tid, 0, 'none', 'cancelled', _ts(entry))
+                tid += 1
+                visits += 1
+                continue
+
+            ready = entry + timedelta(minutes=rng.randrange(5, 15))
+            cost_total = discount_total = 0.0
+            for _ in range(rng.choices(ITEM_COUNTS, ITEM_COUNT_WEIGHTS)[0]):
+                # The qualified therapist free first and the earlier of three random rooms; a
+                # customer facing a long wait looks at other services before taking the earliest
+                best = None
+                for _ in range(SERVICE_TRIES):
+                    rdid, duration, versions = services[rng.choices(menu, menu_weights)[0]]
+                    therapist = min(staff[rdid], key=lambda eid: therapist_free.get(eid, midnight))
+                    rid = min(rng.sample(rooms, min(3, len(rooms))), key=lambda r: room_free.get(r, midnight))
+                    begin = max(ready, therapist_free.get(therapist, midnight), room_free.get(rid, midnight))
+                    if best is None or begin < best[0]:
+                        best = (begin, duration, versions, therapist, rid)
+                    if begin - ready <= MAX_WAIT:
+                        break
+                begin, duration, versions, therapist, rid = best
+                scheduled = begin + timedelta(minutes=-begin.minute % 5)
+                # Priced from the price list of the day it is scheduled on
+                sid, cost = next((sid, cost) for first, last, sid, cost in versions
+                                 if first <= scheduled.date() <= last)
+                actual_start = max(scheduled + timedelta(minutes=rng.randrange(-3, 9)), entry)
+                actual_end = actual_start + timedelta(minutes=max(duration + rng.randrange(-8, 7), 1))
+                therapist_free[therapist] = actual_end + timedelta(minutes=5)
+                room_free[rid] = actual_end + timedelta(minutes=10)
+                ready = actual_end + timedelta(minutes=rng.randrange(0, 10))
+
+                discount, discount_type = 0, 'none'
+                roll = rng.random()
+                if roll < 0.08:
+                    discount, discount_type = round(cost * rng.uniform(0.1, 0.25)), 'promo'
+                elif roll < 0.09:
+                    discount, discount_type = round(cost * 0.3), 'staff'
+                discount = min(discount, cost)
+                writer.add('transaction_items', ttid, tid, sid, therapist, _ts(scheduled),
+                           _ts(scheduled + timedelta(minutes=duration)), _ts(actual_start), _ts(actual_end),
+                           cost, discount, discount_type, rid)
+                ttid += 1
+                cost_total += cost
+                discount_total += discount
+
+            exit_time = ready + timedelta(minutes=rng.randrange(2, 15))
+            due = cost_total - discount_total
+            bill_discount, bill_type = 0, 'none'
+            if due > 0 and rng.random() < 0.03:
+                bill_discount = min(round(due * rng.uniform(0.05, 0.15)), due)
+                bill_type = rng.choice(['management', 'waiver'])
+                due -= bill_discount
+
+            splits = rng.choices(SPLIT_COUNTS, SPLIT_WEIGHTS)[0] if due > 0 else 0
+            remaining, methods = round(due, 2), []
+            for split in range(splits):
+                amount = remaining if split == splits - 1 else round(remaining * rng.uniform(0.2, 0.6))
+                remaining = round(remaining - amount, 2)
+                method = rng.choices(PAYMENT_METHODS, PAYMENT_WEIGHTS)[0]
+                paid_at = entry + timedelta(minutes=rng.randrange(1, 10)) if split < splits - 1 else exit_time
+                writer.add('payments', pid, tid, method, f"{amount:.2f}", _ts(paid_at))
+                pid += 1
+                methods.append(method)
+
+            status = 'completed'
+            if methods and rng.random() < REFUND_RATE:
+                writer.add('refunds', refid, tid, methods[0], f"{max(round(due * rng.uniform(0.2, 1.0), 2), 0.01):.2f}",
+                           rng.choice(REFUND_REASONS),
+                           _ts(exit_time + timedelta(minutes=rng.randrange(5, 3 * 24 * 60))))
+                refid += 1
+                status = 'refunded'
+
+            writer.add('transaction_header', tid, cid, rng.choice(on_duty), _ts(entry), _ts(exit_time), _ts(entry))
+            writer.add('synthetic_visits', tid, bill_discount, bill_type, status, _ts(exit_time))
+            tid += 1
+            visits += 1
+
+        if day.day == 1 or day == end:
+            rate = visits / max(time.time() - started, 0.001)
+            print(f"  {day:%Y-%m-%d}: {visits:,} visits so far ({rate:,.0f}/s)")
+        day += timedelta(days=1)
+    return visits
+
+
+def load(args):
+    rng = random.Random(args.seed)
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT CURRENT_DATE - 1")
+        end = date.fromisoformat(args.end) if args.end else cur.fetchone()[0]
+        start = end - timedelta(days=round(365.25 * args.years) - 1)
+
+        cur.execute(f"LOCK TABLE {', '.join(WRITTEN_TABLES)} IN EXCLUSIVE MODE")
+        cur.execute("SELECT create_transaction_partitions(%s, %s)", (start, end + timedelta(days=7)))
+        _disable_triggers(cur, TRIGGER_TABLES)
+        cur.execute("""
+            CREATE TEMP TABLE synthetic_visits (
+              tid BIGINT PRIMARY KEY,
+              billlevel_discount NUMERIC(10,2) NOT NULL,
+              billlevel_discount_type discount_type_enum NOT NULL,
+              status status_enum NOT NULL,
+              updated_at TIMESTAMPTZ NOT NULL
+            ) ON COMMIT DROP
+        """)
+
+        cur.execute("SELECT role_category::text, ARRAY_AGG(rdid ORDER BY rdid) FROM role_definition GROUP BY 1")
+        role_types = dict(cur.fetchall())
+        missing = {'cashier', 'therapist', 'management'} - set(role_types)
+        if missing:
+            raise SystemExit(f"role_definition has no {', '.join(sorted(missing))} role; load seeds.sql first")
+        cur.execute("SELECT COALESCE(ARRAY_AGG(rid ORDER BY rid), '{}') FROM room")
+        rooms = cur.fetchone()[0]
+        capacity = -(-args.visits_per_day // VISITS_PER_THERAPIST)
+        args.therapists = args.therapists or max(capacity, len(role_types['therapist']))
+
+        ids = _next_ids(cur)
+        began = time.time()
+        writer = CopyWriter(cur, ['customers', 'employees', 'roles', 'services', 'room'])
+        # Extra rooms up to --rooms, so the rooms are not what limits the visits per day
+        for rid in range(ids['room'], ids['room'] + max((args.rooms or capacity) - len(rooms), 0)):
+            writer.add('room', rid, f"{SYNTH_PREFIX}{rid}")
+            rooms.append(rid)
+        services = generate_price_lists(cur, writer, ids, start)
+        if not services:
+            raise SystemExit("no priced services in the catalog; load seeds.sql first")
+        people = generate_people(rng, writer, ids, args, start, end, role_types, services)
+        writer.flush()
+        print(f"{writer.rows['customers']:,} customers, {writer.rows['employees']:,} employees, "
+              f"{writer.rows['room']:,} rooms, {writer.rows['services']:,} price-list services; "
+              f"visits {start} .. {end}:")
+
+        writer = CopyWriter(cur, VISIT_TABLES)
+        visits = generate_visits(rng, writer, ids, args, start, end, people, services, rooms)
+        writer.flush()
+        loaded = time.time() - began
+
+        # Ids claimed in one pass, as trg_claim_item_id / trg_claim_payment_id would have
+        cur.execute("""
+            INSERT INTO partitioned_ids (tbl, id)
+            SELECT 'transaction_items', ttid FROM transaction_items WHERE tid >= %(first)s
+            UNION ALL
+            SELECT 'payments', pid FROM payments WHERE tid >= %(first)s
+        """, {'first': ids['transaction_header']})
+        # transaction_totals in one pass, as the item/payment/refund triggers would have left it
+        cur.execute("""
+            INSERT INTO transaction_totals (tid, billlevel_discount, billlevel_discount_type,
+                                            total_cost, total_discount, total_paid, status, updated_at)
+            SELECT v.tid, v.billlevel_discount, v.billlevel_discount_type,
+                   COALESCE(i.cost, 0),
+                   COALESCE(i.discount, 0) + v.billlevel_discount,
+                   COALESCE(p.paid, 0) - COALESCE(r.refunded, 0),
+                   v.status, v.updated_at
+            FROM synthetic_visits v
+            LEFT JOIN (SELECT tid, SUM(cost) AS cost, SUM(item_discount) AS discount
+                       FROM transaction_items WHERE tid >= %(first)s GROUP BY tid) i ON i.tid = v.tid
+            LEFT JOIN (SELECT tid, SUM(payment_amount) AS paid
+                       FROM payments WHERE tid >= %(first)s GROUP BY tid) p ON p.tid = v.tid
+            LEFT JOIN (SELECT tid, SUM(refund_amount) AS refunded
+                       FROM refunds WHERE tid >= %(first)s GROUP BY tid) r ON r.tid = v.tid
+        """, {'first': ids['transaction_header']})
+        _refresh_derived(cur, start, end)
+        _enable_triggers(cur, TRIGGER_TABLES)
+        _set_sequences(cur)
+        conn.commit()
+        rows = sum(writer.rows.values())     # synthetic_visits stands in for transaction_totals
+        print(f"Loaded {visits:,} visits ({rows:,} transaction rows) in {loaded:.1f}s, "
+              f"totals and rollups rebuilt in {time.time() - began - loaded:.1f}s")
+
+        conn.autocommit = True
+        cur.execute("ANALYZE")
+    finally:
+        cur.close()
+        conn.close()
+
+    invalidate_leaderboard()
+    print("Run `make autocomplete-rebuild` to add the new customers to type-ahead search")
+
+
+def purge():
+    """Remove SYN- customers and employees, every transaction they appear in, and unused rooms and price lists"""
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"LOCK TABLE {', '.join(WRITTEN_TABLES)} IN EXCLUSIVE MODE")
+        _disable_triggers(cur, TRIGGER_TABLES + ['transaction_header'])
+        cur.execute("""
+            CREATE TEMP TABLE purge_tids ON COMMIT DROP AS
+            SELECT h.tid, h.entry_time::date AS day
+            FROM transaction_header h
+            WHERE h.cid IN (SELECT cid FROM customers WHERE nric_fin_passport_no LIKE %(prefix)s)
+               OR h.cashier_eid IN (SELECT eid FROM employees WHERE nric_fin_passport_no LIKE %(prefix)s)
+               OR h.tid IN (SELECT ti.tid FROM transaction_items ti
+                            JOIN employees e ON e.eid = ti.therapist_eid
+                            WHERE e.nric_fin_passport_no LIKE %(prefix)s)
+        """, {'prefix': SYNTH_PREFIX + '%'})
+        cur.execute("SELECT COUNT(*), MIN(day), MAX(day) FROM purge_tids")
+        visits, first_day, last_day = cur.fetchone()
+        # Release their ids (trg_claim_*_id is disabled with the other triggers)
+        cur.execute("""
+            DELETE FROM partitioned_ids p
+            USING (SELECT 'transaction_header' AS tbl, tid AS id FROM purge_tids
+                   UNION ALL
+                   SELECT 'transaction_items', ttid FROM transaction_items
+                   WHERE tid IN (SELECT tid FROM purge_tids)
+                   UNION ALL
+                   SELECT 'payments', pid FROM payments
+                   WHERE tid IN (SELECT tid FROM purge_tids)) gone
+            WHERE p.tbl = gone.tbl AND p.id = gone.id
+        """)
+        for table in ['transaction_items', 'payments', 'refunds', 'transaction_totals', 'transaction_header']:
+            cur.execute(f"DELETE FROM {table} WHERE tid IN (SELECT tid FROM purge_tids)")
+        cur.execute("DELETE FROM customers WHERE nric_fin_passport_no LIKE %s", (SYNTH_PREFIX + '%',))
+        customers = cur.rowcount
+        cur.execute("DELETE FROM employees WHERE nric_fin_passport_no LIKE %s", (SYNTH_PREFIX + '%',))
+        employees = cur.rowcount
+        cur.execute("""
+            DELETE FROM services s
+            WHERE s.description LIKE %s
+              AND NOT EXISTS (SELECT 1 FROM transaction_items ti WHERE ti.sid = s.sid)
+        """, ('%' + PRICE_LIST_NOTE,))
+        cur.execute("""
+            DELETE FROM room r
+            WHERE r.room_name LIKE %s
+              AND NOT EXISTS (SELECT 1 FROM transaction_items ti WHERE ti.rid = r.rid)
+        """, (SYNTH_PREFIX + '%',))
+        _refresh_derived(cur, first_day or date.min, last_day or date.min)
+        _enable_triggers(cur, TRIGGER_TABLES + ['transaction_header'])
+        _set_sequences(cur)
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    invalidate_leaderboard()
+    print(f"Removed {visits:,} visits, {customers:,} customers and {employees:,} employees")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    generate = sub.add_parser('load', help='generate and bulk-load a synthetic history')
+    generate.add_argument('--years', type=float, default=3)
+    generate.add_argument('--visits-per-day', type=int, default=400)
+    generate.add_argument('--customers', type=int, default=50000)
+    generate.add_argument('--therapists', type=int,
+                          help=f'default: one per {VISITS_PER_THERAPIST} visits per day')
+    generate.add_argument('--rooms', type=int,
+                          help=f'add rooms up to this many (default: one per {VISITS_PER_THERAPIST} visits per day)')
+    generate.add_argument('--cashiers', type=int, default=6)
+    generate.add_argument('--managers', type=int, default=2)
+    generate.add_argument('--end', help='last day of history, YYYY-MM-DD (default: yesterday)')
+    generate.add_argument('--seed', type=int, default=42)
+    sub.add_parser('purge', help='remove everything generated')
+    args = parser.parse_args()
+
+    if args.command == 'load':
+        load(args)
+    else:
+        purge()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+Reconcile the Redis therapist leaderboard with its SQL definition.
+
+    python -m scripts.leaderboard
+
+The set is also rebuilt automatically on the first therapist page view after
+midnight; run this from cron for a fixed nightly time, or after bulk changes
+made outside the cashier screens.
+"""
+import argparse
+import time
+from db import get_db
+from leaderboard import rebuild_leaderboard
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args()
+
+    start = time.time()
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        therapists, drifted = rebuild_leaderboard(cur)
+    finally:
+        cur.close()
+        conn.close()
+    print(f"Leaderboard reconciled: {therapists} therapist(s), {drifted} score(s) corrected "
+          f"in {time.time() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Monthly partition maintenance for transaction_header, transaction_items and payments.
+
+    python -m scripts.partitions list
+    python -m scripts.partitions ensure --months-ahead 3
+    python -m scripts.partitions detach --before 2025-01-01
+
+`detach` moves whole months to the `archive` schema without copying rows, plus
+the rows of those months' transactions that lie outside them (items started or
+payments made in a later month, refunds, totals). It refuses, detaching
+nothing, if a detached row belongs to a transaction that stays. The archived
+tables can be dumped and dropped afterwards.
+"""
+import argparse
+from db import get_db
+
+PARTITIONED_TABLES = ['transaction_header', 'transaction_items', 'payments']
+
+
+def ensure_partitions(months_ahead=3):
+    """Create any missing partitions up to months_ahead months from now"""
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT ensure_transaction_partitions(%s)", (months_ahead,))
+        created = cur.fetchone()[0]
+        conn.commit()
+        return created
+    finally:
+        cur.close()
+        conn.close()
+
+
+def detach_partitions(before):
+    """Archive every month that ends on or before the given date, with all of its transactions' rows"""
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT detach_transaction_partitions(%s)", (before,))
+        detached = cur.fetchone()[0]
+        conn.commit()
+        return detached
+    finally:
+        cur.close()
+        conn.close()
+
+
+def list_partitions():
+    """(parent, partition, bounds, rows estimate) for every attached partition"""
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT parent.relname, child.relname,
+                   pg_get_expr(child.relpartbound, child.oid),
+                   child.reltuples::bigint
+            FROM pg_inherits i
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_class child ON child.oid = i.inhrelid
+            WHERE parent.relname = ANY(%s)
+            ORDER BY parent.relname, child.relname
+        """, (PARTITIONED_TABLES,))
+        return cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list')
+    ensure = sub.add_parser('ensure')
+    ensure.add_argument('--months-ahead', type=int, default=3)
+    detach = sub.add_parser('detach')
+    detach.add_argument('--before', required=True, help='YYYY-MM-DD, exclusive upper bound')
+    args = parser.parse_args()
+
+    if args.command == 'ensure':
+        print(f"Created {ensure_partitions(args.months_ahead)} partition(s)")
+    elif args.command == 'detach':
+        print(f"Detached {detach_partitions(args.before)} partition(s) into schema archive")
+    else:
+        for parent, child, bounds, rows in list_partitions():
+            print(f"{parent:<20} {child:<34} {max(rows, 0):>8}  {bounds}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Background report jobs behind the management dashboard analytics.
+
+    python -m scripts.reports worker                 # process jobs + scheduled refresh (docker: reports)
+                                                     # and maintenance tasks (partitions ahead,
+                                                     # invoice archive)
+    python -m scripts.reports run                    # compute every report now
+    python -m scripts.reports run room_utilization --force
+    python -m scripts.reports list                   # stored results and their age
+"""
+import argparse
+import time
+from db import get_db
+import blueprints.management  # noqa: F401 - registers the dashboard reports
+from reports import REPORTS, REPORT_SCHEDULE, compute_report, run_worker, register_task
+from scripts.partitions import ensure_partitions
+from invoice_archive import archive_closed_invoices
+
+PARTITIONS_EVERY = 6 * 3600     # partitions reach 3 months ahead, so a few checks a day is plenty
+ARCHIVE_EVERY = 3600
+
+
+def archive_invoices():
+    written, removed = archive_closed_invoices()
+    return f"{written} archived, {removed} removed"
+
+
+def list_reports():
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT report, params, computed_at, duration_ms, is_final
+        FROM report_results
+        ORDER BY report, computed_at DESC
+    """)
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    worker = sub.add_parser('worker', help='run the report worker')
+    worker.add_argument('--schedule', type=int, default=REPORT_SCHEDULE,
+                        help='seconds between checks for stale reports')
+    run = sub.add_parser('run', help='compute reports now')
+    run.add_argument('reports', nargs='*', help=f"default: all of {', '.join(sorted(REPORTS))}")
+    run.add_argument('--force', action='store_true', help='recompute final results too')
+    sub.add_parser('list', help='show stored results')
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        # Without this a long-running deployment would run out of monthly partitions
+        register_task('partitions', ensure_partitions, PARTITIONS_EVERY)
+        register_task('archive_invoices', archive_invoices, ARCHIVE_EVERY)
+        print(f"Report worker started ({', '.join(sorted(REPORTS))})")
+        run_worker(args.schedule)
+    elif args.command == 'run':
+        unknown = set(args.reports) - set(REPORTS)
+        if unknown:
+            parser.error(f"unknown report(s): {', '.join(sorted(unknown))}")
+        for name in args.reports or sorted(REPORTS):
+            start = time.time()
+            compute_report(name, force=args.force)
+            print(f"{name}: computed in {time.time() - start:.2f}s")
+    else:
+        for report, params, computed_at, duration_ms, is_final in list_reports():
+            print(f"{report:<20}{str(params):<28}{computed_at:%Y-%m-%d %H:%M:%S}"
+                  f"{duration_ms:>8} ms{'  final' if is_final else ''}")
+
+
+if __name__ == '__main__':
+    main()
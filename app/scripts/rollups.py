@@ -0,0 +1,45 @@
+"""
+Backfill or repair the daily rollup tables behind the period statistics.
+
+    python -m scripts.rollups
+
+The triggers keep the rollups current on their own; run this once after
+upgrading an existing database, after bulk loads that bypass the triggers,
+or whenever the rollups are suspected to have drifted from the raw tables.
+"""
+import argparse
+import time
+from db import get_db
+
+
+def rebuild_rollups():
+    """Recompute every rollup row from the raw tables; returns the day rows written"""
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT rebuild_daily_rollups()")
+        cur.execute("""
+            SELECT (SELECT COUNT(*) FROM daily_payment_totals)
+                 + (SELECT COUNT(*) FROM daily_therapist_totals)
+                 + (SELECT COUNT(*) FROM daily_room_totals)
+                 + (SELECT COUNT(*) FROM daily_visit_totals)
+        """)
+        rows = cur.fetchone()[0]
+        conn.commit()
+        return rows
+    finally:
+        cur.close()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args()
+
+    start = time.time()
+    rows = rebuild_rollups()
+    print(f"Rebuilt {rows} rollup row(s) in {time.time() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Visitor log (blueprints/police.py) against the database in DATABASE_URL.
+
+Needs some visits loaded (seeds.sql or make generate); every test rolls back
+what it changed.
+"""
+import pytest
+from db import get_db
+from blueprints.police import period_range, visitor_query
+
+
+@pytest.fixture
+def cur():
+    try:
+        conn = get_db(max_retries=1, connect_timeout=2)
+    except Exception as e:
+        pytest.skip(f"no database: {e}")
+    cur = conn.cursor()
+    yield cur
+    conn.rollback()
+    cur.close()
+    conn.close()
+
+
+def test_open_day_before_frozen_days(cur):
+    """A day kept live by a visitor still inside must not hide the frozen days after it"""
+    cur.execute("""
+        SELECT h.entry_time::date, h.tid
+        FROM transaction_header h
+        WHERE h.entry_time < CURRENT_DATE - 7
+          AND EXISTS (SELECT 1 FROM transaction_header l
+                      WHERE l.entry_time >= h.entry_time::date + 1
+                        AND l.entry_time < h.entry_time::date + 7)
+        ORDER BY h.entry_time DESC
+        LIMIT 1
+    """)
+    row = cur.fetchone()
+    if row is None:
+        pytest.skip("no week with visits on more than one day")
+    day, tid = row
+
+    cur.execute("UPDATE transaction_header SET exit_time = NULL WHERE tid = %s", (tid,))
+    cur.execute("DELETE FROM police_snapshots WHERE day >= %s AND day < %s::date + 7", (day, day))
+    start, end, live_from, live_until = period_range(cur, 'week', day)
+
+    cur.execute("SELECT day FROM police_snapshots WHERE day >= %s AND day < %s ORDER BY day", (start, end))
+    frozen = [r[0] for r in cur.fetchall()]
+    assert day not in frozen and frozen, "expected an open first day followed by frozen days"
+
+    cur.execute(visitor_query(), {'from_day': start, 'end': end,
+                                  'live_from': live_from, 'live_until': live_until})
+    logged = [r[5] for r in cur.fetchall()]
+    cur.execute("""
+        SELECT tid FROM transactions
+        WHERE entry_time >= %s AND entry_time < %s
+        ORDER BY entry_time, tid
+    """, (start, end))
+    assert logged == [r[0] for r in cur.fetchall()]
@@ -0,0 +1,94 @@
+# widgets.py - Concurrent dashboard widgets with per-widget time budgets
+#
+# Each widget is a function fn(cur, *args) with no dependency on the others,
+# so run_widgets() fans them out over a small thread pool, each on its own
+# pooled connection (db.get_pool). A widget that errors or misses its budget
+# does not hold up the page: it is replaced by the last value it produced in
+# this process for the same arguments, or by its placeholder if it has never
+# finished for them. The budget is
+# also set as the statement_timeout, so an overrunning query is cancelled and
+# its connection goes back to the pool instead of piling up.
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from db import get_pool, DB_POOL_SIZE
+
+WIDGET_BUDGET_MS = int(os.environ.get('WIDGET_BUDGET_MS', '1500'))
+WIDGET_WORKERS = min(int(os.environ.get('WIDGET_WORKERS', '6')), DB_POOL_SIZE)
+
+_executor = ThreadPoolExecutor(max_workers=WIDGET_WORKERS, thread_name_prefix='widget')
+_last_good = {}         # (widget name, key) -> last value that finished within budget, oldest first
+LAST_GOOD_MAX = 256     # custom ranges and dated keys would otherwise pile up
+_last_good_lock = threading.Lock()
+_pending = 0            # submitted widgets that no worker has started yet
+_pending_lock = threading.Lock()
+
+
+def widget(fn, *args, placeholder=None, budget_ms=None, key=None):
+    """
+    Widget spec for run_widgets: fn(cur, *args), its placeholder and budget
+    A degraded widget only falls back to a value produced for the same key,
+    by default its args; pass key when args include the current time.
+    """
+    return {'fn': fn, 'args': args, 'placeholder': placeholder,
+            'budget_ms': budget_ms or WIDGET_BUDGET_MS,
+            'key': repr(args if key is None else key)}
+
+
+def _submit(spec):
+    global _pending
+    with _pending_lock:
+        _pending += 1
+    # Each widget runs in a copy of the request's context, so its queries count towards the request's timings
+    return _executor.submit(contextvars.copy_context().run, _run_one, spec)
+
+
+def _run_one(spec):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        cur = conn.cursor()
+        cur.execute("SET LOCAL statement_timeout = %s", (spec['budget_ms'],))
+        result = spec['fn'](cur, *spec['args'])
+        cur.close()
+        return result
+    finally:
+        try:
+            conn.rollback()     # read-only; ends the transaction so SET LOCAL is dropped
+        except Exception:
+            pass
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def pending_widgets():
+    """Widgets submitted but not yet started: they are waiting for a worker and its pooled connection"""
+    with _pending_lock:
+        return _pending
+
+
+def run_widgets(specs):
+    """Run {name: widget(...)} concurrently; returns (results by name, degraded names)"""
+    started = time.monotonic()
+    futures = {name: _submit(spec) for name, spec in specs.items()}
+    results, degraded = {}, []
+    for name, future in futures.items():
+        deadline = started + specs[name]['budget_ms'] / 1000
+        last_good_key = (name, specs[name]['key'])
+        try:
+            results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            with _last_good_lock:
+                _last_good.pop(last_good_key, None)
+                _last_good[last_good_key] = results[name]
+                if len(_last_good) > LAST_GOOD_MAX:
+                    del _last_good[next(iter(_last_good))]
+        except Exception as e:
+            print(f"Widget {name} degraded: {e!r}")
+            with _last_good_lock:
+                results[name] = _last_good.get(last_good_key, specs[name]['placeholder'])
+            degraded.append(name)
+    return results, degraded
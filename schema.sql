@@ -10,10 +10,24 @@
 -- ============================================================================
 -- SECTION 1: CLEANUP (Optional - uncomment for clean setup)
 -- ============================================================================
+DROP TABLE IF EXISTS police_snapshots CASCADE;
+DROP TABLE IF EXISTS report_results CASCADE;
+DROP TABLE IF EXISTS daily_visit_items CASCADE;
+DROP TABLE IF EXISTS daily_visit_totals CASCADE;
+DROP TABLE IF EXISTS daily_room_totals CASCADE;
+DROP TABLE IF EXISTS daily_therapist_totals CASCADE;
+DROP TABLE IF EXISTS daily_payment_totals CASCADE;
+DROP TABLE IF EXISTS customer_visit_items CASCADE;
+DROP TABLE IF EXISTS customer_monthly_spend CASCADE;
+DROP TABLE IF EXISTS customer_therapist_stats CASCADE;
+DROP TABLE IF EXISTS customer_stats CASCADE;
+DROP TABLE IF EXISTS partitioned_ids CASCADE;
 DROP TABLE IF EXISTS refunds CASCADE;
 DROP TABLE IF EXISTS payments CASCADE;
 DROP TABLE IF EXISTS transaction_items CASCADE;
-DROP TABLE IF EXISTS transactions CASCADE;
+DROP TABLE IF EXISTS transaction_totals CASCADE;
+DROP TABLE IF EXISTS transaction_header CASCADE;   -- also drops the transactions view
+DROP TABLE IF EXISTS transactions CASCADE;         -- pre-split schema
 DROP TABLE IF EXISTS services CASCADE;
 DROP TABLE IF EXISTS roles CASCADE;
 DROP TABLE IF EXISTS role_definition CASCADE;
@@ -21,11 +35,13 @@ DROP TABLE IF EXISTS employees CASCADE;
 DROP TABLE IF EXISTS customers CASCADE;
 DROP TABLE IF EXISTS room CASCADE;
 DROP TABLE IF EXISTS nationcode CASCADE;
+DROP SCHEMA IF EXISTS archive CASCADE;
 
 DROP TYPE IF EXISTS status_enum CASCADE;
 DROP TYPE IF EXISTS discount_type_enum CASCADE;
 DROP TYPE IF EXISTS gender_enum CASCADE;
 DROP TYPE IF EXISTS paymentmethod_enum CASCADE;
+DROP TYPE IF EXISTS role_category_enum CASCADE;
 
 -- ============================================================================
 -- SECTION 2: CUSTOM ENUMERATIONS
@@ -66,6 +82,14 @@ CREATE TYPE paymentmethod_enum AS ENUM (
   'Voucher'
 );
 
+-- Which landing page login / staff filter a role belongs to
+CREATE TYPE role_category_enum AS ENUM (
+  'management',   -- Manager roles
+  'therapist',    -- Service providers (therapist, beautician, doctor)
+  'cashier',      -- Front desk
+  'other'
+);
+
 -- ============================================================================
 -- SECTION 3: LOOKUP TABLES
 -- ============================================================================
@@ -130,7 +154,8 @@ COMMENT ON TABLE employees IS 'Employee profiles including therapists, cashiers,
 -- Role definitions (lookup table for flexibility)
 CREATE TABLE role_definition (
   rdid SERIAL PRIMARY KEY,
-  role_type VARCHAR(64) UNIQUE NOT NULL
+  role_type VARCHAR(64) UNIQUE NOT NULL,
+  role_category role_category_enum NOT NULL  -- filled from role_type by trg_set_role_category when omitted
 );
 
 COMMENT ON TABLE role_definition IS 'Master list of possible roles (Therapist, Cashier, Manager, etc.)';
@@ -173,23 +198,44 @@ COMMENT ON TABLE services IS 'Service catalog with pricing, duration, and requir
 -- SECTION 5: TRANSACTION TABLES
 -- ============================================================================
 
+-- Transactional tables are range partitioned by month (see SECTION 9).
+-- A partitioned table's primary key must contain the partition column, so
+-- nothing can hold a foreign key to transaction_header(tid) alone; child
+-- tables check their parent with trg_check_*_transaction instead. The check
+-- probes transaction_totals, whose row is written with every header.
+
 -- Master transaction record (invoice header)
-CREATE TABLE transactions (
-  tid BIGSERIAL PRIMARY KEY,
+-- Only the columns that are written once (or at customer exit) live here, so
+-- the wide row and its indexes are not rewritten by the payment/item triggers.
+CREATE TABLE transaction_header (
+  tid BIGSERIAL,
   cid BIGINT NOT NULL,
   cashier_eid BIGINT NOT NULL,
+  entry_time TIMESTAMPTZ NOT NULL DEFAULT NOW(),  -- Customer entry (police requirement, partition key)
+  exit_time TIMESTAMPTZ,            -- Customer exit (police requirement)
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (tid, entry_time),
+  FOREIGN KEY (cid) REFERENCES customers(cid),
+  FOREIGN KEY (cashier_eid) REFERENCES employees(eid),
+  CONSTRAINT chk_txn_time_order 
+    CHECK (exit_time IS NULL OR exit_time > entry_time)
+) PARTITION BY RANGE (entry_time);
+
+COMMENT ON TABLE transaction_header IS 'Invoice header with customer, cashier and police compliance timestamps';
+
+-- Running totals and status (one narrow row per transaction)
+-- Rewritten by every item/payment/refund trigger. Only the primary key is
+-- indexed and fillfactor leaves free space on each page, so these updates
+-- stay heap-only (HOT) and do not touch any index.
+CREATE TABLE transaction_totals (
+  tid BIGINT PRIMARY KEY,
   billlevel_discount NUMERIC(10,2) NOT NULL DEFAULT 0,
   billlevel_discount_type discount_type_enum NOT NULL DEFAULT 'none',
   total_cost NUMERIC(10,2) DEFAULT 0,
   total_discount NUMERIC(10,2) DEFAULT 0,
   total_paid NUMERIC(10,2) DEFAULT 0,
-  entry_time TIMESTAMPTZ,           -- Customer entry (police requirement)
-  exit_time TIMESTAMPTZ,            -- Customer exit (police requirement)
   status status_enum NOT NULL DEFAULT 'pending',
-  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
   updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-  FOREIGN KEY (cid) REFERENCES customers(cid),
-  FOREIGN KEY (cashier_eid) REFERENCES employees(eid),
   CONSTRAINT chk_txn_amounts_nonnegative 
     CHECK (
       total_cost >= 0 AND 
@@ -198,16 +244,56 @@ CREATE TABLE transactions (
       billlevel_discount >= 0
     ),
   CONSTRAINT chk_txn_discount_not_exceed_cost 
-    CHECK (billlevel_discount <= total_cost),
-  CONSTRAINT chk_txn_time_order 
-    CHECK (exit_time IS NULL OR exit_time > entry_time)
+    CHECK (billlevel_discount <= total_cost)
+) WITH (fillfactor = 70);
+
+ALTER TABLE transaction_totals SET (
+  autovacuum_vacuum_scale_factor = 0.05,
+  autovacuum_analyze_scale_factor = 0.05
 );
 
-COMMENT ON TABLE transactions IS 'Master transaction/invoice with payment tracking and police compliance timestamps';
+COMMENT ON TABLE transaction_totals IS 'Volatile invoice totals and status, kept narrow for heap-only updates';
+
+-- Compatibility view: same columns and order as the original transactions table
+-- INSERT/UPDATE/DELETE are routed to the two base tables (see SECTION 7)
+CREATE VIEW transactions AS
+SELECT 
+  h.tid,
+  h.cid,
+  h.cashier_eid,
+  tt.billlevel_discount,
+  tt.billlevel_discount_type,
+  tt.total_cost,
+  tt.total_discount,
+  tt.total_paid,
+  h.entry_time,
+  h.exit_time,
+  tt.status,
+  h.created_at,
+  tt.updated_at
+FROM transaction_header h
+JOIN transaction_totals tt ON tt.tid = h.tid;
+
+ALTER VIEW transactions ALTER COLUMN tid SET DEFAULT nextval('transaction_header_tid_seq');
+ALTER VIEW transactions ALTER COLUMN billlevel_discount SET DEFAULT 0;
+ALTER VIEW transactions ALTER COLUMN billlevel_discount_type SET DEFAULT 'none';
+ALTER VIEW transactions ALTER COLUMN total_cost SET DEFAULT 0;
+ALTER VIEW transactions ALTER COLUMN total_discount SET DEFAULT 0;
+ALTER VIEW transactions ALTER COLUMN total_paid SET DEFAULT 0;
+ALTER VIEW transactions ALTER COLUMN entry_time SET DEFAULT NOW();
+ALTER VIEW transactions ALTER COLUMN status SET DEFAULT 'pending';
+ALTER VIEW transactions ALTER COLUMN created_at SET DEFAULT NOW();
+ALTER VIEW transactions ALTER COLUMN updated_at SET DEFAULT NOW();
+
+COMMENT ON VIEW transactions IS 'Master transaction/invoice with payment tracking and police compliance timestamps';
 
 -- Transaction line items (scheduled services)
+-- Partitioned by actual_start; services not started yet (NULL) sit in the
+-- transaction_items_unstarted default partition and move to their month
+-- partition when start-service stamps actual_start. There is no primary key
+-- because actual_start is nullable; ttid is kept unique in partitioned_ids.
 CREATE TABLE transaction_items (
-  ttid BIGSERIAL PRIMARY KEY,
+  ttid BIGSERIAL,
   tid BIGINT NOT NULL,
   sid BIGINT NOT NULL,
   therapist_eid BIGINT NOT NULL,
@@ -219,7 +305,6 @@ CREATE TABLE transaction_items (
   item_discount NUMERIC(10,2) NOT NULL DEFAULT 0,
   item_discount_type discount_type_enum NOT NULL DEFAULT 'none',
   rid INT NOT NULL,                 -- Assigned room
-  FOREIGN KEY (tid) REFERENCES transactions(tid) ON DELETE CASCADE,
   FOREIGN KEY (sid) REFERENCES services(sid),
   FOREIGN KEY (therapist_eid) REFERENCES employees(eid),
   FOREIGN KEY (rid) REFERENCES room(rid),
@@ -239,21 +324,25 @@ CREATE TABLE transaction_items (
       actual_start IS NULL OR 
       actual_end >= actual_start
     )
-);
+) PARTITION BY RANGE (actual_start);
+
+CREATE TABLE transaction_items_unstarted PARTITION OF transaction_items DEFAULT;
+ALTER TABLE transaction_items_unstarted
+  ADD CONSTRAINT chk_item_unstarted CHECK (actual_start IS NULL);
 
 COMMENT ON TABLE transaction_items IS 'Individual service line items with scheduling and room assignment';
 
 -- Payment records (supports multiple payments per transaction)
 CREATE TABLE payments (
-  pid BIGSERIAL PRIMARY KEY,
+  pid BIGSERIAL,
   tid BIGINT NOT NULL,
   payment_method paymentmethod_enum NOT NULL,
   payment_amount NUMERIC(10,2) NOT NULL,
   payment_time TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-  FOREIGN KEY (tid) REFERENCES transactions(tid) ON DELETE CASCADE,
+  PRIMARY KEY (pid, payment_time),
   CONSTRAINT chk_payment_positive 
     CHECK (payment_amount >= 0)
-);
+) PARTITION BY RANGE (payment_time);
 
 COMMENT ON TABLE payments IS 'Payment records supporting partial payments and multiple methods';
 
@@ -265,13 +354,25 @@ CREATE TABLE refunds (
   refund_amount NUMERIC(10,2) NOT NULL,
   refund_reason TEXT,
   refund_time TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-  FOREIGN KEY (tid) REFERENCES transactions(tid) ON DELETE CASCADE,
   CONSTRAINT chk_refund_positive 
     CHECK (refund_amount > 0)
 );
 
 COMMENT ON TABLE refunds IS 'Refund records for full or partial transaction refunds';
 
+-- Ids of the partitioned tables (tid, ttid, pid)
+-- Their primary keys must contain the partition column, so on its own an id
+-- would only be unique within one partition. trg_claim_*_id adds each row's id
+-- here under a plain primary key and removes it when the row is deleted; a row
+-- moving partition is a delete plus an insert, so it keeps its id.
+CREATE TABLE partitioned_ids (
+  tbl TEXT NOT NULL,
+  id BIGINT NOT NULL,
+  PRIMARY KEY (tbl, id)
+);
+
+COMMENT ON TABLE partitioned_ids IS 'Enforces unique tid/ttid/pid across the monthly partitions';
+
 -- ============================================================================
 -- SECTION 6: INDEXES (FIXED)
 -- ============================================================================
@@ -284,8 +385,9 @@ CREATE INDEX idx_employees_country_code ON employees(country_code);
 CREATE INDEX idx_roles_eid ON roles(eid);
 CREATE INDEX idx_roles_rdid ON roles(rdid);
 CREATE INDEX idx_services_rdid ON services(rdid);
-CREATE INDEX idx_transactions_cid ON transactions(cid);
-CREATE INDEX idx_transactions_cashier_eid ON transactions(cashier_eid);
+CREATE INDEX idx_transactions_cid ON transaction_header(cid);
+CREATE INDEX idx_transactions_cashier_eid ON transaction_header(cashier_eid);
+CREATE INDEX idx_transaction_items_ttid ON transaction_items(ttid);
 CREATE INDEX idx_transaction_items_tid ON transaction_items(tid);
 CREATE INDEX idx_transaction_items_sid ON transaction_items(sid);
 CREATE INDEX idx_transaction_items_therapist_eid ON transaction_items(therapist_eid);
@@ -296,24 +398,42 @@ CREATE INDEX idx_refunds_tid ON refunds(tid);
 -- ----------------------------------------
 -- Search and Lookup Performance
 -- ----------------------------------------
-CREATE INDEX idx_customers_mobile ON customers(mobile_number);
+CREATE INDEX idx_customers_mobile ON customers(mobile_number);  -- also serves LIKE 'prefix%' (C locale)
 CREATE INDEX idx_employees_mobile ON employees(mobile_number);
 CREATE INDEX idx_employees_work_name ON employees(work_name);
 
+-- ----------------------------------------
+-- Customer Search (see app/customer_search.py)
+-- ----------------------------------------
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Substring and typo-tolerant matches: ILIKE '%q%', q <% name, word_similarity()
+CREATE INDEX idx_customers_name_trgm ON customers USING gin (name gin_trgm_ops);
+CREATE INDEX idx_customers_mobile_trgm ON customers USING gin (mobile_number gin_trgm_ops);
+-- Two-letter queries: lower(name) LIKE 'ab%'
+CREATE INDEX idx_customers_name_lower ON customers(lower(name) text_pattern_ops);
+-- "Last N digits": reverse(mobile_number) LIKE reverse(q) || '%'
+CREATE INDEX idx_customers_mobile_suffix ON customers(reverse(mobile_number) text_pattern_ops);
+-- Landing page picker: keyset pages on (lower(name), cid), prefix filter as a range (C locale)
+CREATE INDEX idx_customers_name_cid ON customers(lower(name), cid);
+
 -- ----------------------------------------
 -- Date/Time Range Queries (Reports, Dashboards)
 -- ----------------------------------------
-CREATE INDEX idx_transactions_entry_time ON transactions(entry_time);
-CREATE INDEX idx_transactions_created_at ON transactions(created_at);
+CREATE INDEX idx_transactions_entry_time ON transaction_header(entry_time);
+CREATE INDEX idx_transactions_created_at ON transaction_header(created_at);
 CREATE INDEX idx_transaction_items_scheduled_start ON transaction_items(scheduled_start);
 CREATE INDEX idx_payments_time ON payments(payment_time);
 
 -- ----------------------------------------
 -- Composite Indexes for Common Query Patterns
 -- ----------------------------------------
-CREATE INDEX idx_transactions_cid_entry ON transactions(cid, entry_time DESC NULLS LAST);
+CREATE INDEX idx_transactions_cid_entry ON transaction_header(cid, entry_time DESC NULLS LAST, tid DESC);
 CREATE INDEX idx_transaction_items_therapist_schedule 
   ON transaction_items(therapist_eid, scheduled_start, scheduled_end);
+-- Therapist page: jobs by actual start (today/yesterday, top customers, leaderboard)
+CREATE INDEX idx_transaction_items_therapist_start
+  ON transaction_items(therapist_eid, actual_start);
 CREATE INDEX idx_transaction_items_room_schedule 
   ON transaction_items(rid, scheduled_start, scheduled_end);
 CREATE INDEX idx_payments_method_time ON payments(payment_method, payment_time);
@@ -332,6 +452,26 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Function: Classify a role_definition into its role_category.
+-- Runs when the category is omitted, or when role_type changes without the
+-- category being set explicitly.
+CREATE OR REPLACE FUNCTION set_role_category()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF NEW.role_category IS NULL
+     OR (TG_OP = 'UPDATE' AND NEW.role_type IS DISTINCT FROM OLD.role_type
+         AND NEW.role_category = OLD.role_category) THEN
+    NEW.role_category := CASE
+      WHEN NEW.role_type ILIKE '%manager%' THEN 'management'
+      WHEN NEW.role_type ILIKE ANY (ARRAY['%therapist%', '%doctor%', '%beautician%']) THEN 'therapist'
+      WHEN NEW.role_type ILIKE '%cashier%' THEN 'cashier'
+      ELSE 'other'
+    END;
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Function: Auto-calculate scheduled_end from service duration
 CREATE OR REPLACE FUNCTION calculate_scheduled_end()
 RETURNS TRIGGER AS $$
@@ -355,6 +495,9 @@ DECLARE
   v_items_cost NUMERIC(10,2);
   v_items_discount NUMERIC(10,2);
 BEGIN
+  IF current_setting('spa.archiving', true) = 'on' THEN
+    RETURN NULL;    -- rows archived by detach_transaction_partitions() keep counting
+  END IF;
   IF TG_OP = 'DELETE' THEN
     v_tid := OLD.tid;
   ELSE
@@ -368,11 +511,14 @@ BEGIN
   FROM transaction_items 
   WHERE tid = v_tid;
 
-  UPDATE transactions
+  -- Skip no-op rewrites so unchanged totals leave no dead tuple behind
+  UPDATE transaction_totals
   SET 
     total_cost = v_items_cost,
     total_discount = v_items_discount + COALESCE(billlevel_discount, 0)
-  WHERE tid = v_tid;
+  WHERE tid = v_tid
+    AND (total_cost, total_discount) IS DISTINCT FROM
+        (v_items_cost, v_items_discount + COALESCE(billlevel_discount, 0));
 
   RETURN COALESCE(NEW, OLD);
 END;
@@ -403,6 +549,9 @@ DECLARE
   v_paid NUMERIC(10,2);
   v_refunded NUMERIC(10,2);
 BEGIN
+  IF current_setting('spa.archiving', true) = 'on' THEN
+    RETURN NULL;    -- rows archived by detach_transaction_partitions() keep counting
+  END IF;
   IF TG_OP = 'DELETE' THEN
     v_tid := OLD.tid;
   ELSE
@@ -419,9 +568,10 @@ BEGIN
   FROM refunds 
   WHERE tid = v_tid;
 
-  UPDATE transactions
+  UPDATE transaction_totals
   SET total_paid = v_paid - v_refunded
-  WHERE tid = v_tid;
+  WHERE tid = v_tid
+    AND total_paid IS DISTINCT FROM v_paid - v_refunded;
 
   RETURN COALESCE(NEW, OLD);
 END;
@@ -449,13 +599,186 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Function: Check the parent transaction exists (stands in for the FK)
+-- Probes the unpartitioned totals table: one row per header, PK on tid
+CREATE OR REPLACE FUNCTION check_transaction_exists()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM transaction_totals WHERE tid = NEW.tid) THEN
+    RAISE EXCEPTION 'transaction % does not exist', NEW.tid
+      USING ERRCODE = 'foreign_key_violation';
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Claim (INSERT) or release (DELETE) a row's id in partitioned_ids
+-- TG_ARGV: the parent table name and its id column. A duplicate id fails with
+-- unique_violation on partitioned_ids_pkey.
+CREATE OR REPLACE FUNCTION claim_partitioned_id()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('DELETE', 'UPDATE') THEN
+    DELETE FROM partitioned_ids
+    WHERE tbl = TG_ARGV[0] AND id = (to_jsonb(OLD) ->> TG_ARGV[1])::bigint;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO partitioned_ids (tbl, id)
+    VALUES (TG_ARGV[0], (to_jsonb(NEW) ->> TG_ARGV[1])::bigint);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Cascade a header delete to totals, items, payments and refunds
+CREATE OR REPLACE FUNCTION delete_transaction_children()
+RETURNS TRIGGER AS $$
+BEGIN
+  DELETE FROM transaction_items WHERE tid = OLD.tid;
+  DELETE FROM payments WHERE tid = OLD.tid;
+  DELETE FROM refunds WHERE tid = OLD.tid;
+  DELETE FROM transaction_totals WHERE tid = OLD.tid;
+  RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Route INSERT on the transactions view to header + totals
+CREATE OR REPLACE FUNCTION transactions_view_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO transaction_header (tid, cid, cashier_eid, entry_time, exit_time, created_at)
+  VALUES (NEW.tid, NEW.cid, NEW.cashier_eid, NEW.entry_time, NEW.exit_time, NEW.created_at);
+
+  INSERT INTO transaction_totals (tid, billlevel_discount, billlevel_discount_type,
+                                  total_cost, total_discount, total_paid, status, updated_at)
+  VALUES (NEW.tid, NEW.billlevel_discount, NEW.billlevel_discount_type,
+          NEW.total_cost, NEW.total_discount, NEW.total_paid, NEW.status, NEW.updated_at)
+  RETURNING total_discount, status
+  INTO NEW.total_discount, NEW.status;
+
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Route UPDATE on the transactions view
+-- The header is only rewritten when one of its own columns changes. Only the
+-- columns the statement changed are assigned; the others keep the row's
+-- current value, so totals the item and payment triggers wrote concurrently
+-- (after this statement's snapshot) are not overwritten with stale ones.
+CREATE OR REPLACE FUNCTION transactions_view_update()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF (NEW.cid, NEW.cashier_eid, NEW.entry_time, NEW.exit_time, NEW.created_at)
+     IS DISTINCT FROM
+     (OLD.cid, OLD.cashier_eid, OLD.entry_time, OLD.exit_time, OLD.created_at) THEN
+    UPDATE transaction_header
+    SET 
+      cid = CASE WHEN NEW.cid IS DISTINCT FROM OLD.cid THEN NEW.cid ELSE cid END,
+      cashier_eid = CASE WHEN NEW.cashier_eid IS DISTINCT FROM OLD.cashier_eid
+                         THEN NEW.cashier_eid ELSE cashier_eid END,
+      entry_time = CASE WHEN NEW.entry_time IS DISTINCT FROM OLD.entry_time
+                        THEN NEW.entry_time ELSE entry_time END,
+      exit_time = CASE WHEN NEW.exit_time IS DISTINCT FROM OLD.exit_time
+                       THEN NEW.exit_time ELSE exit_time END,
+      created_at = CASE WHEN NEW.created_at IS DISTINCT FROM OLD.created_at
+                        THEN NEW.created_at ELSE created_at END
+    WHERE tid = OLD.tid
+      AND entry_time = OLD.entry_time;
+  END IF;
+
+  UPDATE transaction_totals
+  SET 
+    billlevel_discount = CASE WHEN NEW.billlevel_discount IS DISTINCT FROM OLD.billlevel_discount
+                              THEN NEW.billlevel_discount ELSE billlevel_discount END,
+    billlevel_discount_type = CASE WHEN NEW.billlevel_discount_type IS DISTINCT FROM OLD.billlevel_discount_type
+                                   THEN NEW.billlevel_discount_type ELSE billlevel_discount_type END,
+    total_cost = CASE WHEN NEW.total_cost IS DISTINCT FROM OLD.total_cost
+                      THEN NEW.total_cost ELSE total_cost END,
+    total_discount = CASE WHEN NEW.total_discount IS DISTINCT FROM OLD.total_discount
+                          THEN NEW.total_discount ELSE total_discount END,
+    total_paid = CASE WHEN NEW.total_paid IS DISTINCT FROM OLD.total_paid
+                      THEN NEW.total_paid ELSE total_paid END,
+    status = CASE WHEN NEW.status IS DISTINCT FROM OLD.status THEN NEW.status ELSE status END
+  WHERE tid = OLD.tid
+  RETURNING total_cost, total_discount, total_paid, status, updated_at
+  INTO NEW.total_cost, NEW.total_discount, NEW.total_paid, NEW.status, NEW.updated_at;
+
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Route DELETE on the transactions view (totals, items, payments cascade)
+CREATE OR REPLACE FUNCTION transactions_view_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+  DELETE FROM transaction_header
+  WHERE tid = OLD.tid
+    AND entry_time = OLD.entry_time;
+  RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
 -- ============================================================================
 -- SECTION 8: TRIGGER DEFINITIONS
 -- ============================================================================
 
+-- Writes through the transactions compatibility view
+CREATE TRIGGER trg_transactions_view_insert
+  INSTEAD OF INSERT ON transactions
+  FOR EACH ROW
+  EXECUTE FUNCTION transactions_view_insert();
+
+CREATE TRIGGER trg_transactions_view_update
+  INSTEAD OF UPDATE ON transactions
+  FOR EACH ROW
+  EXECUTE FUNCTION transactions_view_update();
+
+CREATE TRIGGER trg_transactions_view_delete
+  INSTEAD OF DELETE ON transactions
+  FOR EACH ROW
+  EXECUTE FUNCTION transactions_view_delete();
+
+-- Referential integrity towards the partitioned transaction_header
+CREATE TRIGGER trg_check_items_transaction
+  BEFORE INSERT OR UPDATE OF tid ON transaction_items
+  FOR EACH ROW
+  EXECUTE FUNCTION check_transaction_exists();
+
+CREATE TRIGGER trg_check_payments_transaction
+  BEFORE INSERT OR UPDATE OF tid ON payments
+  FOR EACH ROW
+  EXECUTE FUNCTION check_transaction_exists();
+
+CREATE TRIGGER trg_check_refunds_transaction
+  BEFORE INSERT OR UPDATE OF tid ON refunds
+  FOR EACH ROW
+  EXECUTE FUNCTION check_transaction_exists();
+
+-- Ids unique across partitions (a cross-partition UPDATE fires DELETE + INSERT)
+CREATE TRIGGER trg_claim_header_id
+  AFTER INSERT OR DELETE OR UPDATE OF tid ON transaction_header
+  FOR EACH ROW
+  EXECUTE FUNCTION claim_partitioned_id('transaction_header', 'tid');
+
+CREATE TRIGGER trg_claim_item_id
+  AFTER INSERT OR DELETE OR UPDATE OF ttid ON transaction_items
+  FOR EACH ROW
+  EXECUTE FUNCTION claim_partitioned_id('transaction_items', 'ttid');
+
+CREATE TRIGGER trg_claim_payment_id
+  AFTER INSERT OR DELETE OR UPDATE OF pid ON payments
+  FOR EACH ROW
+  EXECUTE FUNCTION claim_partitioned_id('payments', 'pid');
+
+-- BEFORE, so the children's own triggers can still see the header row
+CREATE TRIGGER trg_delete_transaction_children
+  BEFORE DELETE ON transaction_header
+  FOR EACH ROW
+  EXECUTE FUNCTION delete_transaction_children();
+
 -- Auto-update updated_at on transactions and employees
 CREATE TRIGGER trg_update_transactions_updated_at
-  BEFORE UPDATE ON transactions
+  BEFORE UPDATE ON transaction_totals
   FOR EACH ROW
   EXECUTE FUNCTION update_updated_at_column();
 
@@ -464,22 +787,30 @@ CREATE TRIGGER trg_update_employees_updated_at
   FOR EACH ROW
   EXECUTE FUNCTION update_updated_at_column();
 
+-- Derive role_category from role_type
+CREATE TRIGGER trg_set_role_category
+  BEFORE INSERT OR UPDATE ON role_definition
+  FOR EACH ROW
+  EXECUTE FUNCTION set_role_category();
+
 -- Auto-calculate scheduled_end when transaction_item is inserted/updated
 CREATE TRIGGER trg_calculate_scheduled_end
   BEFORE INSERT OR UPDATE OF scheduled_start, sid ON transaction_items
   FOR EACH ROW
   EXECUTE FUNCTION calculate_scheduled_end();
 
--- Update transaction totals when items change
+-- Update transaction totals when item amounts change
+-- (start/end timestamps do not affect totals, so they no longer fire this)
 CREATE TRIGGER trg_update_transaction_totals
-  AFTER INSERT OR UPDATE OR DELETE ON transaction_items
+  AFTER INSERT OR DELETE OR UPDATE OF tid, cost, item_discount ON transaction_items
   FOR EACH ROW
   EXECUTE FUNCTION update_transaction_totals();
 
 -- Recalculate discount when bill-level discount is modified
 CREATE TRIGGER trg_update_discount_on_billlevel
-  BEFORE UPDATE OF billlevel_discount ON transactions
+  BEFORE UPDATE OF billlevel_discount ON transaction_totals
   FOR EACH ROW
+  WHEN (OLD.billlevel_discount IS DISTINCT FROM NEW.billlevel_discount)
   EXECUTE FUNCTION update_discount_on_billlevel_change();
 
 -- Update total_paid when payments change
@@ -496,12 +827,818 @@ CREATE TRIGGER trg_update_total_paid_refund
 
 -- Auto-update status based on payment state (runs after total_paid updates)
 CREATE TRIGGER trg_update_transaction_status
-  BEFORE INSERT OR UPDATE ON transactions
+  BEFORE INSERT OR UPDATE ON transaction_totals
   FOR EACH ROW
   EXECUTE FUNCTION update_transaction_status();
 
 -- ============================================================================
--- SECTION 9: VERIFICATION QUERIES (Uncomment to test after creation)
+-- SECTION 9: PARTITION MAINTENANCE
+-- ============================================================================
+-- Monthly partitions are named <table>_pYYYY_MM. Triggers and indexes defined
+-- on the parent tables are cloned onto every new partition automatically.
+
+-- Function: Create the monthly partitions covering [p_from, p_to] (idempotent)
+CREATE OR REPLACE FUNCTION create_transaction_partitions(p_from DATE, p_to DATE)
+RETURNS INTEGER AS $$
+DECLARE
+  v_month DATE := date_trunc('month', p_from)::date;
+  v_table TEXT;
+  v_name TEXT;
+  v_created INTEGER := 0;
+BEGIN
+  WHILE v_month <= p_to LOOP
+    FOREACH v_table IN ARRAY ARRAY['transaction_header', 'transaction_items', 'payments'] LOOP
+      v_name := format('%s_p%s', v_table, to_char(v_month, 'YYYY_MM'));
+      IF to_regclass(v_name) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                       v_name, v_table, v_month, (v_month + INTERVAL '1 month')::date);
+        v_created := v_created + 1;
+      END IF;
+    END LOOP;
+    v_month := (v_month + INTERVAL '1 month')::date;
+  END LOOP;
+  RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Make sure this month and the next p_months_ahead months exist
+CREATE OR REPLACE FUNCTION ensure_transaction_partitions(p_months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+BEGIN
+  RETURN create_transaction_partitions(
+    CURRENT_DATE,
+    (date_trunc('month', CURRENT_DATE) + make_interval(months => p_months_ahead))::date
+  );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Archive every month that ends on or before p_before
+-- The monthly partitions of the three tables are detached and moved to the
+-- archive schema (metadata only). What gets archived is each month's
+-- transactions, chosen by their header: their items and payments that fall
+-- in a month that stays attached (or have not started), their refunds and
+-- their totals rows go to archive.<table>_pYYYY_MM of the header's month.
+-- They are deleted with spa.archiving set for the transaction only, which
+-- the totals, rollup and customer_stats triggers skip on, so the rollups and
+-- customer_stats keep counting them, as they do the detached rows, and
+-- cashier traffic is not locked out as it would be by ALTER TABLE. Ids of
+-- everything archived are released from partitioned_ids. Nothing is detached
+-- if an item or payment in a detached month belongs to a transaction that
+-- stays attached.
+CREATE OR REPLACE FUNCTION detach_transaction_partitions(p_before DATE)
+RETURNS INTEGER AS $$
+DECLARE
+  v_part RECORD;
+  v_children TEXT[] := '{}';
+  v_child TEXT;
+  v_suffix TEXT;
+  v_table TEXT;
+  v_stranded BIGINT;
+  v_detached INTEGER := 0;
+BEGIN
+  CREATE SCHEMA IF NOT EXISTS archive;
+  CREATE TEMP TABLE IF NOT EXISTS detached_tids (
+    tid BIGINT PRIMARY KEY,
+    suffix TEXT NOT NULL            -- pYYYY_MM of the header's month
+  ) ON COMMIT DROP;
+  TRUNCATE detached_tids;
+
+  FOR v_part IN
+    SELECT parent.relname AS parent_name, child.relname AS child_name
+    FROM pg_inherits i
+    JOIN pg_class parent ON parent.oid = i.inhparent
+    JOIN pg_class child ON child.oid = i.inhrelid
+    JOIN pg_namespace n ON n.oid = child.relnamespace
+    WHERE n.nspname = 'public'
+      AND parent.relname IN ('transaction_header', 'transaction_items', 'payments')
+      AND child.relname ~ '_p[0-9]{4}_[0-9]{2}$'
+      AND (to_date(right(child.relname, 7), 'YYYY_MM') + INTERVAL '1 month')::date <= p_before
+    ORDER BY child.relname
+  LOOP
+    EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', v_part.parent_name, v_part.child_name);
+    EXECUTE format('ALTER TABLE %I SET SCHEMA archive', v_part.child_name);
+    EXECUTE format('DELETE FROM partitioned_ids p USING archive.%I c WHERE p.tbl = %L AND p.id = c.%I',
+                   v_part.child_name, v_part.parent_name,
+                   CASE v_part.parent_name WHEN 'transaction_header' THEN 'tid'
+                                           WHEN 'transaction_items' THEN 'ttid'
+                                           ELSE 'pid' END);
+
+    IF v_part.parent_name = 'transaction_header' THEN
+      EXECUTE format('INSERT INTO detached_tids SELECT tid, %L FROM archive.%I',
+                     right(v_part.child_name, 8), v_part.child_name);
+    ELSE
+      v_children := v_children || v_part.child_name;
+    END IF;
+
+    v_detached := v_detached + 1;
+  END LOOP;
+
+  -- A detached item or payment must not belong to a transaction left attached
+  FOREACH v_child IN ARRAY v_children LOOP
+    EXECUTE format(
+      'SELECT COUNT(*) FROM archive.%I c
+       WHERE NOT EXISTS (SELECT 1 FROM detached_tids d WHERE d.tid = c.tid)
+         AND EXISTS (SELECT 1 FROM transaction_totals tt WHERE tt.tid = c.tid)',
+      v_child) INTO v_stranded;
+    IF v_stranded > 0 THEN
+      RAISE EXCEPTION '% rows of % belong to transactions that stay attached; archive a later month too',
+        v_stranded, v_child;
+    END IF;
+  END LOOP;
+
+  -- The archived transactions' rows outside the detached partitions
+  FOR v_suffix IN SELECT DISTINCT suffix FROM detached_tids ORDER BY 1 LOOP
+    EXECUTE format(
+      'CREATE TABLE archive.%I AS
+         SELECT tt.* FROM transaction_totals tt JOIN detached_tids d ON d.tid = tt.tid WHERE d.suffix = %L',
+      'transaction_totals_' || v_suffix, v_suffix);
+    EXECUTE format(
+      'CREATE TABLE archive.%I AS
+         SELECT r.* FROM refunds r JOIN detached_tids d ON d.tid = r.tid WHERE d.suffix = %L',
+      'refunds_' || v_suffix, v_suffix);
+    FOREACH v_table IN ARRAY ARRAY['transaction_items', 'payments'] LOOP
+      IF to_regclass(format('archive.%I', v_table || '_' || v_suffix)) IS NULL THEN
+        EXECUTE format('CREATE TABLE archive.%I (LIKE %I)', v_table || '_' || v_suffix, v_table);
+      END IF;
+      EXECUTE format(
+        'INSERT INTO archive.%I
+         SELECT c.* FROM %I c JOIN detached_tids d ON d.tid = c.tid WHERE d.suffix = %L',
+        v_table || '_' || v_suffix, v_table, v_suffix);
+    END LOOP;
+  END LOOP;
+
+  -- Only this transaction skips the totals, rollup and customer_stats triggers
+  -- (they check spa.archiving); the id claims are released as usual
+  PERFORM set_config('spa.archiving', 'on', true);
+  DELETE FROM transaction_items c USING detached_tids d WHERE c.tid = d.tid;
+  DELETE FROM payments c USING detached_tids d WHERE c.tid = d.tid;
+  DELETE FROM refunds c USING detached_tids d WHERE c.tid = d.tid;
+  DELETE FROM transaction_totals tt USING detached_tids d WHERE tt.tid = d.tid;
+  PERFORM set_config('spa.archiving', 'off', true);
+
+  RETURN v_detached;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions for the seeded history (from Dec 2024), then the months ahead
+SELECT create_transaction_partitions('2024-12-01', CURRENT_DATE);
+SELECT ensure_transaction_partitions();
+
+-- ============================================================================
+-- SECTION 10: CUSTOMER SUMMARY
+-- ============================================================================
+-- Per-customer aggregates read by the customer dashboard and the management
+-- high-spender report. As in those reports, spend, visits and therapist counts
+-- only include transactions whose status is completed or paid; the last
+-- service is tracked whatever the status. The triggers below keep the tables
+-- current as items are added/started/ended and as payments move the status.
+-- last_visit and the last service only move forward, so after deleting
+-- history run rebuild_customer_stats(), which recomputes everything.
+
+CREATE TABLE customer_stats (
+  cid BIGINT PRIMARY KEY,
+  lifetime_spend NUMERIC(12,2) NOT NULL DEFAULT 0,
+  visit_count INTEGER NOT NULL DEFAULT 0,
+  last_visit TIMESTAMPTZ,
+  last_service_end TIMESTAMPTZ,
+  last_service_eid BIGINT,
+  last_service_sid BIGINT,
+  updated_at TIMESTAMPTZ DEFAULT NOW(),
+  FOREIGN KEY (cid) REFERENCES customers(cid) ON DELETE CASCADE
+) WITH (fillfactor = 80);
+
+-- Services done per (customer, therapist)
+CREATE TABLE customer_therapist_stats (
+  cid BIGINT NOT NULL,
+  therapist_eid BIGINT NOT NULL,
+  services_done INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (cid, therapist_eid),
+  FOREIGN KEY (cid) REFERENCES customers(cid) ON DELETE CASCADE
+);
+
+-- Spend and visits per (customer, month of actual_start)
+CREATE TABLE customer_monthly_spend (
+  cid BIGINT NOT NULL,
+  month DATE NOT NULL,
+  spend NUMERIC(12,2) NOT NULL DEFAULT 0,
+  visits INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (cid, month),
+  FOREIGN KEY (cid) REFERENCES customers(cid) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_customer_monthly_spend_month ON customer_monthly_spend(month);
+
+-- Counted items per (transaction, month), so a visit counts once per month
+-- even when several of its items land in the same statement
+CREATE TABLE customer_visit_items (
+  tid BIGINT NOT NULL,
+  month DATE NOT NULL,
+  items INTEGER NOT NULL,
+  PRIMARY KEY (tid, month)
+);
+
+-- Function: Add (p_sign = 1) or remove (p_sign = -1) one item's contribution
+CREATE OR REPLACE FUNCTION apply_customer_item_stats(
+  p_cid BIGINT, p_tid BIGINT, p_eid BIGINT,
+  p_start TIMESTAMPTZ, p_net NUMERIC, p_sign INTEGER)
+RETURNS VOID AS $$
+DECLARE
+  v_month DATE;
+  v_items INTEGER;
+  v_visits INTEGER := 0;
+BEGIN
+  INSERT INTO customer_stats (cid, lifetime_spend)
+  VALUES (p_cid, p_sign * p_net)
+  ON CONFLICT (cid) DO UPDATE
+  SET lifetime_spend = customer_stats.lifetime_spend + EXCLUDED.lifetime_spend,
+      updated_at = NOW();
+
+  INSERT INTO customer_therapist_stats (cid, therapist_eid, services_done)
+  VALUES (p_cid, p_eid, p_sign)
+  ON CONFLICT (cid, therapist_eid) DO UPDATE
+  SET services_done = customer_therapist_stats.services_done + EXCLUDED.services_done;
+
+  IF p_start IS NOT NULL THEN
+    v_month := date_trunc('month', p_start)::date;
+
+    -- The visit counts when its first item lands in the month, and is
+    -- uncounted when its last one leaves
+    INSERT INTO customer_visit_items (tid, month, items)
+    VALUES (p_tid, v_month, p_sign)
+    ON CONFLICT (tid, month) DO UPDATE
+    SET items = customer_visit_items.items + EXCLUDED.items
+    RETURNING items INTO v_items;
+
+    IF p_sign > 0 AND v_items = 1 THEN
+      v_visits := 1;
+    ELSIF p_sign < 0 AND v_items = 0 THEN
+      v_visits := -1;
+      DELETE FROM customer_visit_items WHERE tid = p_tid AND month = v_month;
+    END IF;
+
+    INSERT INTO customer_monthly_spend (cid, month, spend, visits)
+    VALUES (p_cid, v_month, p_sign * p_net, v_visits)
+    ON CONFLICT (cid, month) DO UPDATE
+    SET spend = customer_monthly_spend.spend + EXCLUDED.spend,
+        visits = customer_monthly_spend.visits + EXCLUDED.visits;
+  END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Keep the summary in step with item inserts, edits and deletes
+-- A cross-partition move (actual_start set) arrives as DELETE + INSERT.
+CREATE OR REPLACE FUNCTION maintain_customer_stats_item()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_cid BIGINT;
+BEGIN
+  IF current_setting('spa.archiving', true) = 'on' THEN
+    RETURN NULL;    -- rows archived by detach_transaction_partitions() keep counting
+  END IF;
+  IF TG_OP IN ('UPDATE', 'DELETE')
+     AND EXISTS (SELECT 1 FROM transaction_totals
+                 WHERE tid = OLD.tid AND status IN ('completed', 'paid')) THEN
+    SELECT cid INTO v_cid FROM transaction_header WHERE tid = OLD.tid;
+    IF FOUND THEN
+      PERFORM apply_customer_item_stats(v_cid, OLD.tid, OLD.therapist_eid,
+                                        OLD.actual_start, OLD.cost - OLD.item_discount, -1);
+    END IF;
+  END IF;
+
+  IF TG_OP = 'DELETE' THEN
+    RETURN OLD;
+  END IF;
+
+  v_cid := NULL;
+  IF EXISTS (SELECT 1 FROM transaction_totals
+             WHERE tid = NEW.tid AND status IN ('completed', 'paid')) THEN
+    SELECT cid INTO v_cid FROM transaction_header WHERE tid = NEW.tid;
+    IF v_cid IS NOT NULL THEN
+      PERFORM apply_customer_item_stats(v_cid, NEW.tid, NEW.therapist_eid,
+                                        NEW.actual_start, NEW.cost - NEW.item_discount, 1);
+    END IF;
+  END IF;
+
+  -- Last service ended, whatever the transaction status
+  IF NEW.actual_end IS NOT NULL
+     AND (TG_OP = 'INSERT' OR OLD.actual_end IS DISTINCT FROM NEW.actual_end) THEN
+    IF v_cid IS NULL THEN
+      SELECT cid INTO v_cid FROM transaction_header WHERE tid = NEW.tid;
+    END IF;
+    IF v_cid IS NOT NULL THEN
+      INSERT INTO customer_stats (cid, last_service_end, last_service_eid, last_service_sid)
+      VALUES (v_cid, NEW.actual_end, NEW.therapist_eid, NEW.sid)
+      ON CONFLICT (cid) DO UPDATE
+      SET last_service_end = EXCLUDED.last_service_end,
+          last_service_eid = EXCLUDED.last_service_eid,
+          last_service_sid = EXCLUDED.last_service_sid,
+          updated_at = NOW()
+      WHERE customer_stats.last_service_end IS NULL
+         OR customer_stats.last_service_end <= EXCLUDED.last_service_end;
+    END IF;
+  END IF;
+
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Count or uncount a whole transaction when its status enters or
+-- leaves completed/paid (e.g. the final payment lands, or a refund)
+CREATE OR REPLACE FUNCTION maintain_customer_stats_status()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_was BOOLEAN := TG_OP <> 'INSERT' AND OLD.status IN ('completed', 'paid');
+  v_is BOOLEAN := TG_OP <> 'DELETE' AND NEW.status IN ('completed', 'paid');
+  v_tid BIGINT;
+  v_sign INTEGER;
+  v_cid BIGINT;
+  v_entry TIMESTAMPTZ;
+  v_spend NUMERIC(12,2);
+BEGIN
+  IF current_setting('spa.archiving', true) = 'on' THEN
+    RETURN NULL;    -- rows archived by detach_transaction_partitions() keep counting
+  END IF;
+  IF v_was = v_is THEN
+    RETURN NULL;
+  END IF;
+
+  v_tid := CASE WHEN TG_OP = 'DELETE' THEN OLD.tid ELSE NEW.tid END;
+  v_sign := CASE WHEN v_is THEN 1 ELSE -1 END;
+
+  SELECT cid, entry_time INTO v_cid, v_entry
+  FROM transaction_header WHERE tid = v_tid;
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+
+  SELECT COALESCE(SUM(cost - item_discount), 0) INTO v_spend
+  FROM transaction_items WHERE tid = v_tid;
+
+  INSERT INTO customer_stats (cid, lifetime_spend, visit_count, last_visit)
+  VALUES (v_cid, v_sign * v_spend, v_sign, CASE WHEN v_is THEN v_entry END)
+  ON CONFLICT (cid) DO UPDATE
+  SET lifetime_spend = customer_stats.lifetime_spend + EXCLUDED.lifetime_spend,
+      visit_count = customer_stats.visit_count + EXCLUDED.visit_count,
+      last_visit = GREATEST(customer_stats.last_visit, EXCLUDED.last_visit),
+      updated_at = NOW();
+
+  INSERT INTO customer_therapist_stats (cid, therapist_eid, services_done)
+  SELECT v_cid, therapist_eid, v_sign * COUNT(*)
+  FROM transaction_items WHERE tid = v_tid
+  GROUP BY therapist_eid
+  ON CONFLICT (cid, therapist_eid) DO UPDATE
+  SET services_done = customer_therapist_stats.services_done + EXCLUDED.services_done;
+
+  INSERT INTO customer_monthly_spend (cid, month, spend, visits)
+  SELECT v_cid, date_trunc('month', actual_start)::date,
+         v_sign * SUM(cost - item_discount), v_sign
+  FROM transaction_items
+  WHERE tid = v_tid AND actual_start IS NOT NULL
+  GROUP BY 2
+  ON CONFLICT (cid, month) DO UPDATE
+  SET spend = customer_monthly_spend.spend + EXCLUDED.spend,
+      visits = customer_monthly_spend.visits + EXCLUDED.visits;
+
+  IF v_is THEN
+    INSERT INTO customer_visit_items (tid, month, items)
+    SELECT v_tid, date_trunc('month', actual_start)::date, COUNT(*)
+    FROM transaction_items
+    WHERE tid = v_tid AND actual_start IS NOT NULL
+    GROUP BY 2;
+  ELSE
+    DELETE FROM customer_visit_items WHERE tid = v_tid;
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Recompute every summary row from the raw tables (repair/backfill)
+CREATE OR REPLACE FUNCTION rebuild_customer_stats()
+RETURNS VOID AS $$
+BEGIN
+  TRUNCATE customer_stats, customer_therapist_stats, customer_monthly_spend,
+           customer_visit_items;
+
+  INSERT INTO customer_stats (cid, lifetime_spend, visit_count, last_visit)
+  SELECT t.cid, COALESCE(SUM(i.spend), 0), COUNT(*), MAX(t.entry_time)
+  FROM transactions t
+  LEFT JOIN (
+    SELECT tid, SUM(cost - item_discount) AS spend
+    FROM transaction_items
+    GROUP BY tid
+  ) i ON i.tid = t.tid
+  WHERE t.status IN ('completed', 'paid')
+  GROUP BY t.cid;
+
+  INSERT INTO customer_stats (cid, last_service_end, last_service_eid, last_service_sid)
+  SELECT DISTINCT ON (h.cid) h.cid, ti.actual_end, ti.therapist_eid, ti.sid
+  FROM transaction_items ti
+  JOIN transaction_header h ON h.tid = ti.tid
+  WHERE ti.actual_end IS NOT NULL
+  ORDER BY h.cid, ti.actual_end DESC, ti.ttid DESC
+  ON CONFLICT (cid) DO UPDATE
+  SET last_service_end = EXCLUDED.last_service_end,
+      last_service_eid = EXCLUDED.last_service_eid,
+      last_service_sid = EXCLUDED.last_service_sid;
+
+  INSERT INTO customer_therapist_stats (cid, therapist_eid, services_done)
+  SELECT t.cid, ti.therapist_eid, COUNT(*)
+  FROM transaction_items ti
+  JOIN transactions t ON t.tid = ti.tid
+  WHERE t.status IN ('completed', 'paid')
+  GROUP BY t.cid, ti.therapist_eid;
+
+  INSERT INTO customer_monthly_spend (cid, month, spend, visits)
+  SELECT t.cid, date_trunc('month', ti.actual_start)::date,
+         SUM(ti.cost - ti.item_discount), COUNT(DISTINCT t.tid)
+  FROM transaction_items ti
+  JOIN transactions t ON t.tid = ti.tid
+  WHERE t.status IN ('completed', 'paid')
+    AND ti.actual_start IS NOT NULL
+  GROUP BY 1, 2;
+
+  INSERT INTO customer_visit_items (tid, month, items)
+  SELECT ti.tid, date_trunc('month', ti.actual_start)::date, COUNT(*)
+  FROM transaction_items ti
+  JOIN transaction_totals tt ON tt.tid = ti.tid
+  WHERE tt.status IN ('completed', 'paid')
+    AND ti.actual_start IS NOT NULL
+  GROUP BY 1, 2;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_customer_stats_item
+  AFTER INSERT OR DELETE OR UPDATE OF tid, therapist_eid, sid, cost, item_discount,
+                                      actual_start, actual_end
+  ON transaction_items
+  FOR EACH ROW
+  EXECUTE FUNCTION maintain_customer_stats_item();
+
+-- status is usually changed by trg_update_transaction_status rather than by
+-- the UPDATE itself, so compare values instead of using UPDATE OF status
+CREATE TRIGGER trg_customer_stats_status
+  AFTER INSERT OR DELETE ON transaction_totals
+  FOR EACH ROW
+  EXECUTE FUNCTION maintain_customer_stats_status();
+
+CREATE TRIGGER trg_customer_stats_status_change
+  AFTER UPDATE ON transaction_totals
+  FOR EACH ROW
+  WHEN (OLD.status IS DISTINCT FROM NEW.status)
+  EXECUTE FUNCTION maintain_customer_stats_status();
+
+-- ============================================================================
+-- SECTION 11: DAILY ROLLUPS
+-- ============================================================================
+-- One row per day (and payment method / therapist / room) for the management
+-- and therapist period statistics, so a year-to-date figure is a sum over at
+-- most 366 days of rows instead of a scan of the raw tables. Days are local
+-- dates in the business time zone (rollup_day), whatever TimeZone the writing
+-- session has, so the triggers and a rebuild agree. Kept current by the triggers
+-- below as payments land, services start/end and the status moves in or out
+-- of completed/paid; rebuild_daily_rollups() recomputes everything
+-- (backfill/repair, see app/scripts/rollups.py).
+
+-- Function: Rollup day of a timestamp, pinned to the spa's time zone
+CREATE OR REPLACE FUNCTION rollup_day(p_ts TIMESTAMPTZ)
+RETURNS DATE AS $$
+  SELECT (p_ts AT TIME ZONE 'Asia/Singapore')::date
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Payments by payment_time day
+CREATE TABLE daily_payment_totals (
+  day DATE NOT NULL,
+  payment_method paymentmethod_enum NOT NULL,
+  amount NUMERIC(14,2) NOT NULL DEFAULT 0,
+  payments INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, payment_method)
+);
+
+-- Services by actual_start day: all, on completed/paid transactions, and
+-- of those the ones that have ended (with their total duration)
+CREATE TABLE daily_therapist_totals (
+  day DATE NOT NULL,
+  therapist_eid BIGINT NOT NULL,
+  services INTEGER NOT NULL DEFAULT 0,
+  revenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+  paid_services INTEGER NOT NULL DEFAULT 0,
+  paid_revenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+  completed_services INTEGER NOT NULL DEFAULT 0,
+  completed_revenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+  completed_minutes NUMERIC NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, therapist_eid)
+);
+
+-- Room bookings by scheduled_start day (actual_start if never scheduled)
+CREATE TABLE daily_room_totals (
+  day DATE NOT NULL,
+  rid INT NOT NULL,
+  bookings INTEGER NOT NULL DEFAULT 0,
+  revenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, rid)
+);
+
+-- Completed/paid visits (with at least one item) by created_at day
+CREATE TABLE daily_visit_totals (
+  day DATE PRIMARY KEY,
+  visits INTEGER NOT NULL DEFAULT 0,
+  spend NUMERIC(14,2) NOT NULL DEFAULT 0
+);
+
+-- Items and spend of each counted (completed/paid) transaction, so a visit
+-- is counted once and uncounted with its last item
+CREATE TABLE daily_visit_items (
+  tid BIGINT PRIMARY KEY,
+  day DATE NOT NULL,
+  items INTEGER NOT NULL,
+  spend NUMERIC(14,2) NOT NULL
+);
+
+-- Function: Add (p_sign = 1) or remove (p_sign = -1) one item's contribution
+CREATE OR REPLACE FUNCTION apply_daily_item_rollup(
+  p_tid BIGINT, p_eid BIGINT, p_rid INT,
+  p_scheduled TIMESTAMPTZ, p_start TIMESTAMPTZ, p_end TIMESTAMPTZ,
+  p_net NUMERIC, p_paid BOOLEAN, p_sign INTEGER)
+RETURNS VOID AS $$
+DECLARE
+  v_done BOOLEAN := p_paid AND p_end IS NOT NULL;
+  v_day DATE;
+  v_items INTEGER;
+BEGIN
+  IF p_start IS NOT NULL THEN
+    INSERT INTO daily_therapist_totals (day, therapist_eid, services, revenue,
+                                        paid_services, paid_revenue,
+                                        completed_services, completed_revenue, completed_minutes)
+    VALUES (rollup_day(p_start), p_eid, p_sign, p_sign * p_net,
+            CASE WHEN p_paid THEN p_sign ELSE 0 END,
+            CASE WHEN p_paid THEN p_sign * p_net ELSE 0 END,
+            CASE WHEN v_done THEN p_sign ELSE 0 END,
+            CASE WHEN v_done THEN p_sign * p_net ELSE 0 END,
+            CASE WHEN v_done THEN p_sign * EXTRACT(EPOCH FROM (p_end - p_start)) / 60 ELSE 0 END)
+    ON CONFLICT (day, therapist_eid) DO UPDATE
+    SET services = daily_therapist_totals.services + EXCLUDED.services,
+        revenue = daily_therapist_totals.revenue + EXCLUDED.revenue,
+        paid_services = daily_therapist_totals.paid_services + EXCLUDED.paid_services,
+        paid_revenue = daily_therapist_totals.paid_revenue + EXCLUDED.paid_revenue,
+        completed_services = daily_therapist_totals.completed_services + EXCLUDED.completed_services,
+        completed_revenue = daily_therapist_totals.completed_revenue + EXCLUDED.completed_revenue,
+        completed_minutes = daily_therapist_totals.completed_minutes + EXCLUDED.completed_minutes;
+  END IF;
+
+  IF COALESCE(p_scheduled, p_start) IS NOT NULL THEN
+    INSERT INTO daily_room_totals (day, rid, bookings, revenue)
+    VALUES (rollup_day(COALESCE(p_scheduled, p_start)), p_rid, p_sign, p_sign * p_net)
+    ON CONFLICT (day, rid) DO UPDATE
+    SET bookings = daily_room_totals.bookings + EXCLUDED.bookings,
+        revenue = daily_room_totals.revenue + EXCLUDED.revenue;
+  END IF;
+
+  IF p_paid THEN
+    UPDATE daily_visit_items
+    SET items = items + p_sign, spend = spend + p_sign * p_net
+    WHERE tid = p_tid
+    RETURNING day, items INTO v_day, v_items;
+
+    IF FOUND THEN
+      UPDATE daily_visit_totals
+      SET visits = visits + CASE WHEN p_sign > 0 AND v_items = 1 THEN 1
+                                 WHEN p_sign < 0 AND v_items = 0 THEN -1
+                                 ELSE 0 END,
+          spend = spend + p_sign * p_net
+      WHERE day = v_day;
+    END IF;
+  END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Keep the rollups in step with item inserts, edits and deletes
+CREATE OR REPLACE FUNCTION maintain_daily_rollup_item()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF current_setting('spa.archiving', true) = 'on' THEN
+    RETURN NULL;    -- rows archived by detach_transaction_partitions() keep counting
+  END IF;
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM apply_daily_item_rollup(
+      OLD.tid, OLD.therapist_eid, OLD.rid, OLD.scheduled_start, OLD.actual_start, OLD.actual_end,
+      OLD.cost - OLD.item_discount,
+      EXISTS (SELECT 1 FROM transaction_totals
+              WHERE tid = OLD.tid AND status IN ('completed', 'paid')),
+      -1);
+  END IF;
+
+  IF TG_OP = 'DELETE' THEN
+    RETURN OLD;
+  END IF;
+
+  PERFORM apply_daily_item_rollup(
+    NEW.tid, NEW.therapist_eid, NEW.rid, NEW.scheduled_start, NEW.actual_start, NEW.actual_end,
+    NEW.cost - NEW.item_discount,
+    EXISTS (SELECT 1 FROM transaction_totals
+            WHERE tid = NEW.tid AND status IN ('completed', 'paid')),
+    1);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Move a whole transaction in or out of the completed/paid figures
+CREATE OR REPLACE FUNCTION maintain_daily_rollup_status()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_was BOOLEAN := TG_OP <> 'INSERT' AND OLD.status IN ('completed', 'paid');
+  v_is BOOLEAN := TG_OP <> 'DELETE' AND NEW.status IN ('completed', 'paid');
+  v_tid BIGINT;
+  v_sign INTEGER;
+  v_visit daily_visit_items%ROWTYPE;
+BEGIN
+  IF current_setting('spa.archiving', true) = 'on' THEN
+    RETURN NULL;    -- rows archived by detach_transaction_partitions() keep counting
+  END IF;
+  IF v_was = v_is THEN
+    RETURN NULL;
+  END IF;
+
+  v_tid := CASE WHEN TG_OP = 'DELETE' THEN OLD.tid ELSE NEW.tid END;
+  v_sign := CASE WHEN v_is THEN 1 ELSE -1 END;
+
+  INSERT INTO daily_therapist_totals (day, therapist_eid, paid_services, paid_revenue,
+                                      completed_services, completed_revenue, completed_minutes)
+  SELECT rollup_day(actual_start), therapist_eid,
+         v_sign * COUNT(*),
+         v_sign * SUM(cost - item_discount),
+         v_sign * COUNT(*) FILTER (WHERE actual_end IS NOT NULL),
+         v_sign * COALESCE(SUM(cost - item_discount) FILTER (WHERE actual_end IS NOT NULL), 0),
+         v_sign * COALESCE(SUM(EXTRACT(EPOCH FROM (actual_end - actual_start)) / 60), 0)
+  FROM transaction_items
+  WHERE tid = v_tid AND actual_start IS NOT NULL
+  GROUP BY 1, 2
+  ON CONFLICT (day, therapist_eid) DO UPDATE
+  SET paid_services = daily_therapist_totals.paid_services + EXCLUDED.paid_services,
+      paid_revenue = daily_therapist_totals.paid_revenue + EXCLUDED.paid_revenue,
+      completed_services = daily_therapist_totals.completed_services + EXCLUDED.completed_services,
+      completed_revenue = daily_therapist_totals.completed_revenue + EXCLUDED.completed_revenue,
+      completed_minutes = daily_therapist_totals.completed_minutes + EXCLUDED.completed_minutes;
+
+  IF v_is THEN
+    INSERT INTO daily_visit_items (tid, day, items, spend)
+    SELECT v_tid, rollup_day(h.created_at), COUNT(ti.ttid), COALESCE(SUM(ti.cost - ti.item_discount), 0)
+    FROM transaction_header h
+    LEFT JOIN transaction_items ti ON ti.tid = h.tid
+    WHERE h.tid = v_tid
+    GROUP BY h.created_at
+    RETURNING * INTO v_visit;
+  ELSE
+    DELETE FROM daily_visit_items WHERE tid = v_tid
+    RETURNING * INTO v_visit;
+  END IF;
+
+  IF v_visit.tid IS NOT NULL THEN
+    INSERT INTO daily_visit_totals (day, visits, spend)
+    VALUES (v_visit.day, v_sign * (v_visit.items > 0)::int, v_sign * v_visit.spend)
+    ON CONFLICT (day) DO UPDATE
+    SET visits = daily_visit_totals.visits + EXCLUDED.visits,
+        spend = daily_visit_totals.spend + EXCLUDED.spend;
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Payments by day and method
+CREATE OR REPLACE FUNCTION maintain_daily_payment_rollup()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF current_setting('spa.archiving', true) = 'on' THEN
+    RETURN NULL;    -- rows archived by detach_transaction_partitions() keep counting
+  END IF;
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE daily_payment_totals
+    SET amount = amount - OLD.payment_amount, payments = payments - 1
+    WHERE day = rollup_day(OLD.payment_time) AND payment_method = OLD.payment_method;
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO daily_payment_totals (day, payment_method, amount, payments)
+    VALUES (rollup_day(NEW.payment_time), NEW.payment_method, NEW.payment_amount, 1)
+    ON CONFLICT (day, payment_method) DO UPDATE
+    SET amount = daily_payment_totals.amount + EXCLUDED.amount,
+        payments = daily_payment_totals.payments + 1;
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Recompute every rollup row from the raw tables (backfill/repair)
+CREATE OR REPLACE FUNCTION rebuild_daily_rollups()
+RETURNS VOID AS $$
+BEGIN
+  TRUNCATE daily_payment_totals, daily_therapist_totals, daily_room_totals,
+           daily_visit_totals, daily_visit_items;
+
+  INSERT INTO daily_payment_totals (day, payment_method, amount, payments)
+  SELECT rollup_day(payment_time), payment_method, SUM(payment_amount), COUNT(*)
+  FROM payments
+  GROUP BY 1, 2;
+
+  INSERT INTO daily_therapist_totals (day, therapist_eid, services, revenue,
+                                      paid_services, paid_revenue,
+                                      completed_services, completed_revenue, completed_minutes)
+  SELECT rollup_day(ti.actual_start), ti.therapist_eid,
+         COUNT(*),
+         SUM(ti.cost - ti.item_discount),
+         COUNT(*) FILTER (WHERE paid),
+         COALESCE(SUM(ti.cost - ti.item_discount) FILTER (WHERE paid), 0),
+         COUNT(*) FILTER (WHERE paid AND ti.actual_end IS NOT NULL),
+         COALESCE(SUM(ti.cost - ti.item_discount) FILTER (WHERE paid AND ti.actual_end IS NOT NULL), 0),
+         COALESCE(SUM(EXTRACT(EPOCH FROM (ti.actual_end - ti.actual_start)) / 60)
+                  FILTER (WHERE paid AND ti.actual_end IS NOT NULL), 0)
+  FROM transaction_items ti
+  JOIN LATERAL (
+    SELECT EXISTS (SELECT 1 FROM transaction_totals tt
+                   WHERE tt.tid = ti.tid AND tt.status IN ('completed', 'paid')) AS paid
+  ) s ON TRUE
+  WHERE ti.actual_start IS NOT NULL
+  GROUP BY 1, 2;
+
+  INSERT INTO daily_room_totals (day, rid, bookings, revenue)
+  SELECT rollup_day(COALESCE(scheduled_start, actual_start)), rid, COUNT(*), SUM(cost - item_discount)
+  FROM transaction_items
+  WHERE COALESCE(scheduled_start, actual_start) IS NOT NULL
+  GROUP BY 1, 2;
+
+  INSERT INTO daily_visit_items (tid, day, items, spend)
+  SELECT h.tid, rollup_day(h.created_at), COUNT(ti.ttid), COALESCE(SUM(ti.cost - ti.item_discount), 0)
+  FROM transaction_header h
+  JOIN transaction_totals tt ON tt.tid = h.tid
+  LEFT JOIN transaction_items ti ON ti.tid = h.tid
+  WHERE tt.status IN ('completed', 'paid')
+  GROUP BY h.tid, h.created_at;
+
+  INSERT INTO daily_visit_totals (day, visits, spend)
+  SELECT day, COUNT(*) FILTER (WHERE items > 0), SUM(spend)
+  FROM daily_visit_items
+  GROUP BY day;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_daily_rollup_item
+  AFTER INSERT OR DELETE OR UPDATE OF tid, therapist_eid, rid, cost, item_discount,
+                                      scheduled_start, actual_start, actual_end
+  ON transaction_items
+  FOR EACH ROW
+  EXECUTE FUNCTION maintain_daily_rollup_item();
+
+CREATE TRIGGER trg_daily_rollup_status
+  AFTER INSERT OR DELETE ON transaction_totals
+  FOR EACH ROW
+  EXECUTE FUNCTION maintain_daily_rollup_status();
+
+CREATE TRIGGER trg_daily_rollup_status_change
+  AFTER UPDATE ON transaction_totals
+  FOR EACH ROW
+  WHEN (OLD.status IS DISTINCT FROM NEW.status)
+  EXECUTE FUNCTION maintain_daily_rollup_status();
+
+CREATE TRIGGER trg_daily_rollup_payment
+  AFTER INSERT OR DELETE OR UPDATE OF payment_method, payment_amount, payment_time
+  ON payments
+  FOR EACH ROW
+  EXECUTE FUNCTION maintain_daily_payment_rollup();
+
+-- ============================================================================
+-- SECTION 12: REPORT RESULTS
+-- ============================================================================
+-- Output of the background report jobs behind the heavier management
+-- analytics (app/reports.py). One row per report and parameter set; the
+-- dashboard reads the latest row and the worker replaces it. is_final marks
+-- results over closed periods (e.g. a finished month), which are never
+-- recomputed.
+
+CREATE TABLE report_results (
+  report VARCHAR(50) NOT NULL,
+  params JSONB NOT NULL DEFAULT '{}',
+  result JSONB NOT NULL,
+  computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  duration_ms INTEGER NOT NULL DEFAULT 0,
+  is_final BOOLEAN NOT NULL DEFAULT FALSE,
+  PRIMARY KEY (report, params)
+);
+
+-- Police visitor log, frozen per elapsed day (app/blueprints/police.py): the
+-- day's visitors as [name, id, nationality, entry_time, exit_time, tid]
+-- arrays in (entry_time, tid) order. Written once a day is over and nobody
+-- who entered that day is still inside; delete a row to re-materialize it.
+CREATE TABLE police_snapshots (
+  day DATE PRIMARY KEY,
+  visitors JSONB NOT NULL,
+  visits INTEGER NOT NULL DEFAULT 0,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- ============================================================================
+-- SECTION 13: VERIFICATION QUERIES (Uncomment to test after creation)
 -- ============================================================================
 /*
 -- Verify all tables created
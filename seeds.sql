@@ -13516,7 +13516,7 @@ SELECT setval('role_definition_rdid_seq', (SELECT MAX(rdid) FROM role_definition
 SELECT setval('roles_rid_seq', (SELECT MAX(rid) FROM roles), true);
 SELECT setval('room_rid_seq', (SELECT MAX(rid) FROM room), true);
 SELECT setval('services_sid_seq', (SELECT MAX(sid) FROM services), true);
-SELECT setval('transactions_tid_seq', (SELECT MAX(tid) FROM transactions), true);
+SELECT setval('transaction_header_tid_seq', (SELECT MAX(tid) FROM transaction_header), true);
 SELECT setval('transaction_items_ttid_seq', (SELECT MAX(ttid) FROM transaction_items), true);
 SELECT setval('payments_pid_seq', (SELECT MAX(pid) FROM payments), true);
 SELECT setval('refunds_refid_seq', (SELECT MAX(refid) FROM refunds), true);
\ No newline at end of file